@@ -18,3 +18,7 @@ mv rnnoise-master/.libs/librnnoise.so.0.4.1 rnnoise_wrapper/libs/librnnoise_defa
 rm -rf rnnoise-master
 
 echo -e "\n'librnnoise.so.0.4.1' has been successfully moved to 'rnnoise_wrapper/libs/librnnoise_default.so.0.4.1'"
+
+gcc -O3 -shared -fPIC -o rnnoise_wrapper/libs/rnnoise_batch.so rnnoise_batch.c
+
+echo -e "\n'rnnoise_batch.c' has been successfully compiled to 'rnnoise_wrapper/libs/rnnoise_batch.so'"
@@ -0,0 +1,22 @@
+/*
+ * Helper for RNNoise_Wrapper: denoising of a block of frames in one foreign call.
+ *
+ * rnnoise_process_frame() is passed as a function pointer, so the helper does not depend on a specific RNNoise build
+ * and works with any librnnoise_*.so (default or trained models). ctypes releases the GIL for the whole call, which allows
+ * several DenoiseState to be processed in parallel threads.
+ *
+ * Build: gcc -O3 -shared -fPIC -o rnnoise_wrapper/libs/rnnoise_batch.so rnnoise_batch.c (done in compile_rnnoise.sh)
+ */
+
+#define FRAME_SIZE 480
+
+typedef float (*process_frame_fn)(void *st, float *out, const float *in);
+
+int rnnoise_process_frames(process_frame_fn process_frame, void *st, float *frames, int frames_count, float *vad_probabilities) {
+  int i;
+  for (i = 0; i < frames_count; i++) {
+    float *frame = frames + (long)i * FRAME_SIZE;
+    vad_probabilities[i] = process_frame(st, frame, frame);
+  }
+  return frames_count;
+}
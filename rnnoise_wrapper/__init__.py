@@ -9,9 +9,18 @@
 '''
 Предназначен для подавления шума в wav аудиозаписи с помощью библиотеки RNNoise (https://github.com/xiph/rnnoise).
 
-Содержит класс RNNoise. Подробнее в https://github.com/Desklop/RNNoise_Wrapper.
+Содержит классы RNNoise, RNNoiseStream, MultiChannelRNNoise, ChunkedRNNoise, пул объектов RNNoise DenoiserPool, реестр моделей ModelRegistry, потоковый ресемплер Resampler, метрики работы Metrics и адаптивный пропуск фреймов AdaptiveBypass. Подробнее в https://github.com/Desklop/RNNoise_Wrapper.
 
 Зависимости: pydub, numpy.
 '''
 
-from .rnnoise_wrapper import RNNoise
+from .rnnoise_wrapper import RNNoise, RNNoiseStream
+from .pool import DenoiserPool
+from .registry import ModelRegistry, ModelStream
+from .multistream import MultiStreamDenoiser
+from .multichannel import MultiChannelRNNoise
+from .chunked import ChunkedRNNoise
+from .vad import TimeMap, get_speech_segments
+from .resampler import Resampler, MultiRateResampler, resample
+from .metrics import Metrics, CallRecord
+from .bypass import AdaptiveBypass
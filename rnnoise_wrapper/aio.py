@@ -0,0 +1,211 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+#       OS : GNU/Linux Ubuntu 16.04 or later
+# LANGUAGE : Python 3.6 or later
+#   AUTHOR : Klim V. O.
+# - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+'''
+asyncio API для шумоподавления асинхронных потоков аудиоданных.
+
+Содержит класс AsyncRNNoiseStream и асинхронный генератор filter_stream().
+
+Зависимости: pydub, numpy.
+'''
+
+import os
+import asyncio
+import numpy as np
+import threading
+import collections
+import concurrent.futures
+
+from .rnnoise_wrapper import RNNoise, RNNoiseStream
+from .multistream import ScheduledStream
+
+
+# Общий пул потоков выполнения для всех асинхронных сессий, создаётся при первом использовании
+_default_executor = None
+_default_executor_lock = threading.Lock()
+
+
+def _get_default_executor():
+    ''' Получить общий пул потоков выполнения (количество потоков равно количеству ядер процессора).
+    1. возвращает concurrent.futures.ThreadPoolExecutor '''
+
+    global _default_executor
+
+    with _default_executor_lock:
+        if _default_executor is None:
+            _default_executor = concurrent.futures.ThreadPoolExecutor(max_workers=os.cpu_count() or 1)
+    return _default_executor
+
+
+class _VadSession(object):
+    ''' Обёртка над RNNoiseStream, push() и flush() которой возвращают вместе с очищенными аудиоданными вероятности наличия голоса
+    во фреймах, обработанных при этом вызове (для сопоставления результатов с частями при обработке в пуле потоков выполнения).
+    1. session - объект RNNoiseStream без vad_callback '''
+
+    def __init__(self, session):
+        self.session = session
+        self.__vad_probabilities = []
+        session.vad_callback = self.__vad_probabilities.append
+
+
+    def push(self, chunk):
+        return self.__get_result(self.session.push(chunk))
+
+
+    def flush(self):
+        return self.__get_result(self.session.flush())
+
+
+    def __get_result(self, denoised_chunk):
+        if self.__vad_probabilities:
+            vad_probabilities = np.concatenate(self.__vad_probabilities)
+        else:
+            vad_probabilities = np.empty(0, dtype=np.float32)
+        del self.__vad_probabilities[:]
+        return denoised_chunk, vad_probabilities
+
+
+class AsyncRNNoiseStream(object):
+    ''' Асинхронная сессия шумоподавления потокового аудио. Обработка выполняется в ограниченном пуле потоков выполнения,
+    поэтому цикл событий не блокируется:
+    - push(): поставить часть аудиозаписи в очередь на обработку, возвращает asyncio.Future с результатом
+    - flush(): обработать остаток потока, возвращает asyncio.Future с результатом
+
+    Части одной сессии обрабатываются строго по порядку. Если в обработке уже находится max_pending частей, push() ждёт
+    завершения обработки самой старой из них (обратное давление на источник данных).
+
+    1. denoiser - объект RNNoise, состояние которого будет использоваться только этой сессией (если None - будет создан новый)
+    2. sample_rate - частота дискретизации частей аудиозаписи (если None - 48 кГц)
+    3. voice_prob_threshold - порог вероятности наличия голоса в каждом фрейме (значение от 0 до 1, если 0 - использовать все фреймы)
+    4. save_source_sample_rate - True: приводить частоту дискретизации возвращаемых частей к исходной
+    5. executor - concurrent.futures.Executor для обработки (если None - общий пул потоков по количеству ядер процессора)
+    6. max_pending - максимальное количество частей, одновременно находящихся в обработке
+    7. float_output - True: результат - numpy.ndarray float32 (значения от -1 до 1), False - байтовая строка
+    8. return_vad - True: результат - tuple из очищенных аудиоданных и numpy.ndarray float32 с вероятностями наличия голоса во фреймах,
+        обработанных вместе с этой частью (по одному значению на фрейм длиной 10 мс)
+
+    Атрибут pending содержит текущее количество частей, находящихся в обработке. '''
+
+    def __init__(self, denoiser=None, sample_rate=None, voice_prob_threshold=0.0, save_source_sample_rate=True, executor=None,
+                 max_pending=4, float_output=False, return_vad=False):
+        if max_pending < 1:
+            raise ValueError("'max_pending' must be greater than 0")
+
+        self.denoiser = denoiser or RNNoise()
+        self.max_pending = max_pending
+        session = RNNoiseStream(self.denoiser, sample_rate, voice_prob_threshold, save_source_sample_rate, float_output)
+        if return_vad:
+            session = _VadSession(session)
+        self.__stream = ScheduledStream(executor or _get_default_executor(), session)
+        self.__semaphore = asyncio.Semaphore(max_pending)
+        self.pending = 0
+
+
+    async def push(self, chunk):
+        ''' Поставить часть аудиозаписи в очередь на шумоподавление (ждать, если в обработке уже max_pending частей).
+        1. chunk - байтовая строка с аудиоданными (без заголовков wav)
+        2. возвращает asyncio.Future, результатом которого будут очищенные от шума аудиоданные (см. float_output и return_vad) '''
+
+        await self.__semaphore.acquire()
+        try:
+            future = asyncio.wrap_future(self.__stream.push(chunk))
+        except Exception:
+            self.__semaphore.release()
+            raise
+        self.pending += 1
+        future.add_done_callback(self.__release)
+        return future
+
+
+    async def flush(self):
+        ''' Обработать оставшийся неполный фрейм и закрыть сессию.
+        1. возвращает asyncio.Future, результатом которого будут очищенные от шума аудиоданные (см. float_output и return_vad) '''
+
+        await self.__semaphore.acquire()
+        try:
+            future = asyncio.wrap_future(self.__stream.close())
+        except Exception:
+            self.__semaphore.release()
+            raise
+        self.pending += 1
+        future.add_done_callback(self.__release)
+        return future
+
+
+    def __release(self, future):
+        self.pending -= 1
+        self.__semaphore.release()
+
+
+async def _iter_chunks(reader, chunk_size, sample_width=2):
+    ''' Получить части аудиозаписи из асинхронного источника. Части всегда содержат целое количество отсчётов: неполный отсчёт
+    в конце части переносится в начало следующей (как в wav_io.iter_raw_blocks()), неполный отсчёт в конце потока отбрасывается.
+    1. reader - объект с методом async read(n) (например, asyncio.StreamReader) или асинхронный итерируемый объект с байтовыми строками
+    2. chunk_size - размер читаемой части в байтах (используется только для объектов с методом read())
+    3. sample_width - размер отсчёта в байтах
+    4. возвращает асинхронный генератор байтовых строк '''
+
+    async def iter_raw_chunks():
+        if hasattr(reader, 'read'):
+            while True:
+                chunk = await reader.read(chunk_size)
+                if not chunk:
+                    return
+                yield chunk
+        elif hasattr(reader, '__aiter__'):
+            async for chunk in reader:
+                yield chunk
+        else:
+            raise TypeError("'reader' must have async method read() or be an async iterable")
+
+    remainder = b''
+    async for chunk in iter_raw_chunks():
+        if remainder:
+            chunk = remainder + chunk
+        remainder_size = len(chunk) % sample_width
+        if remainder_size:
+            chunk, remainder = chunk[:-remainder_size], chunk[-remainder_size:]
+        else:
+            remainder = b''
+        if chunk:
+            yield chunk
+
+
+async def filter_stream(reader, sample_rate=None, chunk_duration_ms=20, voice_prob_threshold=0.0, save_source_sample_rate=True,
+                        denoiser=None, executor=None, max_pending=4):
+    ''' Шумоподавление асинхронного потока аудиоданных. Является асинхронным генератором: очищенные части возвращаются в исходном
+    порядке по мере готовности. Пока потребитель не забрал очередную часть, из reader читается не более max_pending частей
+    вперёд, поэтому медленный потребитель притормаживает чтение.
+
+    1. reader - объект с методом async read(n) (например, asyncio.StreamReader) или асинхронный итерируемый объект с байтовыми строками
+        (аудиоданные 16 бит моно без заголовков wav)
+    2. sample_rate - частота дискретизации аудиоданных (если None - 48 кГц)
+    3. chunk_duration_ms - длительность читаемой части в миллисекундах (используется только для объектов с методом read())
+    4. voice_prob_threshold - порог вероятности наличия голоса в каждом фрейме (значение от 0 до 1, если 0 - использовать все фреймы)
+    5. save_source_sample_rate - True: приводить частоту дискретизации возвращаемых частей к исходной
+    6. denoiser - объект RNNoise, состояние которого будет использоваться только этим потоком (если None - будет создан новый)
+    7. executor - concurrent.futures.Executor для обработки (если None - общий пул потоков по количеству ядер процессора)
+    8. max_pending - максимальное количество частей, одновременно находящихся в обработке
+    9. возвращает асинхронный генератор байтовых строк с очищенными от шума аудиоданными '''
+
+    session = AsyncRNNoiseStream(denoiser, sample_rate, voice_prob_threshold, save_source_sample_rate, executor, max_pending)
+    chunk_size = int((sample_rate or session.denoiser.sample_rate) * chunk_duration_ms / 1000) * session.denoiser.sample_width
+
+    pending = collections.deque()
+    async for chunk in _iter_chunks(reader, chunk_size, session.denoiser.sample_width):
+        pending.append(await session.push(chunk))
+        while pending and (pending[0].done() or len(pending) >= max_pending):
+            denoised_chunk = await pending.popleft()
+            if denoised_chunk:
+                yield denoised_chunk
+
+    pending.append(await session.flush())
+    while pending:
+        denoised_chunk = await pending.popleft()
+        if denoised_chunk:
+            yield denoised_chunk
@@ -0,0 +1,291 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+#       OS : GNU/Linux Ubuntu 16.04 or later
+# LANGUAGE : Python 3.5.2 or later
+#   AUTHOR : Klim V. O.
+# - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+'''
+Пакетное шумоподавление большого количества .wav аудиозаписей с использованием всех ядер процессора.
+
+Содержит функции denoise_files(), find_files(), read_manifest() и is_up_to_date().
+
+Зависимости: pydub, numpy.
+'''
+
+import os
+import glob
+import time
+import collections
+import concurrent.futures
+
+from .cache import DenoiseCache
+from .rnnoise_wrapper import RNNoise, find_library
+
+
+FileResult = collections.namedtuple('FileResult', ['f_name_audio', 'f_name_denoised_audio', 'audio_length', 'elapsed_time', 'error',
+                                                   'is_cached'])
+FileResult.__new__.__defaults__ = (False,)
+FileResult.__doc__ = ''' Результат шумоподавления одной аудиозаписи: имена исходной и очищенной аудиозаписей, длина аудиозаписи в секундах,
+время обработки в секундах, текст ошибки (None, если обработка прошла успешно) и True, если результат взят из кэша. '''
+
+
+# Расширения файлов, которые считаются аудиозаписями при обходе папок
+AUDIO_EXTENSIONS = ('.wav',)
+
+
+# Объекты RNNoise и DenoiseCache рабочего процесса, создаются один раз при обработке первой аудиозаписи в процессе
+_denoiser = None
+_cache = None
+
+
+def _denoise_file(f_name_audio, f_name_denoised_audio, f_name_lib=None, voice_prob_threshold=0.0, cache_folder=None, cache_max_size=None,
+                  model_path=None):
+    ''' Очистка одной аудиозаписи от шума в рабочем процессе. Библиотека RNNoise загружается один раз на процесс,
+    перед каждой аудиозаписью сбрасывается только состояние нейронной сети. Аудиозапись обрабатывается блоками с постоянным
+    расходом памяти (см. RNNoise.filter_file()), результат сначала пишется во временный файл рядом с итоговым и переименовывается
+    только после успешной обработки, поэтому прерванная обработка не оставляет неполных файлов, которые выглядели бы актуальными.
+    1. f_name_audio - имя исходной .wav аудиозаписи
+    2. f_name_denoised_audio - имя .wav аудиозаписи для результата
+    3. f_name_lib - путь к библиотеке или её имя/субимя (см. RNNoise)
+    4. voice_prob_threshold - порог вероятности наличия голоса в каждом фрейме (значение от 0 до 1, если 0 - использовать все фреймы)
+    5. cache_folder - папка кэша результатов (см. cache.DenoiseCache, если None - не использовать кэш)
+    6. cache_max_size - максимальный размер кэша в байтах
+    7. model_path - путь к файлу весов модели (см. RNNoise)
+    8. возвращает FileResult '''
+
+    global _denoiser, _cache
+
+    start_time = time.time()
+    try:
+        if _denoiser is None or _denoiser.f_name_lib != find_library(f_name_lib) or \
+                _denoiser.model_path != (os.path.abspath(model_path) if model_path else None):
+            _denoiser = RNNoise(f_name_lib, model_path)
+        else:
+            _denoiser.reset()
+
+        folder_name_denoised_audio = os.path.dirname(f_name_denoised_audio)
+        if folder_name_denoised_audio:
+            os.makedirs(folder_name_denoised_audio, exist_ok=True)
+
+        if cache_folder and (_cache is None or _cache.folder_name != cache_folder):
+            _cache = DenoiseCache(cache_folder, cache_max_size or 1024**3)
+
+        f_name_temp = f_name_denoised_audio + '.part'
+        try:
+            is_cached = False
+            if cache_folder:
+                audio_length, is_cached = _cache.filter_file(_denoiser, f_name_audio, f_name_temp, voice_prob_threshold)
+            else:
+                audio_length = _denoiser.filter_file(f_name_audio, f_name_temp, voice_prob_threshold)
+            os.replace(f_name_temp, f_name_denoised_audio)
+        finally:
+            if os.path.exists(f_name_temp):
+                os.remove(f_name_temp)
+    except Exception as error:
+        return FileResult(f_name_audio, f_name_denoised_audio, None, time.time() - start_time, '{}: {}'.format(type(error).__name__, error))
+
+    return FileResult(f_name_audio, f_name_denoised_audio, audio_length, time.time() - start_time, None, is_cached)
+
+
+def denoise_files(f_names_audio, f_names_denoised_audio, workers=None, f_name_lib=None, voice_prob_threshold=0.0, max_pending=None,
+                  callback=None, cache_folder=None, cache_max_size=None, model_path=None):
+    ''' Очистка от шума списка .wav аудиозаписей в нескольких процессах.
+
+    Каждый рабочий процесс загружает библиотеку RNNoise один раз. Аудиозаписи отправляются на обработку в порядке убывания размера
+    файла (сначала самые длинные), что сокращает общее время работы. Одновременно в обработке находится не более max_pending
+    аудиозаписей, что ограничивает расход памяти.
+
+    1. f_names_audio - список имён исходных .wav аудиозаписей
+    2. f_names_denoised_audio - список имён .wav аудиозаписей для результата (такой же длины, как f_names_audio)
+    3. workers - количество рабочих процессов (если None - по количеству ядер процессора, если 1 - обработка в текущем процессе)
+    4. f_name_lib - путь к библиотеке или её имя/субимя (см. RNNoise)
+    5. voice_prob_threshold - порог вероятности наличия голоса в каждом фрейме (значение от 0 до 1, если 0 - использовать все фреймы)
+    6. max_pending - максимальное количество аудиозаписей, одновременно находящихся в обработке (если None - 2*workers)
+    7. callback - функция, которая вызывается в текущем процессе сразу после обработки каждой аудиозаписи с её индексом
+        в f_names_audio и FileResult (например, для отображения прогресса или записи отчёта)
+    8. cache_folder - папка кэша результатов: аудиозаписи, уже обработанные той же моделью с теми же параметрами, не обрабатываются
+        повторно (см. cache.DenoiseCache, если None - не использовать кэш)
+    9. cache_max_size - максимальный размер кэша в байтах (если None - 1 ГБ)
+    10. model_path - путь к файлу весов модели (см. RNNoise, если None - использовать модель, встроенную в библиотеку)
+    11. возвращает список FileResult в порядке f_names_audio (ошибки обработки не прерывают работу, а возвращаются в FileResult.error) '''
+
+    if len(f_names_audio) != len(f_names_denoised_audio):
+        raise ValueError("'f_names_audio' and 'f_names_denoised_audio' must have the same length")
+
+    workers = workers or os.cpu_count() or 1
+    max_pending = max_pending or 2 * workers
+
+    def get_file_size(index):
+        try:
+            return os.path.getsize(f_names_audio[index])
+        except OSError:
+            return 0
+
+    order = sorted(range(len(f_names_audio)), key=get_file_size, reverse=True)
+    results = [None] * len(f_names_audio)
+
+    def set_result(i, result):
+        results[i] = result
+        if callback is not None:
+            callback(i, result)
+
+    if workers == 1:
+        for i in order:
+            set_result(i, _denoise_file(f_names_audio[i], f_names_denoised_audio[i], f_name_lib, voice_prob_threshold, cache_folder,
+                                        cache_max_size, model_path))
+        return results
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = {}
+        for i in order:
+            future = executor.submit(_denoise_file, f_names_audio[i], f_names_denoised_audio[i], f_name_lib, voice_prob_threshold,
+                                     cache_folder, cache_max_size, model_path)
+            pending[future] = i
+
+            if len(pending) >= max_pending:
+                done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    i = pending.pop(future)
+                    set_result(i, _get_result(future, f_names_audio[i], f_names_denoised_audio[i]))
+
+        for future in concurrent.futures.as_completed(pending):
+            i = pending[future]
+            set_result(i, _get_result(future, f_names_audio[i], f_names_denoised_audio[i]))
+
+    return results
+
+
+def _get_result(future, f_name_audio, f_name_denoised_audio):
+    ''' Получить результат из future, преобразовав сбой рабочего процесса в FileResult с ошибкой.
+    1. future - concurrent.futures.Future с результатом _denoise_file()
+    2. f_name_audio - имя исходной .wav аудиозаписи
+    3. f_name_denoised_audio - имя .wav аудиозаписи для результата
+    4. возвращает FileResult '''
+
+    try:
+        return future.result()
+    except Exception as error:
+        return FileResult(f_name_audio, f_name_denoised_audio, None, None, '{}: {}'.format(type(error).__name__, error))
+
+
+def find_files(sources, folder_name_output, recursive=True, extensions=AUDIO_EXTENSIONS):
+    ''' Найти аудиозаписи и получить для каждой имя файла для результата. Структура папок исходных аудиозаписей повторяется
+    в folder_name_output: для папки - относительно самой папки, для шаблона - относительно его части до первого спецсимвола,
+    для отдельного файла результат сохраняется прямо в folder_name_output. Если folder_name_output находится внутри обходимой папки,
+    файлы из неё пропускаются (иначе результаты прошлого запуска обрабатывались бы повторно).
+    1. sources - список имён файлов, папок или шаблонов glob (например, 'data/**/*.wav')
+    2. folder_name_output - папка для результатов
+    3. recursive - True: обходить вложенные папки (для шаблонов включает поддержку '**')
+    4. extensions - расширения файлов, которые считаются аудиозаписями при обходе папок
+    5. возвращает список tuple из имени исходной аудиозаписи и имени файла для результата (в порядке sources, внутри папок - по имени) '''
+
+    output_prefix = os.path.join(os.path.abspath(folder_name_output), '')
+
+    pairs = []
+    for source in sources:
+        if os.path.isdir(source):
+            for f_name_audio in _walk_folder(source, recursive, extensions):
+                if not os.path.abspath(f_name_audio).startswith(output_prefix):
+                    pairs.append((f_name_audio, os.path.join(folder_name_output, os.path.relpath(f_name_audio, source))))
+        elif glob.has_magic(source):
+            folder_name_base = _get_glob_base(source)
+            for f_name_audio in sorted(glob.glob(source, recursive=recursive)):
+                if os.path.isfile(f_name_audio) and not os.path.abspath(f_name_audio).startswith(output_prefix):
+                    pairs.append((f_name_audio, os.path.join(folder_name_output, os.path.relpath(f_name_audio, folder_name_base))))
+        elif os.path.isfile(source):
+            pairs.append((source, os.path.join(folder_name_output, os.path.basename(source))))
+        else:
+            raise FileNotFoundError("'{}' does not exist".format(source))
+
+    return _check_pairs(pairs)
+
+
+def read_manifest(f_name_manifest, folder_name_output=None):
+    ''' Прочитать список аудиозаписей из файла. Каждая непустая строка (кроме начинающихся с '#') содержит имя исходной аудиозаписи
+    и, через табуляцию, имя файла для результата. Относительные имена отсчитываются от папки файла со списком.
+    1. f_name_manifest - имя файла со списком
+    2. folder_name_output - папка для результатов строк без имени файла для результата (структура папок относительно папки файла
+        со списком повторяется, как в find_files())
+    3. возвращает список tuple из имени исходной аудиозаписи и имени файла для результата '''
+
+    folder_name_manifest = os.path.dirname(os.path.abspath(f_name_manifest))
+
+    pairs = []
+    with open(f_name_manifest, 'r', encoding='utf-8') as f_manifest:
+        for line_number, line in enumerate(f_manifest, 1):
+            line = line.rstrip('\r\n')
+            if not line.strip() or line.lstrip().startswith('#'):
+                continue
+
+            fields = line.split('\t')
+            f_name_audio = os.path.join(folder_name_manifest, fields[0].strip())
+            if len(fields) > 1 and fields[1].strip():
+                f_name_denoised_audio = os.path.join(folder_name_manifest, fields[1].strip())
+            elif folder_name_output is not None:
+                relative_f_name = os.path.relpath(f_name_audio, folder_name_manifest)
+                if relative_f_name.startswith(os.pardir):
+                    relative_f_name = os.path.basename(f_name_audio)
+                f_name_denoised_audio = os.path.join(folder_name_output, relative_f_name)
+            else:
+                raise ValueError("'{}', line {}: output file name is missing and 'folder_name_output' is None".format(
+                                 f_name_manifest, line_number))
+            pairs.append((f_name_audio, f_name_denoised_audio))
+
+    return _check_pairs(pairs)
+
+
+def is_up_to_date(f_name_audio, f_name_denoised_audio):
+    ''' Проверить, что результат уже существует и изменён не раньше исходной аудиозаписи.
+    1. f_name_audio - имя исходной аудиозаписи
+    2. f_name_denoised_audio - имя файла для результата
+    3. возвращает True, если повторная обработка не нужна '''
+
+    try:
+        return os.path.getmtime(f_name_denoised_audio) >= os.path.getmtime(f_name_audio)
+    except OSError:
+        return False
+
+
+def _walk_folder(folder_name, recursive, extensions):
+    ''' Получить отсортированный список аудиозаписей в папке (и во вложенных папках, если recursive). '''
+
+    f_names_audio = []
+    for root_folder_name, folder_names, f_names in os.walk(folder_name):
+        if not recursive:
+            folder_names[:] = []
+        for f_name in f_names:
+            if f_name.lower().endswith(tuple(extensions)):
+                f_names_audio.append(os.path.join(root_folder_name, f_name))
+    return sorted(f_names_audio)
+
+
+def _get_glob_base(pattern):
+    ''' Получить часть шаблона glob до первого компонента со спецсимволами (папку, относительно которой повторяется структура). '''
+
+    base_parts = []
+    for part in pattern.split(os.sep):
+        if glob.has_magic(part):
+            break
+        base_parts.append(part)
+    return os.sep.join(base_parts) or os.curdir
+
+
+def _check_pairs(pairs):
+    ''' Удалить повторы и проверить, что результат не перезаписывает исходную аудиозапись и разные аудиозаписи не сохраняются
+    в один и тот же файл. '''
+
+    unique_pairs = []
+    f_names_audio_by_output = {}
+    for f_name_audio, f_name_denoised_audio in pairs:
+        f_name_key = os.path.abspath(f_name_denoised_audio)
+        if f_name_key == os.path.abspath(f_name_audio):
+            raise ValueError("result for '{}' would overwrite the source audio".format(f_name_audio))
+        f_name_previous_audio = f_names_audio_by_output.get(f_name_key)
+        if f_name_previous_audio is None:
+            f_names_audio_by_output[f_name_key] = f_name_audio
+            unique_pairs.append((f_name_audio, f_name_denoised_audio))
+        elif os.path.abspath(f_name_previous_audio) != os.path.abspath(f_name_audio):
+            raise ValueError("'{}' and '{}' would both be saved to '{}'".format(f_name_previous_audio, f_name_audio, f_name_denoised_audio))
+    return unique_pairs
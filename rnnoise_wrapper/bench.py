@@ -0,0 +1,298 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+#       OS : GNU/Linux Ubuntu 16.04 or later
+# LANGUAGE : Python 3.5.2 or later
+#   AUTHOR : Klim V. O.
+# - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+'''
+Набор микробенчмарков для RNNoise_Wrapper: распределение задержки обработки фрейма и части потока (p50/p95/p99/max),
+скорость обработки целой аудиозаписи (RT), пиковый расход памяти (tracemalloc), время импорта и создания объекта RNNoise.
+Измерения выполняются для каждой комплектной библиотеки, нескольких частот дискретизации и длин частей потока на детерминированной
+синтетической аудиозаписи. Результат сохраняется в JSON и может быть сравнён с сохранённым ранее эталоном.
+
+Содержит функции run_benchmarks() и compare_results().
+
+Пример:
+    python3 -m rnnoise_wrapper.bench -o bench.json
+    python3 -m rnnoise_wrapper.bench -o bench_new.json -b bench.json -t 0.1
+
+Зависимости: pydub, numpy.
+'''
+
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tracemalloc
+import subprocess
+import numpy as np
+
+from .rnnoise_wrapper import RNNoise, RNNoiseStream, find_library, _load_batch_lib
+
+
+BUNDLED_LIBS = ['librnnoise_default', 'librnnoise_5h_b_500k', 'librnnoise_5h_ru_500k']
+SAMPLE_RATES = [8000, 16000, 48000]
+BUFFER_DURATIONS_MS = [10, 20, 100]
+
+
+def get_synthetic_audio(duration_s, sample_rate, seed=0):
+    ''' Сгенерировать детерминированную синтетическую аудиозапись: чередование "речеподобных" фрагментов (гармоники основного
+    тона с изменяющейся частотой и амплитудной модуляцией) и пауз на фоне белого и низкочастотного шума.
+    1. duration_s - длительность в секундах
+    2. sample_rate - частота дискретизации
+    3. seed - начальное значение генератора случайных чисел
+    4. возвращает numpy.ndarray int16 с отсчётами '''
+
+    random_state = np.random.RandomState(seed)
+    t = np.arange(int(duration_s * sample_rate)) / sample_rate
+
+    pitch = 140 + 30 * np.sin(2 * np.pi * 0.7 * t)
+    phase = 2 * np.pi * np.cumsum(pitch) / sample_rate
+    voice = sum(np.sin(harmonic * phase) / harmonic for harmonic in range(1, 8) if harmonic * 200 < sample_rate / 2)
+    syllables = np.clip(np.sin(2 * np.pi * 4 * t), 0, None)
+    is_phrase = (t % 2.0) < 1.2
+    voice *= syllables * is_phrase
+
+    noise = random_state.randn(t.shape[0]) * 0.05
+    hum = 0.03 * np.sin(2 * np.pi * 50 * t)
+    samples = (0.3 * voice + noise + hum) * 32767 * 0.5
+    return np.clip(samples, -32768, 32767).astype(np.int16)
+
+
+def get_percentiles(elapsed_times_ns):
+    ''' Получить распределение задержки.
+    1. elapsed_times_ns - список длительностей в наносекундах
+    2. возвращает dict с p50, p95, p99, max и mean в микросекундах '''
+
+    elapsed_times_us = np.asarray(elapsed_times_ns, dtype=np.float64) / 1000
+    p50, p95, p99 = np.percentile(elapsed_times_us, [50, 95, 99]).tolist()
+    return {'p50_us': p50, 'p95_us': p95, 'p99_us': p99, 'max_us': float(elapsed_times_us.max()),
+            'mean_us': float(elapsed_times_us.mean())}
+
+
+def bench_frame_latency(denoiser, frames_count):
+    ''' Измерить задержку filter_frame() на каждом фрейме.
+    1. denoiser - объект RNNoise
+    2. frames_count - количество фреймов
+    3. возвращает dict с распределением задержки (см. get_percentiles()) '''
+
+    samples = get_synthetic_audio(frames_count * denoiser.frame_duration_ms / 1000, denoiser.sample_rate)
+    frames = [samples[i:i+denoiser.frame_size].tobytes() for i in range(0, frames_count * denoiser.frame_size, denoiser.frame_size)]
+
+    elapsed_times_ns = []
+    for frame in frames:
+        start_time = time.perf_counter_ns()
+        denoiser.filter_frame(frame)
+        elapsed_times_ns.append(time.perf_counter_ns() - start_time)
+    return get_percentiles(elapsed_times_ns)
+
+
+def bench_file(denoiser, duration_s, sample_rate, repeats):
+    ''' Измерить скорость обработки целой аудиозаписи filter() (лучшее из repeats запусков) и пиковый расход памяти.
+    1. denoiser - объект RNNoise
+    2. duration_s - длительность аудиозаписи в секундах
+    3. sample_rate - частота дискретизации
+    4. repeats - количество запусков
+    5. возвращает dict со скоростью (во сколько раз быстрее реального времени) и пиковым расходом памяти в МБ '''
+
+    audio_bytes = get_synthetic_audio(duration_s, sample_rate).tobytes()
+
+    elapsed_times_ns = []
+    for i in range(repeats):
+        denoiser.reset()
+        start_time = time.perf_counter_ns()
+        denoiser.filter(audio_bytes, sample_rate=sample_rate)
+        elapsed_times_ns.append(time.perf_counter_ns() - start_time)
+
+    denoiser.reset()
+    tracemalloc.start()
+    try:
+        denoiser.filter(audio_bytes, sample_rate=sample_rate)
+        peak_memory = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {'rt': duration_s * 1e9 / min(elapsed_times_ns), 'peak_memory_mb': peak_memory / 2**20}
+
+
+def bench_stream(denoiser, duration_s, sample_rate, buffer_duration_ms):
+    ''' Измерить задержку RNNoiseStream.push() на каждой части потока.
+    1. denoiser - объект RNNoise
+    2. duration_s - длительность потока в секундах
+    3. sample_rate - частота дискретизации
+    4. buffer_duration_ms - длина части потока в миллисекундах
+    5. возвращает dict с распределением задержки (см. get_percentiles()) '''
+
+    audio_bytes = get_synthetic_audio(duration_s, sample_rate).tobytes()
+    buffer_size = int(sample_rate * buffer_duration_ms / 1000) * denoiser.sample_width
+    chunks = [audio_bytes[i:i+buffer_size] for i in range(0, len(audio_bytes), buffer_size)]
+
+    denoiser.reset()
+    stream = RNNoiseStream(denoiser, sample_rate)
+    elapsed_times_ns = []
+    for chunk in chunks:
+        start_time = time.perf_counter_ns()
+        stream.push(chunk)
+        elapsed_times_ns.append(time.perf_counter_ns() - start_time)
+    stream.flush()
+    return get_percentiles(elapsed_times_ns)
+
+
+def bench_startup(f_name_lib):
+    ''' Измерить время импорта пакета и создания первого объекта RNNoise (с поиском и загрузкой библиотеки) в новом процессе,
+    а также время создания последующего объекта RNNoise в текущем процессе (библиотека уже загружена).
+    1. f_name_lib - путь к библиотеке или её имя/субимя
+    2. возвращает dict со временем в миллисекундах '''
+
+    code = 'import time, json, warnings\n' + \
+           'warnings.simplefilter("ignore")\n' + \
+           'start_time = time.perf_counter_ns()\n' + \
+           'import rnnoise_wrapper\n' + \
+           'import_time = time.perf_counter_ns() - start_time\n' + \
+           'start_time = time.perf_counter_ns()\n' + \
+           'rnnoise_wrapper.RNNoise({!r})\n'.format(f_name_lib) + \
+           'print(json.dumps([import_time, time.perf_counter_ns() - start_time]))\n'
+    package_folder = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [package_folder, os.environ.get('PYTHONPATH')])))
+    output = subprocess.check_output([sys.executable, '-c', code], env=env, stderr=subprocess.DEVNULL)
+    import_time, construct_time = json.loads(output.decode('utf-8').strip().splitlines()[-1])
+
+    RNNoise(f_name_lib)
+    start_time = time.perf_counter_ns()
+    RNNoise(f_name_lib)
+    warm_construct_time = time.perf_counter_ns() - start_time
+
+    return {'import_ms': import_time / 1e6, 'construct_ms': construct_time / 1e6, 'warm_construct_ms': warm_construct_time / 1e6}
+
+
+def run_benchmarks(f_names_lib=None, sample_rates=None, buffer_durations_ms=None, duration_s=10, frames_count=2000, repeats=3,
+                   log=None):
+    ''' Выполнить все бенчмарки.
+    1. f_names_lib - список библиотек RNNoise (если None - все комплектные)
+    2. sample_rates - список частот дискретизации (если None - 8, 16 и 48 кГц)
+    3. buffer_durations_ms - список длин частей потока в миллисекундах (если None - 10, 20 и 100 мс)
+    4. duration_s - длительность синтетической аудиозаписи в секундах
+    5. frames_count - количество фреймов для измерения задержки filter_frame()
+    6. repeats - количество запусков при измерении скорости обработки целой аудиозаписи
+    7. log - функция для вывода хода выполнения (например, print), если None - ничего не выводить
+    8. возвращает dict с результатами (см. compare_results()) '''
+
+    f_names_lib = f_names_lib or BUNDLED_LIBS
+    sample_rates = sample_rates or SAMPLE_RATES
+    buffer_durations_ms = buffer_durations_ms or BUFFER_DURATIONS_MS
+    log = log or (lambda message: None)
+
+    results = {'meta': {'python': platform.python_version(), 'numpy': np.__version__, 'platform': platform.platform(),
+                        'machine': platform.machine(), 'cpu_count': os.cpu_count(), 'batch_lib': _load_batch_lib() is not None,
+                        'duration_s': duration_s, 'frames_count': frames_count, 'time': time.strftime('%Y-%m-%d %H:%M:%S')},
+               'libs': {}}
+
+    for f_name_lib in f_names_lib:
+        log("[i] Benchmarking '{}'...".format(os.path.basename(find_library(f_name_lib))))
+        lib_results = {'startup': bench_startup(f_name_lib)}
+
+        denoiser = RNNoise(f_name_lib)
+        lib_results['frame_latency'] = bench_frame_latency(denoiser, frames_count)
+        lib_results['file'] = {}
+        lib_results['stream_latency'] = {}
+        for sample_rate in sample_rates:
+            lib_results['file'][str(sample_rate)] = bench_file(denoiser, duration_s, sample_rate, repeats)
+            lib_results['stream_latency'][str(sample_rate)] = {}
+            for buffer_duration_ms in buffer_durations_ms:
+                lib_results['stream_latency'][str(sample_rate)][str(buffer_duration_ms)] = bench_stream(denoiser, duration_s, sample_rate,
+                                                                                                         buffer_duration_ms)
+        results['libs'][f_name_lib] = lib_results
+
+    return results
+
+
+def _flatten(results, prefix=''):
+    ''' Преобразовать вложенный dict с результатами в плоский dict с ключами вида 'libs/librnnoise_default/file/8000/rt'. '''
+
+    flat_results = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat_results.update(_flatten(value, prefix + key + '/'))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat_results[prefix + key] = value
+    return flat_results
+
+
+def compare_results(results, baseline, threshold=0.1):
+    ''' Сравнить результаты с эталоном. Для скорости обработки (rt) регрессией считается уменьшение, для остальных метрик
+    (задержка, память, время запуска) - увеличение более чем на threshold от значения эталона. Максимальная задержка не сравнивается.
+    1. results - dict с результатами run_benchmarks()
+    2. baseline - dict с результатами эталона
+    3. threshold - допустимое относительное ухудшение (0.1 = 10%)
+    4. возвращает список tuple из имени метрики, значения эталона, текущего значения и относительного изменения (только регрессии) '''
+
+    flat_results = _flatten(results.get('libs', {}), 'libs/')
+    flat_baseline = _flatten(baseline.get('libs', {}), 'libs/')
+
+    regressions = []
+    for name in sorted(set(flat_results) & set(flat_baseline)):
+        baseline_value, value = flat_baseline[name], flat_results[name]
+        # Максимальная задержка - единичный выброс (планировщик ОС, сборка мусора), поэтому она сохраняется, но не сравнивается
+        if baseline_value <= 0 or name.endswith('/max_us'):
+            continue
+        change = (value - baseline_value) / baseline_value
+        is_higher_better = name.endswith('/rt')
+        if (is_higher_better and change < -threshold) or (not is_higher_better and change > threshold):
+            regressions.append((name, baseline_value, value, change))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Microbenchmarks for RNNoise_Wrapper with JSON baselines.')
+    parser.add_argument('-o', '--output', type=str, default=None, help='Name .json file for results')
+    parser.add_argument('-b', '--baseline', type=str, default=None, help='Name .json file with baseline results for comparison')
+    parser.add_argument('-t', '--threshold', type=float, default=0.1, help='Allowed relative regression (default 0.1 = 10%%)')
+    parser.add_argument('-l', '--libs', type=str, nargs='+', default=None, help='RNNoise libraries (default: all bundled)')
+    parser.add_argument('-r', '--sample_rates', type=int, nargs='+', default=None, help='Sample rates (default: 8000 16000 48000)')
+    parser.add_argument('-s', '--buffer_sizes', type=int, nargs='+', default=None, help='Stream buffer sizes in ms (default: 10 20 100)')
+    parser.add_argument('-d', '--duration', type=float, default=10, help='Duration of synthetic audio in seconds (default: 10)')
+    parser.add_argument('--quick', action='store_true', help='Short run for smoke testing')
+    args = parser.parse_args()
+
+    duration_s, frames_count, repeats = args.duration, 2000, 3
+    if args.quick:
+        duration_s, frames_count, repeats = min(duration_s, 2), 200, 1
+
+    results = run_benchmarks(args.libs, args.sample_rates, args.buffer_sizes, duration_s, frames_count, repeats, log=print)
+
+    for f_name_lib, lib_results in results['libs'].items():
+        print("\n{}:".format(f_name_lib))
+        print('\timport {:.1f} ms, first RNNoise() {:.2f} ms, next RNNoise() {:.3f} ms'.format(
+            lib_results['startup']['import_ms'], lib_results['startup']['construct_ms'], lib_results['startup']['warm_construct_ms']))
+        frame_latency = lib_results['frame_latency']
+        print('\tfilter_frame(): p50 {:.1f} us, p95 {:.1f} us, p99 {:.1f} us, max {:.1f} us'.format(
+            frame_latency['p50_us'], frame_latency['p95_us'], frame_latency['p99_us'], frame_latency['max_us']))
+        for sample_rate, file_results in lib_results['file'].items():
+            print('\tfilter() {} Hz: {:.1f} RT, peak memory {:.2f} MB'.format(sample_rate, file_results['rt'], file_results['peak_memory_mb']))
+            for buffer_duration_ms, stream_latency in lib_results['stream_latency'][sample_rate].items():
+                print('\t\tstream {} ms: p50 {:.1f} us, p99 {:.1f} us, max {:.1f} us'.format(
+                    buffer_duration_ms, stream_latency['p50_us'], stream_latency['p99_us'], stream_latency['max_us']))
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f_output:
+            json.dump(results, f_output, indent=2)
+        print("\n[i] Results saved to '{}'".format(args.output))
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f_baseline:
+            baseline = json.load(f_baseline)
+        regressions = compare_results(results, baseline, args.threshold)
+        if regressions:
+            print('\n[E] {} regression(s) compared to the baseline (threshold {:.0%}):'.format(len(regressions), args.threshold))
+            for name, baseline_value, value, change in regressions:
+                print('\t{}: {:.3f} -> {:.3f} ({:+.1%})'.format(name, baseline_value, value, change))
+            sys.exit(1)
+        print('\n[i] No regressions compared to the baseline (threshold {:.0%})'.format(args.threshold))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,187 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+#       OS : GNU/Linux Ubuntu 16.04 or later
+# LANGUAGE : Python 3.5.2 or later
+#   AUTHOR : Klim V. O.
+# - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+'''
+Адаптивный пропуск фреймов, которые не нужно очищать от шума: цифровой тишины и (опционально) участков с высоким отношением
+сигнал/шум. Включается явно (см. RNNoise.enable_bypass()).
+
+Содержит класс AdaptiveBypass.
+
+Зависимости: numpy.
+'''
+
+import numpy as np
+
+
+class AdaptiveBypass(object):
+    ''' Адаптивный пропуск фреймов одного объекта RNNoise. Для каждого фрейма по его энергии (один векторный проход по блоку)
+    определяется, является ли он цифровой тишиной (все отсчёты равны 0) или, если задан min_snr_db, фреймом с высоким оценочным
+    отношением сигнал/шум (энергия фрейма относительно минимума энергии, медленно растущего со скоростью noise_rise_db_per_s).
+
+    Первые context_frames фреймов каждого такого участка обрабатываются RNNoise как обычно (на них затухает перекрытие
+    с предыдущими фреймами), остальные пропускаются: для тишины результат - тишина, для чистых участков - исходные отсчёты с той же
+    задержкой в 1 фрейм, которую вносит RNNoise. Перед возобновлением обработки через нейронную сеть (без использования результата)
+    прогоняются последние context_frames пропущенных фреймов, чтобы состояние DenoiseState соответствовало сигналу.
+
+    Вероятность наличия голоса для пропущенных фреймов тишины - 0, для пропущенных чистых фреймов - значение последнего
+    обработанного фрейма.
+
+    Атрибуты frames_count, silence_frames_bypassed и clean_frames_bypassed содержат количество всех фреймов и пропущенных фреймов
+    тишины и чистых фреймов, bypassed_fraction - долю пропущенных фреймов.
+
+    1. frame_size - длина фрейма в отсчётах
+    2. silence - True: пропускать цифровую тишину
+    3. min_snr_db - минимальное оценочное отношение сигнал/шум в дБ для пропуска чистых фреймов (если None - не пропускать)
+    4. context_frames - количество фреймов контекста, обрабатываемых RNNoise в начале участка и перед возобновлением обработки
+    5. noise_rise_db_per_s - скорость роста оценки уровня шума в дБ в секунду (при 10 мс на фрейм) '''
+
+    def __init__(self, frame_size=480, silence=True, min_snr_db=None, context_frames=4, noise_rise_db_per_s=3.0):
+        if context_frames < 1:
+            raise ValueError("'context_frames' must be greater than 0")
+
+        self.frame_size = frame_size
+        self.silence = silence
+        self.min_snr_db = min_snr_db
+        self.context_frames = context_frames
+        self.noise_rise_db_per_s = noise_rise_db_per_s
+
+        self.frames_count = 0
+        self.silence_frames_bypassed = 0
+        self.clean_frames_bypassed = 0
+        self.reset()
+
+
+    @property
+    def frames_bypassed(self):
+        return self.silence_frames_bypassed + self.clean_frames_bypassed
+
+
+    @property
+    def bypassed_fraction(self):
+        return self.frames_bypassed / self.frames_count if self.frames_count > 0 else 0.0
+
+
+    def copy(self):
+        ''' Создать новый объект с теми же параметрами, но без состояния и с нулевыми счётчиками (для RNNoise.spawn()). '''
+
+        return type(self)(self.frame_size, self.silence, self.min_snr_db, self.context_frames, self.noise_rise_db_per_s)
+
+
+    def reset(self):
+        ''' Сбросить состояние (вызывается из RNNoise.reset(), счётчики сохраняются). '''
+
+        self.__run_kind = None
+        self.__run_length = 0
+        self.__is_bypassing = False
+        self.__last_vad_probability = 0.0
+        self.__noise_energy = None
+        self.__history = np.zeros((self.context_frames, self.frame_size), dtype=np.float32)
+
+
+    def process(self, frames, process_frames):
+        ''' Очистить блок фреймов от шума на месте с пропуском тишины и чистых участков.
+        1. frames - numpy.ndarray float32 формы (N, frame_size)
+        2. process_frames - функция, очищающая C-непрерывный блок фреймов на месте с помощью RNNoise и возвращающая numpy.ndarray
+            float32 с вероятностью наличия голоса в каждом фрейме
+        3. возвращает numpy.ndarray float32 с вероятностью наличия голоса в каждом фрейме '''
+
+        frames_count = frames.shape[0]
+        vad_probabilities = np.empty(frames_count, dtype=np.float32)
+        if frames_count == 0:
+            return vad_probabilities
+
+        kinds = self.__get_kinds(np.einsum('ij,ij->i', frames, frames, dtype=np.float64))
+        is_bypassed = []
+        for kind in kinds:
+            if kind is not None and kind == self.__run_kind:
+                self.__run_length += 1
+            else:
+                self.__run_kind, self.__run_length = kind, 1
+            is_bypassed.append(kind is not None and self.__run_length > self.context_frames)
+
+        # Фреймы обрабатываются непрерывными отрезками с одинаковым решением, каждый отрезок RNNoise - одним вызовом
+        start = 0
+        while start < frames_count:
+            end = start + 1
+            while end < frames_count and is_bypassed[end] == is_bypassed[start]:
+                end += 1
+            if is_bypassed[start]:
+                self.__bypass_segment(frames[start:end], kinds[start], vad_probabilities[start:end])
+            else:
+                self.__process_segment(frames[start:end], process_frames, vad_probabilities[start:end])
+            start = end
+
+        self.frames_count += frames_count
+        return vad_probabilities
+
+
+    def __get_kinds(self, energies):
+        ''' Определить для каждого фрейма, можно ли его пропустить.
+        1. energies - numpy.ndarray float64 с энергией каждого фрейма (сумма квадратов отсчётов в шкале 16 бит)
+        2. возвращает список: 'silence' для цифровой тишины, 'clean' для фреймов с высоким отношением сигнал/шум, иначе None '''
+
+        if self.min_snr_db is None:
+            if not self.silence:
+                return [None] * energies.shape[0]
+            return ['silence' if is_silent else None for is_silent in (energies == 0.0).tolist()]
+
+        # Минимальный уровень - 1 единица младшего разряда 16 бит на отсчёт
+        min_noise_energy = float(self.frame_size)
+        noise_rise = 10.0 ** (self.noise_rise_db_per_s / 10.0 / 100.0)
+        min_snr = 10.0 ** (self.min_snr_db / 10.0)
+
+        kinds = []
+        noise_energy = self.__noise_energy
+        for energy in energies.tolist():
+            if energy == 0.0:
+                kinds.append('silence' if self.silence else None)
+                continue
+            noise_energy = max(min(energy, noise_energy * noise_rise) if noise_energy is not None else energy, min_noise_energy)
+            kinds.append('clean' if energy >= min_snr * noise_energy else None)
+        self.__noise_energy = noise_energy
+        return kinds
+
+
+    def __process_segment(self, frames, process_frames, vad_probabilities):
+        ''' Обработать отрезок фреймов RNNoise (после пропуска - с предварительным прогоном контекста). '''
+
+        if self.__is_bypassing:
+            process_frames(self.__history.copy())
+            self.__is_bypassing = False
+
+        self.__remember(frames)
+        vad_probabilities[:] = process_frames(frames)
+        self.__last_vad_probability = float(vad_probabilities[-1])
+
+
+    def __bypass_segment(self, frames, kind, vad_probabilities):
+        ''' Пропустить отрезок фреймов: результат - исходные отсчёты с задержкой в 1 фрейм (для тишины - нули). '''
+
+        self.__is_bypassing = True
+        source_frames = frames.copy()
+        frames[0] = self.__history[-1]
+        frames[1:] = source_frames[:-1]
+        self.__remember(source_frames)
+
+        if kind == 'silence':
+            vad_probabilities[:] = 0.0
+            self.silence_frames_bypassed += frames.shape[0]
+        else:
+            vad_probabilities[:] = self.__last_vad_probability
+            self.clean_frames_bypassed += frames.shape[0]
+
+
+    def __remember(self, frames):
+        ''' Сохранить последние context_frames исходных фреймов (для задержки пропущенных фреймов и прогона контекста). '''
+
+        frames_count = frames.shape[0]
+        if frames_count >= self.context_frames:
+            self.__history[:] = frames[-self.context_frames:]
+        else:
+            self.__history[:-frames_count] = self.__history[frames_count:]
+            self.__history[-frames_count:] = frames
@@ -0,0 +1,314 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+#       OS : GNU/Linux Ubuntu 16.04 or later
+# LANGUAGE : Python 3.5.2 or later
+#   AUTHOR : Klim V. O.
+# - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+'''
+Кэш очищенных от шума аудиозаписей на диске с адресацией по содержимому: при повторной обработке той же аудиозаписи той же
+моделью с теми же параметрами результат берётся из кэша без чтения, шумоподавления и записи .wav.
+
+Содержит класс DenoiseCache.
+
+Зависимости: pydub, numpy.
+'''
+
+import os
+import shutil
+import hashlib
+import tempfile
+import threading
+import numpy as np
+from pydub import AudioSegment
+
+from .rnnoise_wrapper import _as_samples
+from .wav_io import read_wav_info
+
+
+# Версия формата ключа: при изменении результата шумоподавления (а не только формата кэша) её нужно увеличить
+_KEY_VERSION = b'rnnoise_wrapper-cache-1'
+
+# Хэши библиотек и файлов весов моделей, ключ - (путь, размер, время изменения)
+_model_hashes = {}
+_model_hashes_lock = threading.Lock()
+
+
+def _hash_file(f_name, hasher, block_size=1024*1024):
+    ''' Добавить содержимое файла в hasher, читая его блоками (без загрузки файла в память целиком). '''
+
+    with open(f_name, 'rb') as f_data:
+        while True:
+            block = f_data.read(block_size)
+            if not block:
+                return hasher
+            hasher.update(block)
+
+
+def _get_model_hash(f_name_model):
+    ''' Получить хэш содержимого библиотеки или файла весов модели (вычисляется один раз на процесс для каждой версии файла),
+    чтобы ключ кэша зависел от самой модели, а не от её имени или пути.
+    1. f_name_model - путь к библиотеке или файлу весов
+    2. возвращает шестнадцатеричную строку '''
+
+    stat = os.stat(f_name_model)
+    key = (os.path.abspath(f_name_model), stat.st_size, stat.st_mtime_ns)
+    with _model_hashes_lock:
+        model_hash = _model_hashes.get(key)
+        if model_hash is None:
+            model_hash = _hash_file(f_name_model, hashlib.sha256()).hexdigest()
+            _model_hashes[key] = model_hash
+    return model_hash
+
+
+class DenoiseCache(object):
+    ''' Кэш результатов шумоподавления в папке на диске:
+    - filter(): RNNoise.filter() с кэшированием результата
+    - filter_file(): RNNoise.filter_file() с кэшированием результата
+    - get(), put(): получить/сохранить запись по ключу
+    - clear(): удалить все записи
+
+    Ключ записи - sha256 от исходных аудиоданных (для filter_file() - байтов .wav файла, без декодирования), содержимого
+    библиотеки модели (и файла весов, если он используется) и параметров шумоподавления. Записи сохраняются атомарно (во временный файл с последующим
+    переименованием), поэтому кэш можно использовать из нескольких процессов одновременно. Когда общий размер записей превышает
+    max_size, удаляются записи, к которым дольше всех не обращались (время последнего обращения хранится во времени изменения
+    файла записи).
+
+    Атрибуты hits, misses и evictions содержат количество попаданий, промахов и удалённых записей этого объекта, size -
+    текущий размер записей в байтах.
+
+    1. folder_name - папка кэша (будет создана, если не существует)
+    2. max_size - максимальный общий размер записей в байтах '''
+
+    def __init__(self, folder_name, max_size=1024**3):
+        if max_size <= 0:
+            raise ValueError("'max_size' must be greater than 0")
+
+        self.folder_name = folder_name
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        os.makedirs(folder_name, exist_ok=True)
+        self.__lock = threading.Lock()
+        self.size = sum(entry_size for _, _, entry_size in self.__scan_entries())
+
+
+    def get_key(self, denoiser, audio_hasher, *params):
+        ''' Получить ключ записи.
+        1. denoiser - объект RNNoise (учитывается содержимое его библиотеки и файла весов и параметры адаптивного пропуска фреймов)
+        2. audio_hasher - объект hashlib с уже добавленными исходными аудиоданными
+        3. params - параметры шумоподавления, влияющие на результат
+        4. возвращает шестнадцатеричную строку '''
+
+        audio_hasher.update(_KEY_VERSION)
+        audio_hasher.update(_get_model_hash(denoiser.f_name_lib).encode())
+        if denoiser.model_path:
+            audio_hasher.update(_get_model_hash(denoiser.model_path).encode())
+        audio_hasher.update(repr(params).encode())
+
+        # Адаптивный пропуск фреймов меняет результат, поэтому его параметры входят в ключ (без пропуска ключи не меняются)
+        bypass = denoiser.bypass
+        if bypass is not None:
+            audio_hasher.update(repr(('bypass', bypass.frame_size, bypass.silence, bypass.min_snr_db, bypass.context_frames,
+                                      bypass.noise_rise_db_per_s)).encode())
+        return audio_hasher.hexdigest()
+
+
+    def get(self, key):
+        ''' Получить путь к записи (с обновлением времени последнего обращения).
+        1. key - ключ записи
+        2. возвращает путь к файлу записи или None, если записи нет '''
+
+        f_name_entry = self.__get_entry_path(key)
+        try:
+            os.utime(f_name_entry)
+        except OSError:
+            with self.__lock:
+                self.misses += 1
+            return None
+
+        with self.__lock:
+            self.hits += 1
+        return f_name_entry
+
+
+    def put(self, key, f_name_data):
+        ''' Сохранить файл в кэш. Файл перемещается (а не копируется), поэтому должен находиться на той же файловой системе,
+        что и кэш (например, быть создан через get_temp_path()).
+        1. key - ключ записи
+        2. f_name_data - имя файла с содержимым записи
+        3. возвращает путь к файлу записи (или None, если запись больше max_size и не сохранена) '''
+
+        data_size = os.path.getsize(f_name_data)
+        if data_size > self.max_size:
+            os.remove(f_name_data)
+            return None
+
+        f_name_entry = self.__get_entry_path(key)
+        os.makedirs(os.path.dirname(f_name_entry), exist_ok=True)
+
+        # Запись с тем же ключом могла быть уже сохранена (например, другим потоком одновременно с этим): после переименования
+        # останется один файл, поэтому к размеру добавляется только разница с заменяемым файлом
+        with self.__lock:
+            try:
+                replaced_size = os.path.getsize(f_name_entry)
+            except OSError:
+                replaced_size = 0
+            os.replace(f_name_data, f_name_entry)
+
+            self.size += data_size - replaced_size
+            if self.size > self.max_size:
+                self.__evict()
+        return f_name_entry
+
+
+    def get_temp_path(self):
+        ''' Получить имя нового временного файла в папке кэша (для последующего put()).
+        1. возвращает имя файла '''
+
+        f_temp, f_name_temp = tempfile.mkstemp(suffix='.part', dir=self.folder_name)
+        os.close(f_temp)
+        return f_name_temp
+
+
+    def clear(self):
+        ''' Удалить все записи. '''
+
+        with self.__lock:
+            for f_name_entry, _, _ in self.__scan_entries():
+                self.__remove_entry(f_name_entry)
+            self.size = 0
+
+
+    def filter(self, denoiser, audio, sample_rate=None, voice_prob_threshold=0.0, save_source_sample_rate=True):
+        ''' Очистить аудиозапись от шума (см. RNNoise.filter()) с кэшированием результата. Аудиозапись обрабатывается со
+        сброшенным состоянием нейронной сети, чтобы результат не зависел от предыдущих вызовов.
+        1. denoiser - объект RNNoise
+        2. audio - аудиозапись (см. RNNoise.filter())
+        3. sample_rate - частота дискретизации (обязательно, когда audio - не pydub.AudioSegment)
+        4. voice_prob_threshold - порог вероятности наличия голоса в каждом фрейме (значение от 0 до 1, если 0 - использовать все фреймы)
+        5. save_source_sample_rate - True: приводить частоту дискретизации возвращаемой аудиозаписи к исходной
+        6. возвращает аудиозапись, очищенную от шума (тип как у RNNoise.filter()) '''
+
+        if isinstance(audio, AudioSegment):
+            source_sample_rate = audio.frame_rate
+            if audio.sample_width != denoiser.sample_width or audio.channels != denoiser.channels:
+                return denoiser.filter(audio, sample_rate, voice_prob_threshold, save_source_sample_rate)
+            samples = _as_samples(audio.raw_data)
+        else:
+            source_sample_rate = sample_rate
+            samples = _as_samples(audio)
+        target_sample_rate = source_sample_rate if save_source_sample_rate else denoiser.sample_rate
+
+        audio_hasher = hashlib.sha256(np.ascontiguousarray(samples).view(np.uint8))
+        key = self.get_key(denoiser, audio_hasher, 'filter', samples.dtype.str, source_sample_rate, float(voice_prob_threshold),
+                           bool(save_source_sample_rate))
+
+        f_name_entry = self.get(key)
+        if f_name_entry is not None:
+            with open(f_name_entry, 'rb') as f_entry:
+                denoised_data = f_entry.read()
+        else:
+            denoiser.reset()
+            denoised_audio = denoiser.filter(audio, sample_rate, voice_prob_threshold, save_source_sample_rate)
+            denoised_data = denoised_audio.raw_data if isinstance(denoised_audio, AudioSegment) else bytes(memoryview(denoised_audio))
+
+            f_name_temp = self.get_temp_path()
+            with open(f_name_temp, 'wb') as f_temp:
+                f_temp.write(denoised_data)
+            self.put(key, f_name_temp)
+            return denoised_audio
+
+        if isinstance(audio, AudioSegment):
+            return AudioSegment(data=denoised_data, sample_width=denoiser.sample_width, frame_rate=target_sample_rate,
+                                channels=denoiser.channels)
+        elif isinstance(audio, np.ndarray):
+            return np.frombuffer(denoised_data, dtype=np.float32 if audio.dtype.kind == 'f' else np.int16).copy()
+        return denoised_data
+
+
+    def filter_file(self, denoiser, f_name_wav, f_name_denoised_wav, voice_prob_threshold=0.0, save_source_sample_rate=True,
+                    block_duration_s=10):
+        ''' Очистить .wav аудиозапись от шума и сохранить результат в другой .wav файл (см. RNNoise.filter_file()) с кэшированием
+        результата. При попадании исходная аудиозапись не декодируется, а готовый результат копируется из кэша. Аудиозапись
+        обрабатывается со сброшенным состоянием нейронной сети.
+        1. denoiser - объект RNNoise
+        2. f_name_wav - имя исходной .wav аудиозаписи
+        3. f_name_denoised_wav - имя .wav аудиозаписи для результата
+        4. voice_prob_threshold - порог вероятности наличия голоса в каждом фрейме (значение от 0 до 1, если 0 - использовать все фреймы)
+        5. save_source_sample_rate - True: сохранять результат в исходной частоте дискретизации, False - в 48 кГц
+        6. block_duration_s - длина обрабатываемого за раз блока в секундах
+        7. возвращает tuple из длины исходной аудиозаписи в секундах и True, если результат взят из кэша '''
+
+        key = self.get_key(denoiser, _hash_file(f_name_wav, hashlib.sha256()), 'filter_file', float(voice_prob_threshold),
+                           bool(save_source_sample_rate))
+
+        f_name_entry = self.get(key)
+        if f_name_entry is not None:
+            wav_info = read_wav_info(f_name_wav)
+            shutil.copyfile(f_name_entry, f_name_denoised_wav)
+            return wav_info.data_size / (wav_info.sample_width * wav_info.channels * wav_info.sample_rate), True
+
+        f_name_temp = self.get_temp_path()
+        try:
+            denoiser.reset()
+            audio_length = denoiser.filter_file(f_name_wav, f_name_temp, voice_prob_threshold, save_source_sample_rate, block_duration_s)
+            shutil.copyfile(f_name_temp, f_name_denoised_wav)
+            self.put(key, f_name_temp)
+        finally:
+            if os.path.exists(f_name_temp):
+                os.remove(f_name_temp)
+        return audio_length, False
+
+
+    def __get_entry_path(self, key):
+        ''' Получить путь к файлу записи (записи распределены по подпапкам по первым двум символам ключа). '''
+
+        return os.path.join(self.folder_name, key[:2], key)
+
+
+    def __scan_entries(self):
+        ''' Получить список записей кэша (в том числе сохранённых другими процессами).
+        1. возвращает список tuple из пути к файлу, времени последнего обращения и размера '''
+
+        entries = []
+        for folder_name, _, f_names in os.walk(self.folder_name):
+            if folder_name == self.folder_name:
+                continue
+            for f_name in f_names:
+                f_name_entry = os.path.join(folder_name, f_name)
+                try:
+                    stat = os.stat(f_name_entry)
+                except OSError:
+                    continue
+                entries.append((f_name_entry, stat.st_mtime, stat.st_size))
+        return entries
+
+
+    def __evict(self):
+        ''' Удалять записи, к которым дольше всех не обращались, пока общий размер превышает max_size (вызывается под блокировкой).
+        Размер пересчитывается по содержимому папки, чтобы учесть записи других процессов. '''
+
+        entries = sorted(self.__scan_entries(), key=lambda entry: entry[1])
+        self.size = sum(entry_size for _, _, entry_size in entries)
+        for f_name_entry, _, entry_size in entries:
+            if self.size <= self.max_size:
+                break
+            if self.__remove_entry(f_name_entry):
+                self.size -= entry_size
+                self.evictions += 1
+
+
+    @staticmethod
+    def __remove_entry(f_name_entry):
+        ''' Удалить файл записи (запись могла быть уже удалена другим процессом).
+        1. возвращает True, если файл был удалён '''
+
+        try:
+            os.remove(f_name_entry)
+            return True
+        except OSError:
+            return False
@@ -0,0 +1,298 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+#       OS : GNU/Linux Ubuntu 16.04 or later
+# LANGUAGE : Python 3.5.2 or later
+#   AUTHOR : Klim V. O.
+# - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+'''
+Шумоподавление одной длинной аудиозаписи на нескольких ядрах: аудиозапись разбивается на части, которые очищаются параллельно
+со своими состояниями нейронной сети и затем склеиваются.
+
+Содержит класс ChunkedRNNoise.
+
+Зависимости: pydub, numpy.
+'''
+
+import os
+import math
+import queue
+import collections
+import concurrent.futures
+import numpy as np
+from pydub import AudioSegment
+
+from .rnnoise_wrapper import RNNoise, _as_samples, _copy_samples, _drop_frames, _get_samples_scale
+from .resampler import Resampler
+from .wav_io import WavWriter, iter_wav_blocks, read_wav_info, to_mono
+
+
+class ChunkedRNNoise(object):
+    ''' Шумоподавление одной длинной аудиозаписи (например, многочасовой записи совещания) параллельно на нескольких ядрах:
+    - filter(): очистка от шума аудиозаписи
+    - filter_file(): очистка от шума .wav аудиозаписи любой длины с сохранением результата в файл (расход памяти ограничен)
+    - close(): остановить пул потоков выполнения
+
+    Аудиозапись (уже приведённая к 48 кГц) разбивается на части длиной chunk_s секунд, каждая часть очищается в пуле потоков
+    выполнения своим объектом RNNoise со сброшенным состоянием нейронной сети. Перед частью через RNNoise прогоняются warmup_s секунд
+    предшествующего ей аудио (результат отбрасывается), чтобы к началу части состояние нейронной сети успело подстроиться под шум
+    (RNNoise нужна примерно 1 секунда контекста, см. RNNoise.filter()). Последние crossfade_ms миллисекунд каждой части плавно
+    (линейно) переходят в результат следующей части для того же участка аудио, поэтому результат выровнен по отсчётам с исходной
+    аудиозаписью, а его длина равна её длине (неполный последний фрейм не дополняется тишиной в результате).
+
+    Первая часть обрабатывается так же, как RNNoise.filter() со сброшенным состоянием, в остальных результат отличается от
+    последовательной обработки только в начале частей (пока состояние после прогона контекста не сошлось). Дополнительная
+    работа - warmup_s / chunk_s от длины аудиозаписи. Для заметного ускорения нужна вспомогательная библиотека rnnoise_batch.so
+    (см. MultiStreamDenoiser): она отпускает GIL на время обработки части.
+
+    1. workers - количество потоков выполнения и объектов RNNoise (если None - по количеству ядер процессора)
+    2. f_name_lib - путь к библиотеке или её имя/субимя (см. RNNoise)
+    3. model_path - путь к файлу весов модели (см. RNNoise)
+    4. chunk_s - длина части в секундах
+    5. warmup_s - длина контекста перед каждой частью в секундах
+    6. crossfade_ms - длина плавного перехода между частями в миллисекундах (округляется вверх до 10 мс, если 0 - без перехода) '''
+
+    sample_width = 2
+
+    def __init__(self, workers=None, f_name_lib=None, model_path=None, chunk_s=30.0, warmup_s=3.0, crossfade_ms=20):
+        denoiser = RNNoise(f_name_lib, model_path)
+        frames_per_second = 1000 // denoiser.frame_duration_ms
+
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_frames = int(round(chunk_s * frames_per_second))
+        self.warmup_frames = int(math.ceil(warmup_s * frames_per_second))
+        self.crossfade_frames = int(math.ceil(crossfade_ms / denoiser.frame_duration_ms))
+        if self.chunk_frames <= self.crossfade_frames:
+            raise ValueError("'chunk_s' must be longer than 'crossfade_ms'")
+        if self.warmup_frames < 0 or self.crossfade_frames < 0:
+            raise ValueError("'warmup_s' and 'crossfade_ms' can not be negative")
+
+        self.denoisers = [denoiser] + [denoiser.spawn() for _ in range(self.workers - 1)]
+        self.sample_rate = denoiser.sample_rate
+        self.frame_size = denoiser.frame_size
+
+        self.__free_denoisers = queue.Queue()
+        for denoiser in self.denoisers:
+            self.__free_denoisers.put_nowait(denoiser)
+
+        self.__executor = None
+        if self.workers > 1:
+            self.__executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.workers)
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+    def close(self):
+        ''' Дождаться завершения всех задач и остановить пул потоков выполнения. '''
+
+        if self.__executor is not None:
+            self.__executor.shutdown(wait=True)
+            self.__executor = None
+
+
+    def filter(self, audio, sample_rate=None, voice_prob_threshold=0.0, save_source_sample_rate=True, float_output=False):
+        ''' Очистить аудиозапись от шума параллельно по частям.
+        1. audio - аудиозапись моно (см. RNNoise.filter())
+        2. sample_rate - частота дискретизации (обязательно, когда audio - не pydub.AudioSegment)
+        3. voice_prob_threshold - порог вероятности наличия голоса в каждом фрейме (значение от 0 до 1, если 0 - использовать все фреймы)
+        4. save_source_sample_rate - True: приводить частоту дискретизации возвращаемой аудиозаписи к исходной
+        5. float_output - True: вернуть numpy.ndarray float32 (значения от -1 до 1) без приведения к int16
+        6. возвращает аудиозапись, очищенную от шума (тип как у RNNoise.filter()) '''
+
+        if isinstance(audio, AudioSegment):
+            samples, source_sample_rate = _as_samples(audio.raw_data), audio.frame_rate
+        else:
+            if not sample_rate:
+                raise ValueError("when type(audio) = '{}', 'sample_rate' can not be None".format(type(audio).__name__))
+            samples, source_sample_rate = _as_samples(audio), sample_rate
+        target_sample_rate = source_sample_rate if save_source_sample_rate else self.sample_rate
+
+        denoised_chunks = list(self.__filter_samples([samples], samples.shape[0], source_sample_rate, target_sample_rate,
+                                                     voice_prob_threshold, _get_samples_scale(samples)))
+        denoised_samples = np.concatenate(denoised_chunks) if denoised_chunks else np.zeros(0, dtype=np.float32)
+
+        if float_output or (isinstance(audio, np.ndarray) and audio.dtype.kind == 'f'):
+            return np.multiply(denoised_samples, np.float32(1.0 / 32768), dtype=np.float32)
+
+        denoised_samples = RNNoise.to_int16(denoised_samples)
+        if isinstance(audio, AudioSegment):
+            return AudioSegment(data=denoised_samples.tobytes(), sample_width=self.sample_width, frame_rate=target_sample_rate, channels=1)
+        elif isinstance(audio, np.ndarray):
+            return denoised_samples
+        return denoised_samples.tobytes()
+
+
+    def filter_file(self, f_name_wav, f_name_denoised_wav, voice_prob_threshold=0.0, save_source_sample_rate=True, block_duration_s=10):
+        ''' Очистить .wav аудиозапись от шума параллельно по частям и сохранить результат в другой .wav файл. Аудиоданные читаются
+        блоками, а в памяти одновременно находится не больше 2*workers частей, поэтому расход памяти не зависит от длины аудиозаписи.
+        Поддерживаются .wav аудиозаписи 8/16/24/32 бит и float, многоканальные приводятся к моно (см. wav_io.to_mono()).
+        1. f_name_wav - имя исходной .wav аудиозаписи
+        2. f_name_denoised_wav - имя .wav аудиозаписи для результата
+        3. voice_prob_threshold - порог вероятности наличия голоса в каждом фрейме (значение от 0 до 1, если 0 - использовать все фреймы)
+        4. save_source_sample_rate - True: сохранять результат в исходной частоте дискретизации, False - в 48 кГц
+        5. block_duration_s - длина читаемого за раз блока в секундах
+        6. возвращает длину исходной аудиозаписи в секундах '''
+
+        wav_info = read_wav_info(f_name_wav)
+        samples_count = wav_info.data_size // (wav_info.sample_width * wav_info.channels)
+        target_sample_rate = wav_info.sample_rate if save_source_sample_rate else self.sample_rate
+        block_size = max(int(block_duration_s * wav_info.sample_rate), 1)
+
+        blocks = (to_mono(block, wav_info) for block in iter_wav_blocks(f_name_wav, block_size))
+        with WavWriter(f_name_denoised_wav, target_sample_rate, self.sample_width, 1) as wav_writer:
+            for denoised_samples in self.__filter_samples(blocks, samples_count, wav_info.sample_rate, target_sample_rate,
+                                                          voice_prob_threshold):
+                wav_writer.write(RNNoise.to_int16(denoised_samples))
+
+        return samples_count / wav_info.sample_rate
+
+
+    def __filter_samples(self, blocks, samples_count, sample_rate, target_sample_rate, voice_prob_threshold, scale=1.0):
+        ''' Очистить от шума аудиозапись, представленную последовательными блоками отсчётов.
+        1. blocks - итерируемый объект с одномерными numpy.ndarray отсчётов с частотой дискретизации sample_rate
+        2. samples_count - общее количество отсчётов во всех блоках
+        3. sample_rate - частота дискретизации блоков
+        4. target_sample_rate - частота дискретизации результата
+        5. voice_prob_threshold - порог вероятности наличия голоса в каждом фрейме
+        6. scale - множитель для приведения отсчётов к шкале 16 бит
+        7. возвращает генератор numpy.ndarray float32 с очищенными отсчётами в шкале 16 бит '''
+
+        input_resampler = Resampler(sample_rate, self.sample_rate) if sample_rate != self.sample_rate else None
+        output_resampler = Resampler(self.sample_rate, target_sample_rate) if target_sample_rate != self.sample_rate else None
+        if input_resampler is not None:
+            blocks = self.__resample_blocks(blocks, input_resampler)
+            samples_count = -(-samples_count * self.sample_rate // sample_rate)
+
+        padding = -samples_count % self.frame_size
+        frames_count = 0
+        for frames, vad_probabilities in self.__filter_chunks(self.__iter_chunks(blocks, scale)):
+            frames_count += frames.shape[0]
+            is_last_block = frames_count * self.frame_size >= samples_count
+            frames = _drop_frames(None, frames, vad_probabilities, voice_prob_threshold)
+
+            # Дополненный нулями последний фрейм оказывается последним в последнем блоке, в результат попадает только реальная длина
+            denoised_samples = frames.reshape(-1)
+            if is_last_block and padding > 0 and vad_probabilities[-1] >= voice_prob_threshold:
+                denoised_samples = denoised_samples[:denoised_samples.shape[0]-padding]
+
+            if output_resampler is not None:
+                denoised_samples = output_resampler.process(denoised_samples)
+            yield denoised_samples
+
+        if output_resampler is not None:
+            yield output_resampler.flush()
+
+
+    @staticmethod
+    def __resample_blocks(blocks, resampler):
+        ''' Привести блоки отсчётов к 48 кГц потоковым ресемплером (с сохранением истории фильтра между блоками). '''
+
+        for block in blocks:
+            yield resampler.process(block)
+        yield resampler.flush()
+
+
+    def __iter_chunks(self, blocks, scale=1.0):
+        ''' Собрать из блоков отсчётов 48 кГц части по chunk_frames фреймов (последняя часть может быть короче, её последний
+        фрейм дополняется нулями).
+        1. blocks - итерируемый объект с одномерными numpy.ndarray отсчётов
+        2. scale - множитель для приведения отсчётов к шкале 16 бит
+        3. возвращает генератор numpy.ndarray float32 формы (N, 480) '''
+
+        chunk_size = self.chunk_frames * self.frame_size
+        chunk = np.zeros(chunk_size, dtype=np.float32)
+        chunk_fill = 0
+        for block in blocks:
+            position = 0
+            while position < block.shape[0]:
+                copied_count = min(chunk_size - chunk_fill, block.shape[0] - position)
+                _copy_samples(chunk[chunk_fill:chunk_fill+copied_count], block[position:position+copied_count], scale)
+                chunk_fill += copied_count
+                position += copied_count
+                if chunk_fill == chunk_size:
+                    yield chunk.reshape(-1, self.frame_size)
+                    chunk = np.zeros(chunk_size, dtype=np.float32)
+                    chunk_fill = 0
+
+        if chunk_fill > 0:
+            yield chunk[:-(-chunk_fill // self.frame_size) * self.frame_size].reshape(-1, self.frame_size)
+
+
+    def __filter_chunks(self, chunks):
+        ''' Очистить части параллельно и склеить результат с плавным переходом между частями.
+        1. chunks - итерируемый объект с последовательными частями (numpy.ndarray float32 формы (N, 480))
+        2. возвращает генератор tuple из очищенных фреймов и вероятности наличия голоса в них, по порядку частей (вместе
+            фреймы всех tuple - это вся аудиозапись) '''
+
+        context_frames = self.warmup_frames + self.crossfade_frames
+        context = None
+        pending = collections.deque()
+        tail = None
+
+        def stitch(result):
+            nonlocal tail
+            context_tail, frames, vad_probabilities = result
+
+            # Переход между частями: последние фреймы предыдущей части -> результат этой части для тех же фреймов контекста
+            if tail is not None:
+                tail_frames, tail_vad_probabilities = tail
+                tail_samples = tail_frames.reshape(-1)
+                weights = (np.arange(tail_samples.shape[0], dtype=np.float32) + 0.5) / tail_samples.shape[0]
+                tail_samples += (context_tail[-tail_frames.shape[0]:].reshape(-1) - tail_samples) * weights
+                yield tail_frames, tail_vad_probabilities
+
+            held_count = min(self.crossfade_frames, frames.shape[0])
+            tail = (frames[frames.shape[0]-held_count:], vad_probabilities[vad_probabilities.shape[0]-held_count:]) if held_count > 0 else None
+            yield frames[:frames.shape[0]-held_count], vad_probabilities[:vad_probabilities.shape[0]-held_count]
+
+        for chunk in chunks:
+            # Контекст следующей части копируется до отправки этой части на обработку (она очищается на месте)
+            prefix = context
+            if context_frames > 0:
+                context = chunk[-context_frames:] if prefix is None else np.concatenate((prefix, chunk[-context_frames:]))[-context_frames:]
+                context = context.copy()
+
+            pending.append(self.__submit(self.__filter_chunk, prefix, chunk))
+            while pending and (len(pending) > 2 * self.workers or pending[0].done()):
+                yield from stitch(pending.popleft().result())
+
+        while pending:
+            yield from stitch(pending.popleft().result())
+        if tail is not None:
+            yield tail
+
+
+    def __filter_chunk(self, context, chunk):
+        ''' Очистить одну часть на месте (выполняется в пуле потоков выполнения).
+        1. context - numpy.ndarray float32 с фреймами контекста перед частью (копия) или None для первой части
+        2. chunk - numpy.ndarray float32 формы (N, 480) с фреймами части
+        3. возвращает tuple из очищенных фреймов контекста (или None), очищенных фреймов части и вероятности наличия голоса в них '''
+
+        denoiser = self.__free_denoisers.get()
+        try:
+            denoiser.reset()
+            if context is not None:
+                denoiser.process_block(context)
+            vad_probabilities = denoiser.process_block(chunk)
+        finally:
+            self.__free_denoisers.put_nowait(denoiser)
+        return context, chunk, vad_probabilities
+
+
+    def __submit(self, function, *args):
+        ''' Выполнить function в пуле потоков выполнения (или сразу в текущем потоке, если workers = 1).
+        1. возвращает concurrent.futures.Future '''
+
+        if self.__executor is not None:
+            return self.__executor.submit(function, *args)
+
+        future = concurrent.futures.Future()
+        future.set_result(function(*args))
+        return future
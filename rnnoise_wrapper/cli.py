@@ -7,31 +7,106 @@
 # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
 '''
-Simple CLI for rnnoise_wrapper.RNNoise().
+Simple CLI for rnnoise_wrapper.RNNoise(): one audio file, parallel batch mode for folders, glob patterns and manifest files
+or raw PCM pipe mode (stdin/stdout).
 '''
 
 import os
 import sys
+import glob
+import json
 import time
 import argparse
-from rnnoise_wrapper import RNNoise
+from rnnoise_wrapper import RNNoise, RNNoiseStream, ChunkedRNNoise
+from rnnoise_wrapper.wav_io import PCM_FORMATS, WavWriter, get_raw_wav_info, iter_raw_blocks, to_mono
+from rnnoise_wrapper.cache import DenoiseCache
+from rnnoise_wrapper.batch import FileResult, denoise_files, find_files, is_up_to_date, read_manifest
 
 
 def denoise():
     parser = argparse.ArgumentParser(description='Simple CLI for audio noise reduction using RNNoise_Wrapper.')
-    parser.add_argument('-i', '--source_audio', type=str, required=True,
-                        help='Name .wav audio for noise reduction (for example, "test_audio/source/test_3.wav")')
+    parser.add_argument('-i', '--source_audio', type=str, nargs='+',
+                        help='Name .wav audio for noise reduction (for example, "test_audio/source/test_3.wav"), or folders and glob ' + \
+                             'patterns (for example, "test_audio/source", "test_audio/**/*.wav") for batch mode, or "-" to read ' + \
+                             'raw PCM from stdin (pipe mode)')
     parser.add_argument('-o', '--denoised_audio', type=str, required=True,
-                        help='Name .wav audio for result (for example, "test_audio/test_3_denoised.wav")')
-    
+                        help='Name .wav audio for result (for example, "test_audio/test_3_denoised.wav"), or output folder ' + \
+                             'in batch mode (the structure of source folders is mirrored), or "-" to write raw PCM to stdout in pipe mode')
+    parser.add_argument('-m', '--manifest', type=str, default=None,
+                        help='File with source audio names (one per line, optionally followed by tab and output name) for batch mode')
+    parser.add_argument('-w', '--workers', type=int, default=None,
+                        help='Number of worker processes in batch mode or threads with --chunk_s (default: number of CPU cores)')
+    parser.add_argument('-r', '--report', type=str, default=None,
+                        help='Name .jsonl file for per-file report in batch mode')
+    parser.add_argument('-f', '--force', action='store_true',
+                        help='Process files even if output is newer than source audio (batch mode)')
+    parser.add_argument('-n', '--no_recursive', action='store_true',
+                        help='Do not recurse into subfolders (batch mode)')
+    parser.add_argument('-l', '--lib', type=str, default=None,
+                        help='Path to RNNoise library or its name/subname (default: RNNOISE_LIB or librnnoise_5h_b_500k)')
+    parser.add_argument('--model', type=str, default=None,
+                        help='Path to RNNoise model weights file (rnnoise-nu format) to use instead of the model built into the library')
+    parser.add_argument('-t', '--voice_prob_threshold', type=float, default=0.0,
+                        help='Remove frames with voice probability below this threshold (from 0 to 1, default: 0 - keep all frames)')
+    parser.add_argument('-q', '--quiet', action='store_true',
+                        help='Do not display progress in batch mode')
+    parser.add_argument('-c', '--cache_dir', type=str, default=None,
+                        help='Folder for cache of denoised audio: files already denoised with the same model and parameters are ' + \
+                             'copied from cache without processing')
+    parser.add_argument('--cache_size_mb', type=int, default=1024,
+                        help='Maximum cache size in megabytes, least recently used entries are evicted (default: 1024)')
+    parser.add_argument('--chunk_s', type=float, default=None,
+                        help='Denoise one long file in parallel: split it into chunks of this length in seconds, each with its own ' + \
+                             'RNNoise state and 3 s of preceding audio as warm-up, and stitch them with a 20 ms crossfade (single file only)')
+    parser.add_argument('--sample_rate', type=int, default=48000,
+                        help='Sample rate of raw PCM in pipe mode (default: 48000)')
+    parser.add_argument('--pcm_format', type=str, default='s16le', choices=list(PCM_FORMATS),
+                        help='Sample format of raw PCM from stdin in pipe mode (default: s16le)')
+    parser.add_argument('--channels', type=int, default=1,
+                        help='Number of interleaved channels of raw PCM in pipe mode, they are mixed down to mono (default: 1)')
+    parser.add_argument('--output_format', type=str, default='s16le', choices=['s16le', 'f32le'],
+                        help='Sample format of denoised mono raw PCM written to stdout in pipe mode (default: s16le)')
+    parser.add_argument('--block_ms', type=int, default=10,
+                        help='Maximum duration of one block read from stdin in pipe mode, in milliseconds (default: 10)')
+    parser.add_argument('--vad_fd', type=int, default=None,
+                        help='File descriptor for VAD track in pipe mode: one line "<time_s>\\t<voice_probability>" per 10 ms frame')
+
     if len(sys.argv) < 2:
         parser.print_help()
         sys.exit(1)
 
     args = parser.parse_args()
+    if not args.source_audio and not args.manifest:
+        parser.error("at least one of the arguments -i/--source_audio -m/--manifest is required")
+    if args.chunk_s is not None and (args.source_audio == ['-'] or not _is_single_file(args)):
+        parser.error("'--chunk_s' is supported only for one source audio file and a file name in '-o/--denoised_audio'")
+
+    if args.source_audio == ['-']:
+        _denoise_pipe(args)
+    elif args.denoised_audio == '-':
+        parser.error("'-o -' is supported only together with '-i -'")
+    elif args.chunk_s is not None and args.cache_dir:
+        parser.error("'--chunk_s' can not be used together with '-c/--cache_dir'")
+    elif _is_single_file(args):
+        _denoise_single_file(args.source_audio[0], args.denoised_audio, args.lib, args.voice_prob_threshold, args.cache_dir,
+                             args.cache_size_mb, args.model, args.chunk_s, args.workers)
+    else:
+        failed_count = _denoise_batch(args)
+        sys.exit(1 if failed_count > 0 else 0)
+
+
+def _is_single_file(args):
+    ''' Проверить, что передана одна аудиозапись и имя файла для результата (а не папка для пакетного режима). '''
+
+    if args.manifest or len(args.source_audio) != 1 or os.path.isdir(args.denoised_audio):
+        return False
+    f_name_audio = args.source_audio[0]
+    return not os.path.isdir(f_name_audio) and not glob.has_magic(f_name_audio)
 
-    f_name_audio = args.source_audio
-    f_name_denoised_audio = args.denoised_audio
+
+def _denoise_single_file(f_name_audio, f_name_denoised_audio, f_name_lib=None, voice_prob_threshold=0.0, cache_dir=None, cache_size_mb=1024,
+                         model_path=None, chunk_s=None, workers=None):
+    ''' Очистить от шума одну аудиозапись (если задан chunk_s - параллельно по частям, см. ChunkedRNNoise). '''
 
     if f_name_audio.rfind('.wav') == -1:
         f_name_audio += '.wav'
@@ -39,20 +114,174 @@ def denoise():
         f_name_denoised_audio += '.wav'
 
 
-    denoiser = RNNoise()
-
-    print("[i] Loading '{}'...".format(f_name_audio))
-    audio = denoiser.read_wav(f_name_audio)
+    if chunk_s is not None:
+        denoiser = ChunkedRNNoise(workers, f_name_lib, model_path, chunk_s)
+    else:
+        denoiser = RNNoise(f_name_lib, model_path)
 
+    # Чтение, шумоподавление и запись выполняются блоками без pydub: ресемплинг только 1 раз до 48 кГц и 1 раз обратно
+    print("[i] Denoising '{}' to '{}'...".format(f_name_audio, f_name_denoised_audio))
     start_time = time.time()
-    denoised_audio = denoiser.filter(audio)
+    if chunk_s is not None:
+        with denoiser:
+            audio_length = denoiser.filter_file(f_name_audio, f_name_denoised_audio, voice_prob_threshold)
+    elif cache_dir:
+        audio_length, is_cached = DenoiseCache(cache_dir, cache_size_mb * 1024**2).filter_file(denoiser, f_name_audio, f_name_denoised_audio,
+                                                                                             voice_prob_threshold)
+        if is_cached:
+            print('[i] Result was taken from cache')
+    else:
+        audio_length = denoiser.filter_file(f_name_audio, f_name_denoised_audio, voice_prob_threshold)
     elapsed_time = time.time() - start_time
 
-    print("[i] Saving '{}'...".format(f_name_denoised_audio))
-    denoiser.write_wav(f_name_denoised_audio, denoised_audio)
-
     print('[i] Audio length: {:.2f} s, processing time: {:.2f} s, processing speed: {:.1f} RT'.format(
-        len(audio)/1000, elapsed_time, len(audio)/1000/elapsed_time))
+        audio_length, elapsed_time, audio_length/elapsed_time))
+
+
+def _denoise_pipe(args):
+    ''' Очистить от шума аудиоданные без заголовка (raw PCM) из stdin. Аудиоданные читаются небольшими блоками в один переиспользуемый
+    буфер (см. wav_io.iter_raw_blocks()), а очищенные данные пишутся в stdout (или в .wav файл) сразу после обработки каждого блока,
+    поэтому расход памяти постоянный, а задержка ограничена длительностью блока и одного фрейма RNNoise.
+    1. args - аргументы командной строки '''
+
+    wav_info = get_raw_wav_info(args.sample_rate, args.pcm_format, args.channels)
+    if args.block_ms < 1:
+        raise ValueError("'block_ms' must be greater than 0")
+    if args.denoised_audio != '-' and args.output_format != 's16le':
+        raise ValueError("output format '{}' is supported only when writing to stdout".format(args.output_format))
+
+    denoiser = RNNoise(args.lib, args.model)
+    is_float_output = args.output_format == 'f32le'
+
+    f_vad = None
+    vad_frames_count = 0
+    if args.vad_fd is not None:
+        f_vad = os.fdopen(args.vad_fd, 'w', encoding='utf-8', closefd=False)
+
+    def write_vad(vad_probabilities):
+        nonlocal vad_frames_count
+        f_vad.write(''.join('{:.2f}\t{:.3f}\n'.format((vad_frames_count + i) * denoiser.frame_duration_ms / 1000, vad_probability)
+                            for i, vad_probability in enumerate(vad_probabilities.tolist())))
+        f_vad.flush()
+        vad_frames_count += vad_probabilities.shape[0]
+
+    stream = RNNoiseStream(denoiser, wav_info.sample_rate, args.voice_prob_threshold, True, is_float_output,
+                           write_vad if f_vad is not None else None)
+
+    is_stdout = args.denoised_audio == '-'
+    f_out = sys.stdout.buffer if is_stdout else WavWriter(args.denoised_audio, wav_info.sample_rate)
+
+    def write_denoised(denoised_chunk):
+        if len(denoised_chunk) == 0:
+            return
+        if is_float_output:
+            denoised_chunk = denoised_chunk.astype('<f4', copy=False).tobytes()
+        f_out.write(denoised_chunk)
+        if is_stdout:
+            f_out.flush()
+
+    block_size = max(wav_info.sample_rate * args.block_ms // 1000, 1)
+    try:
+        for block in iter_raw_blocks(sys.stdin.buffer, wav_info, block_size):
+            write_denoised(stream.push_samples(to_mono(block, wav_info)))
+        write_denoised(stream.flush())
+    except BrokenPipeError:
+        # Получатель закрыл stdout (например, head): завершаться молча, не пытаясь дописать буфер при выходе
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+    finally:
+        if not is_stdout:
+            f_out.close()
+        if f_vad is not None:
+            f_vad.close()
+
+
+def _denoise_batch(args):
+    ''' Очистить от шума аудиозаписи из папок, шаблонов glob и/или файла со списком в нескольких процессах (см. batch.denoise_files()).
+    Аудиозаписи с актуальным результатом пропускаются, прогресс выводится в stderr, отчёт по каждой аудиозаписи пишется в .jsonl
+    по мере обработки.
+    1. args - аргументы командной строки
+    2. возвращает количество аудиозаписей, обработка которых завершилась с ошибкой '''
+
+    pairs = []
+    if args.source_audio:
+        pairs += find_files(args.source_audio, args.denoised_audio, recursive=not args.no_recursive)
+    if args.manifest:
+        pairs += read_manifest(args.manifest, args.denoised_audio)
+
+    f_report = open(args.report, 'w', encoding='utf-8') if args.report else None
+    try:
+        pending_pairs = []
+        for f_name_audio, f_name_denoised_audio in pairs:
+            if not args.force and is_up_to_date(f_name_audio, f_name_denoised_audio):
+                _write_report_line(f_report, FileResult(f_name_audio, f_name_denoised_audio, None, None, None), 'skipped')
+            else:
+                pending_pairs.append((f_name_audio, f_name_denoised_audio))
+
+        print('[i] Found {} audio files, {} up to date, {} to denoise'.format(len(pairs), len(pairs) - len(pending_pairs),
+                                                                              len(pending_pairs)))
+
+        stats = {'done': 0, 'failed': 0, 'cached': 0, 'audio_length': 0.0}
+        start_time = time.time()
+
+        def on_result(index, result):
+            stats['done'] += 1
+            if result.error is None:
+                stats['audio_length'] += result.audio_length
+                stats['cached'] += result.is_cached
+                _write_report_line(f_report, result, 'ok')
+            else:
+                stats['failed'] += 1
+                _write_report_line(f_report, result, 'error')
+                if not args.quiet:
+                    sys.stderr.write("\r[E] '{}': {}\n".format(result.f_name_audio, result.error))
+            if not args.quiet:
+                _print_progress(stats, len(pending_pairs), time.time() - start_time)
+
+        denoise_files([pair[0] for pair in pending_pairs], [pair[1] for pair in pending_pairs], workers=args.workers, f_name_lib=args.lib,
+                      voice_prob_threshold=args.voice_prob_threshold, callback=on_result, cache_folder=args.cache_dir,
+                      cache_max_size=args.cache_size_mb * 1024**2, model_path=args.model)
+        elapsed_time = time.time() - start_time
+    finally:
+        if f_report is not None:
+            f_report.close()
+
+    if not args.quiet and pending_pairs:
+        sys.stderr.write('\n')
+
+    denoised_count = stats['done'] - stats['failed']
+    print('[i] Denoised: {} (from cache: {}), skipped: {}, failed: {}'.format(denoised_count, stats['cached'], len(pairs) - len(pending_pairs),
+                                                                            stats['failed']))
+    if elapsed_time > 0 and denoised_count > 0:
+        print('[i] Audio length: {:.2f} s, processing time: {:.2f} s, processing speed: {:.1f} RT, {:.2f} files/s'.format(
+            stats['audio_length'], elapsed_time, stats['audio_length']/elapsed_time, denoised_count/elapsed_time))
+    return stats['failed']
+
+
+def _print_progress(stats, total_count, elapsed_time):
+    ''' Вывести строку прогресса пакетной обработки в stderr (в терминале - с перезаписью строки). '''
+
+    progress = '[i] {}/{} files, {} failed, {:.1f} s of audio, {:.1f} RT'.format(
+        stats['done'], total_count, stats['failed'], stats['audio_length'], stats['audio_length'] / max(elapsed_time, 1e-9))
+    if sys.stderr.isatty():
+        sys.stderr.write('\r' + progress)
+    else:
+        sys.stderr.write(progress + '\n')
+    sys.stderr.flush()
+
+
+def _write_report_line(f_report, result, status):
+    ''' Записать результат обработки одной аудиозаписи в отчёт .jsonl (если отчёт не нужен - ничего не делать).
+    1. f_report - открытый файл отчёта или None
+    2. result - batch.FileResult
+    3. status - 'ok', 'skipped' или 'error' '''
+
+    if f_report is None:
+        return
+    report_line = dict(result._asdict(), status=status)
+    if result.audio_length and result.elapsed_time:
+        report_line['real_time_factor'] = result.audio_length / result.elapsed_time
+    f_report.write(json.dumps(report_line, ensure_ascii=False) + '\n')
+    f_report.flush()
 
 
 if __name__ == '__main__':
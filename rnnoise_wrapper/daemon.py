@@ -0,0 +1,344 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+#       OS : GNU/Linux Ubuntu 16.04 or later
+# LANGUAGE : Python 3.8 or later
+#   AUTHOR : Klim V. O.
+# - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+'''
+Локальный демон шумоподавления с заранее запущенными процессами-обработчиками. Импорт numpy/pydub, поиск и загрузка библиотеки
+RNNoise и модели выполняются один раз при запуске демона, поэтому задания от тонкого клиента (rnnoise_wrapper_client) сразу
+переходят к обработке фреймов.
+
+Содержит класс DenoiseDaemon и CLI демона (функция main()).
+
+Зависимости: pydub, numpy.
+'''
+
+import os
+import sys
+import socket
+import signal
+import argparse
+import traceback
+import numpy as np
+from multiprocessing import shared_memory, resource_tracker
+
+from rnnoise_wrapper_client import get_socket_path, send_message, recv_message, DAEMON_SOCKET_ENV, DEFAULT_DAEMON_SOCKET
+from .rnnoise_wrapper import RNNoise
+
+
+# Типы отсчётов, которые можно передать через разделяемую память (см. DaemonClient.filter())
+_SAMPLE_DTYPES = {'int16': np.int16, 'float32': np.float32}
+
+# Сигналы, которые главный процесс демона обрабатывает синхронно через signal.sigwait()
+_MASTER_SIGNALS = {signal.SIGTERM, signal.SIGINT, signal.SIGHUP, signal.SIGCHLD}
+
+
+def _ignore_signal(signal_number, frame):
+    ''' Пустой обработчик сигнала (SIGCHLD должен быть не игнорируемым, чтобы его можно было получить через signal.sigwait()). '''
+
+
+def _attach_shared_memory(name):
+    ''' Подключиться к сегменту разделяемой памяти, созданному клиентом, не передавая его под контроль resource_tracker
+    (иначе сегмент был бы удалён при завершении процесса-обработчика, хотя им владеет клиент).
+    1. name - имя сегмента
+    2. возвращает multiprocessing.shared_memory.SharedMemory '''
+
+    try:
+        return shared_memory.SharedMemory(name, track=False)
+    except TypeError:
+        # До Python 3.13 подключение к сегменту всегда регистрирует его в resource_tracker
+        shm = shared_memory.SharedMemory(name)
+        resource_tracker.unregister(shm._name, 'shared_memory')
+        return shm
+
+
+class DenoiseDaemon(object):
+    ''' Локальный демон шумоподавления на Unix-сокете (модель prefork):
+    - главный процесс загружает библиотеку RNNoise и модель, открывает сокет и запускает через fork() workers процессов-обработчиков.
+        Страницы библиотеки, модели и интерпретатора с импортированными модулями разделяются между ними (copy-on-write). Завершившиеся
+        обработчики перезапускаются
+    - каждый обработчик принимает соединения из общего сокета и выполняет задания по одному, сбрасывая состояние нейронной сети
+        перед каждым заданием. Задания: 'filter_file' (файлы читает и пишет обработчик), 'filter' (отсчёты и результат передаются
+        через сегмент разделяемой памяти клиента), 'ping' и 'reload'
+    - SIGHUP (или задание 'reload'): перезагрузка без закрытия сокета. Обработчики завершают текущие задания, а главный процесс
+        перезапускается через exec() с тем же сокетом, заново находя и загружая библиотеку и модель (ctypes не позволяет выгрузить
+        уже загруженную библиотеку, поэтому обновлённый файл библиотеки можно загрузить только в новом процессе)
+    - SIGTERM/SIGINT: остановка. Обработчики завершают текущие задания, сокет удаляется
+
+    Клиент - rnnoise_wrapper_client.DaemonClient или CLI rnnoise_wrapper_client.
+
+    1. socket_path - путь к Unix-сокету (если None - из переменной окружения RNNOISE_DAEMON_SOCKET или '/tmp/rnnoise_wrapper.sock')
+    2. workers - количество процессов-обработчиков (если None - по количеству ядер процессора)
+    3. f_name_lib - путь к библиотеке или её имя/субимя (см. RNNoise)
+    4. model_path - путь к файлу весов модели (см. RNNoise) '''
+
+    def __init__(self, socket_path=None, workers=None, f_name_lib=None, model_path=None):
+        if workers is not None and workers < 1:
+            raise ValueError("'workers' must be greater than 0")
+
+        self.socket_path = get_socket_path(socket_path)
+        self.workers = workers or os.cpu_count() or 1
+        self.f_name_lib = f_name_lib
+        self.model_path = model_path
+        self.denoiser = RNNoise(f_name_lib, model_path)
+
+        self.__sock = None
+        self.__worker_pids = set()
+        self.__is_busy = False
+        self.__is_stopping = False
+
+
+    def serve_forever(self, listen_fd=None):
+        ''' Открыть сокет, запустить процессы-обработчики и обслуживать их до получения SIGTERM/SIGINT.
+        1. listen_fd - дескриптор уже открытого слушающего сокета (используется при перезагрузке, если None - открыть новый сокет) '''
+
+        self.__sock = self.__listen() if listen_fd is None else socket.socket(socket.AF_UNIX, socket.SOCK_STREAM, fileno=listen_fd)
+
+        # resource_tracker запускается до fork(), чтобы обработчики использовали один общий процесс, а не запускали каждый свой
+        resource_tracker.ensure_running()
+        signal.signal(signal.SIGCHLD, _ignore_signal)
+        signal.pthread_sigmask(signal.SIG_BLOCK, _MASTER_SIGNALS)
+
+        is_reloading = False
+        try:
+            for i in range(self.workers):
+                self.__start_worker()
+
+            while True:
+                signal_number = signal.sigwait(_MASTER_SIGNALS)
+                if signal_number == signal.SIGCHLD:
+                    self.__reap_workers()
+                elif signal_number == signal.SIGHUP:
+                    is_reloading = True
+                    self.__reload()
+                else:
+                    break
+        finally:
+            self.__stop_workers(wait=not is_reloading)
+            if not is_reloading:
+                self.__sock.close()
+                if os.path.exists(self.socket_path):
+                    os.unlink(self.socket_path)
+
+
+    def __listen(self):
+        ''' Открыть слушающий Unix-сокет (файл сокета, оставшийся от некорректно завершённого демона, удаляется).
+        1. возвращает socket.socket '''
+
+        if os.path.exists(self.socket_path):
+            probe_sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe_sock.connect(self.socket_path)
+            except (ConnectionRefusedError, FileNotFoundError):
+                os.unlink(self.socket_path)
+            else:
+                raise ValueError("RNNoise daemon is already running on '{}'".format(self.socket_path))
+            finally:
+                probe_sock.close()
+
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.bind(self.socket_path)
+        sock.listen(128)
+        return sock
+
+
+    def __reload(self):
+        ''' Перезапустить главный процесс через exec() с тем же слушающим сокетом (PID сохраняется, поэтому завершающиеся
+        обработчики остаются его дочерними процессами и будут собраны новым главным процессом). '''
+
+        self.__stop_workers(wait=False)
+        sys.stdout.flush()
+        sys.stderr.flush()
+
+        self.__sock.set_inheritable(True)
+        argv = [sys.executable] + ['-W' + warning_option for warning_option in sys.warnoptions]
+        argv += ['-m', 'rnnoise_wrapper.daemon', '-s', self.socket_path, '-w', str(self.workers), '--listen_fd', str(self.__sock.fileno())]
+        if self.f_name_lib:
+            argv += ['-l', self.f_name_lib]
+        if self.model_path:
+            argv += ['--model', self.model_path]
+        os.execv(sys.executable, argv)
+
+
+    def __start_worker(self):
+        ''' Запустить процесс-обработчик через fork(). '''
+
+        pid = os.fork()
+        if pid != 0:
+            self.__worker_pids.add(pid)
+            return
+
+        exit_code = 0
+        try:
+            self.__run_worker()
+        except SystemExit:
+            pass
+        except BaseException:
+            traceback.print_exc()
+            exit_code = 1
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(exit_code)
+
+
+    def __reap_workers(self):
+        ''' Собрать завершившиеся дочерние процессы и перезапустить обработчики, завершившиеся не по команде главного процесса. '''
+
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            # Процессы, запущенные до перезагрузки, в __worker_pids нового главного процесса отсутствуют и не перезапускаются
+            if pid in self.__worker_pids:
+                self.__worker_pids.discard(pid)
+                self.__start_worker()
+
+
+    def __stop_workers(self, wait=True):
+        ''' Завершить процессы-обработчики (каждый завершает текущее задание).
+        1. wait - True: дождаться их завершения '''
+
+        worker_pids, self.__worker_pids = self.__worker_pids, set()
+        for pid in worker_pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+        if wait:
+            for pid in worker_pids:
+                try:
+                    os.waitpid(pid, 0)
+                except ChildProcessError:
+                    pass
+
+
+    def __run_worker(self):
+        ''' Основной цикл процесса-обработчика: принимать соединения и выполнять задания до получения SIGTERM. '''
+
+        signal.signal(signal.SIGTERM, self.__on_terminate)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        signal.pthread_sigmask(signal.SIG_UNBLOCK, _MASTER_SIGNALS)
+
+        while not self.__is_stopping:
+            conn = self.__sock.accept()[0]
+            with conn:
+                self.__serve_connection(conn)
+
+
+    def __on_terminate(self, signal_number, frame):
+        ''' Обработчик SIGTERM в процессе-обработчике: без задания - завершиться сразу, иначе - после его выполнения. '''
+
+        if not self.__is_busy:
+            raise SystemExit(0)
+        self.__is_stopping = True
+
+
+    def __serve_connection(self, conn):
+        ''' Выполнять задания из одного соединения, пока клиент его не закроет.
+        1. conn - подключённый socket.socket '''
+
+        while not self.__is_stopping:
+            self.__is_busy = False
+            message = recv_message(conn)
+            if message is None:
+                break
+
+            self.__is_busy = True
+            try:
+                response = self.__handle(message)
+            except Exception as e:
+                response = {'status': 'error', 'error': '{}: {}'.format(type(e).__name__, e)}
+            try:
+                send_message(conn, response)
+            except (BrokenPipeError, ConnectionResetError):
+                break
+        self.__is_busy = False
+
+
+    def __handle(self, message):
+        ''' Выполнить задание.
+        1. message - dict с заданием
+        2. возвращает dict с ответом '''
+
+        command = message.get('command')
+        if command == 'ping':
+            return {'status': 'ok', 'pid': os.getpid(), 'lib': self.denoiser.f_name_lib, 'model': self.denoiser.model_path}
+
+        if command == 'reload':
+            os.kill(os.getppid(), signal.SIGHUP)
+            return {'status': 'ok'}
+
+        if command == 'filter_file':
+            self.denoiser.reset()
+            audio_length = self.denoiser.filter_file(message['source'], message['denoised'], message.get('voice_prob_threshold', 0.0),
+                                                     message.get('save_source_sample_rate', True))
+            return {'status': 'ok', 'audio_length': audio_length}
+
+        if command == 'filter':
+            return {'status': 'ok', 'samples': self.__filter_shared(message)}
+
+        raise ValueError("unsupported command '{}'".format(command))
+
+
+    def __filter_shared(self, message):
+        ''' Очистить от шума отсчёты из сегмента разделяемой памяти клиента и записать результат в начало того же сегмента.
+        1. message - dict с заданием 'filter' (см. DaemonClient.filter())
+        2. возвращает количество отсчётов результата '''
+
+        dtype = _SAMPLE_DTYPES.get(message.get('dtype'))
+        if dtype is None:
+            raise TypeError("unsupported samples dtype '{}', expected one of: {}".format(message.get('dtype'), ', '.join(_SAMPLE_DTYPES)))
+
+        shm = _attach_shared_memory(message['shm'])
+        samples = denoised_samples = None
+        try:
+            samples = np.ndarray(message['samples'], dtype, shm.buf)
+            self.denoiser.reset()
+            denoised_samples = self.denoiser.filter(samples, message['sample_rate'], message.get('voice_prob_threshold', 0.0), True,
+                                                    message.get('float_output', False))
+            if denoised_samples.nbytes > shm.size:
+                raise ValueError('denoised audio size is {} bytes, shared memory size is {}'.format(denoised_samples.nbytes, shm.size))
+            np.ndarray(denoised_samples.shape, denoised_samples.dtype, shm.buf)[:] = denoised_samples
+            return denoised_samples.shape[0]
+        finally:
+            # Сегмент можно закрыть только после освобождения всех numpy.ndarray, ссылающихся на его буфер
+            samples = denoised_samples = None
+            shm.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local RNNoise_Wrapper denoising daemon with preforked workers on a Unix socket ' + \
+                                                 '(client: rnnoise_wrapper_client). SIGHUP reloads RNNoise library and model, ' + \
+                                                 'SIGTERM/SIGINT stop the daemon.')
+    parser.add_argument('-s', '--socket', type=str, default=None,
+                        help='Path to Unix socket (default: {} or {})'.format(DAEMON_SOCKET_ENV, DEFAULT_DAEMON_SOCKET))
+    parser.add_argument('-w', '--workers', type=int, default=None,
+                        help='Number of worker processes (default: number of CPU cores)')
+    parser.add_argument('-l', '--lib', type=str, default=None,
+                        help='Path to RNNoise library or its name/subname (default: RNNOISE_LIB or librnnoise_5h_b_500k)')
+    parser.add_argument('--model', type=str, default=None,
+                        help='Path to RNNoise model weights file (rnnoise-nu format) to use instead of the model built into the library')
+    parser.add_argument('--listen_fd', type=int, default=None,
+                        help=argparse.SUPPRESS)
+
+    args = parser.parse_args()
+
+    daemon = DenoiseDaemon(args.socket, args.workers, args.lib, args.model)
+    print("[i] RNNoise daemon is listening on '{}' with {} workers (library '{}', model '{}'), pid {}".format(
+        daemon.socket_path, daemon.workers, daemon.denoiser.f_name_lib, daemon.denoiser.model_path, os.getpid()))
+    sys.stdout.flush()
+    daemon.serve_forever(args.listen_fd)
+
+
+if __name__ == '__main__':
+    main()
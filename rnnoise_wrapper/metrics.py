@@ -0,0 +1,258 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+#       OS : GNU/Linux Ubuntu 16.04 or later
+# LANGUAGE : Python 3.5.2 or later
+#   AUTHOR : Klim V. O.
+# - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+'''
+Метрики работы шумоподавления: счётчики фреймов, время по этапам обработки, гистограммы длительности вызовов и вероятности
+наличия голоса, пропуски реального времени. Включаются явно (см. RNNoise.enable_metrics()).
+
+Содержит класс Metrics и namedtuple CallRecord.
+
+Зависимости: numpy.
+'''
+
+import bisect
+import threading
+import collections
+import numpy as np
+
+
+# Информация об одном завершённом вызове, передаётся в функции обратного вызова
+CallRecord = collections.namedtuple('CallRecord', ['method', 'elapsed_s', 'audio_duration_s', 'is_deadline_missed'])
+
+
+class Metrics(object):
+    ''' Метрики работы одного или нескольких объектов RNNoise (например, всех объектов пула):
+    - record_call(): учесть завершённый вызов (длительность, длительность обработанного аудио, пропуск реального времени)
+    - record_frames(): учесть обработанные RNNoise фреймы и время их обработки
+    - record_dropped(): учесть фреймы, удалённые по voice_prob_threshold
+    - record_bypassed(): учесть фреймы, пропущенные адаптивным пропуском (см. RNNoise.enable_bypass())
+    - record_stage(): учесть время этапа обработки ('resample', 'framing' и т.д.)
+    - add_callback(), remove_callback(): функции, вызываемые после каждого учтённого вызова с CallRecord
+    - as_dict(): получить снимок метрик в виде dict
+    - to_prometheus(): получить метрики в текстовом формате Prometheus
+    - reset(): обнулить метрики
+
+    Все методы потокобезопасны, поэтому один объект Metrics можно использовать в нескольких потоках выполнения. Вызов считается
+    пропустившим реальное время, если его длительность больше, чем deadline_factor * длительность обработанного в нём аудио.
+
+    1. latency_buckets - верхние границы корзин гистограммы длительности вызовов в секундах (если None - LATENCY_BUCKETS)
+    2. deadline_factor - доля длительности аудио, которую может занимать обработка без пропуска реального времени '''
+
+    LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+    VAD_BUCKETS = (0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0)
+
+    def __init__(self, latency_buckets=None, deadline_factor=1.0):
+        if deadline_factor <= 0:
+            raise ValueError("'deadline_factor' must be greater than 0")
+
+        self.latency_buckets = tuple(sorted(latency_buckets or self.LATENCY_BUCKETS))
+        self.deadline_factor = deadline_factor
+        self.__vad_buckets = np.array(self.VAD_BUCKETS, dtype=np.float32)
+        self.__lock = threading.Lock()
+        self.__callbacks = []
+        self.reset()
+
+
+    def reset(self):
+        ''' Обнулить все метрики (функции обратного вызова сохраняются). '''
+
+        with self.__lock:
+            self.frames_processed = 0
+            self.frames_dropped = 0
+            self.frames_bypassed = 0
+            self.stage_seconds = collections.OrderedDict((stage, 0.0) for stage in ('process', 'resample', 'framing'))
+            self.calls = collections.OrderedDict()
+            self.call_seconds = collections.OrderedDict()
+            self.audio_seconds = collections.OrderedDict()
+            self.deadline_misses = collections.OrderedDict()
+            self.latency_counts = collections.OrderedDict()
+            self.vad_counts = np.zeros(len(self.VAD_BUCKETS) + 1, dtype=np.int64)
+            self.vad_sum = 0.0
+
+
+    def add_callback(self, callback):
+        ''' Добавить функцию, вызываемую после каждого учтённого вызова (например, для отправки метрик или оповещения о пропуске
+        реального времени). Вызывается в потоке выполнения, выполнившем вызов, поэтому должна быть быстрой.
+        1. callback - функция, принимающая один аргумент CallRecord '''
+
+        with self.__lock:
+            self.__callbacks = self.__callbacks + [callback]
+
+
+    def remove_callback(self, callback):
+        ''' Удалить ранее добавленную функцию обратного вызова.
+        1. callback - функция, переданная в add_callback() '''
+
+        with self.__lock:
+            if callback not in self.__callbacks:
+                raise ValueError("'callback' was not added to these metrics")
+            self.__callbacks = [added_callback for added_callback in self.__callbacks if added_callback is not callback]
+
+
+    def record_call(self, method, elapsed_s, audio_duration_s):
+        ''' Учесть завершённый вызов.
+        1. method - имя метода (используется как значение метки method)
+        2. elapsed_s - длительность вызова в секундах
+        3. audio_duration_s - длительность обработанного в вызове аудио в секундах
+        4. возвращает CallRecord '''
+
+        is_deadline_missed = audio_duration_s > 0 and elapsed_s > audio_duration_s * self.deadline_factor
+        bucket_index = bisect.bisect_left(self.latency_buckets, elapsed_s)
+
+        with self.__lock:
+            if method not in self.calls:
+                self.calls[method] = 0
+                self.call_seconds[method] = 0.0
+                self.audio_seconds[method] = 0.0
+                self.deadline_misses[method] = 0
+                self.latency_counts[method] = [0] * (len(self.latency_buckets) + 1)
+            self.calls[method] += 1
+            self.call_seconds[method] += elapsed_s
+            self.audio_seconds[method] += audio_duration_s
+            self.deadline_misses[method] += is_deadline_missed
+            self.latency_counts[method][bucket_index] += 1
+            callbacks = self.__callbacks
+
+        call_record = CallRecord(method, elapsed_s, audio_duration_s, is_deadline_missed)
+        for callback in callbacks:
+            callback(call_record)
+        return call_record
+
+
+    def record_frames(self, vad_probabilities, elapsed_s):
+        ''' Учесть фреймы, обработанные RNNoise.
+        1. vad_probabilities - numpy.ndarray с вероятностью наличия голоса в каждом обработанном фрейме
+        2. elapsed_s - время обработки фреймов в секундах '''
+
+        vad_counts = np.bincount(np.searchsorted(self.__vad_buckets, vad_probabilities), minlength=self.vad_counts.shape[0])
+        vad_sum = float(vad_probabilities.sum(dtype=np.float64))
+
+        with self.__lock:
+            self.frames_processed += vad_probabilities.shape[0]
+            self.stage_seconds['process'] += elapsed_s
+            self.vad_counts += vad_counts
+            self.vad_sum += vad_sum
+
+
+    def record_dropped(self, frames_count):
+        ''' Учесть фреймы, удалённые из результата по voice_prob_threshold.
+        1. frames_count - количество удалённых фреймов '''
+
+        with self.__lock:
+            self.frames_dropped += frames_count
+
+
+    def record_bypassed(self, frames_count):
+        ''' Учесть фреймы, пропущенные адаптивным пропуском (они также входят в frames_processed).
+        1. frames_count - количество пропущенных фреймов '''
+
+        with self.__lock:
+            self.frames_bypassed += frames_count
+
+
+    def record_stage(self, stage, elapsed_s):
+        ''' Учесть время этапа обработки.
+        1. stage - имя этапа (используется как значение метки stage)
+        2. elapsed_s - время в секундах '''
+
+        with self.__lock:
+            self.stage_seconds[stage] = self.stage_seconds.get(stage, 0.0) + elapsed_s
+
+
+    def as_dict(self):
+        ''' Получить снимок метрик (например, для сохранения в JSON).
+        1. возвращает dict с накопленными значениями, гистограммы - в виде dict верхняя граница корзины -> количество (не накопительно) '''
+
+        with self.__lock:
+            total_call_seconds = sum(self.call_seconds.values())
+            total_audio_seconds = sum(self.audio_seconds.values())
+            return {
+                'frames_processed': self.frames_processed,
+                'frames_dropped': self.frames_dropped,
+                'frames_bypassed': self.frames_bypassed,
+                'stage_seconds': dict(self.stage_seconds),
+                'calls': dict(self.calls),
+                'call_seconds': dict(self.call_seconds),
+                'audio_seconds': dict(self.audio_seconds),
+                'deadline_misses': dict(self.deadline_misses),
+                'real_time_factor': total_audio_seconds / total_call_seconds if total_call_seconds > 0 else None,
+                'latency_histograms': {method: dict(zip(self.__get_bucket_names(self.latency_buckets), latency_counts))
+                                       for method, latency_counts in self.latency_counts.items()},
+                'vad_histogram': dict(zip(self.__get_bucket_names(self.VAD_BUCKETS), self.vad_counts.tolist())),
+            }
+
+
+    def to_prometheus(self, prefix='rnnoise'):
+        ''' Получить метрики в текстовом формате Prometheus (например, для отдачи по HTTP или записи в файл для node_exporter).
+        1. prefix - префикс имён метрик
+        2. возвращает строку с метриками '''
+
+        lines = []
+
+        def add_metric(name, metric_type, description, samples):
+            lines.append('# HELP {}_{} {}'.format(prefix, name, description))
+            lines.append('# TYPE {}_{} {}'.format(prefix, name, metric_type))
+            for suffix, labels, value in samples:
+                lines.append('{}_{}{}{} {}'.format(prefix, name, suffix, self.__format_labels(labels), self.__format_value(value)))
+
+        def get_histogram_samples(labels, buckets, counts, total_sum):
+            samples = []
+            cumulative_count = 0
+            for bucket_name, count in zip(self.__get_bucket_names(buckets), counts):
+                cumulative_count += count
+                samples.append(('_bucket', labels + [('le', bucket_name)], cumulative_count))
+            samples.append(('_sum', labels, total_sum))
+            samples.append(('_count', labels, cumulative_count))
+            return samples
+
+        with self.__lock:
+            add_metric('frames_processed_total', 'counter', 'Frames processed (including bypassed frames).', [('', [], self.frames_processed)])
+            add_metric('frames_dropped_total', 'counter', 'Frames dropped by voice_prob_threshold.', [('', [], self.frames_dropped)])
+            add_metric('frames_bypassed_total', 'counter', 'Frames bypassed without rnnoise_process_frame.', [('', [], self.frames_bypassed)])
+            add_metric('stage_seconds_total', 'counter', 'Time spent in each processing stage.',
+                       [('', [('stage', stage)], seconds) for stage, seconds in self.stage_seconds.items()])
+            add_metric('audio_seconds_total', 'counter', 'Duration of audio processed by each method.',
+                       [('', [('method', method)], seconds) for method, seconds in self.audio_seconds.items()])
+            add_metric('deadline_misses_total', 'counter', 'Calls that took longer than the duration of the processed audio.',
+                       [('', [('method', method)], misses) for method, misses in self.deadline_misses.items()])
+
+            latency_samples = []
+            for method, latency_counts in self.latency_counts.items():
+                latency_samples += get_histogram_samples([('method', method)], self.latency_buckets, latency_counts,
+                                                         self.call_seconds[method])
+            add_metric('call_duration_seconds', 'histogram', 'Duration of calls.', latency_samples)
+            add_metric('vad_probability', 'histogram', 'Voice activity probability of processed frames.',
+                       get_histogram_samples([], self.VAD_BUCKETS, self.vad_counts.tolist(), self.vad_sum))
+
+        return '\n'.join(lines) + '\n'
+
+
+    @staticmethod
+    def __get_bucket_names(buckets):
+        ''' Получить значения метки le для корзин гистограммы (последняя корзина - +Inf). '''
+
+        return ['{:g}'.format(bucket) for bucket in buckets] + ['+Inf']
+
+
+    @staticmethod
+    def __format_labels(labels):
+        ''' Сформировать метки в формате Prometheus (с экранированием значений). '''
+
+        if not labels:
+            return ''
+        return '{' + ','.join('{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+                              for name, value in labels) + '}'
+
+
+    @staticmethod
+    def __format_value(value):
+        ''' Сформировать значение в формате Prometheus. '''
+
+        if isinstance(value, float):
+            return repr(value)
+        return str(int(value))
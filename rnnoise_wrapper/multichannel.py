@@ -0,0 +1,214 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+#       OS : GNU/Linux Ubuntu 16.04 or later
+# LANGUAGE : Python 3.5.2 or later
+#   AUTHOR : Klim V. O.
+# - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+'''
+Шумоподавление многоканальных аудиозаписей, каждый канал очищается отдельно со своим состоянием нейронной сети.
+
+Содержит класс MultiChannelRNNoise.
+
+Зависимости: pydub, numpy.
+'''
+
+import os
+import concurrent.futures
+import numpy as np
+from pydub import AudioSegment
+
+from .rnnoise_wrapper import RNNoise, RNNoiseStream, _as_samples, _copy_samples, _get_samples_scale
+from .resampler import resample
+from .wav_io import WavWriter, iter_wav_blocks, read_wav_info, to_mono
+
+
+class MultiChannelRNNoise(object):
+    ''' Шумоподавление многоканальных аудиозаписей (например, стерео интервью или записи с нескольких микрофонов) без сведения
+    в моно: каждый канал очищается отдельно своим объектом RNNoise, все объекты используют одну загруженную библиотеку.
+    - filter(): очистка от шума многоканальной аудиозаписи
+    - filter_file(): очистка от шума многоканальной .wav аудиозаписи любой длины с сохранением результата в файл
+    - reset(): сбросить состояние нейронной сети всех каналов
+    - close(): остановить пул потоков выполнения
+
+    Каналы выделяются из чередующихся отсчётов strided-представлением numpy без копирования и обрабатываются параллельно в пуле
+    потоков выполнения (для заметного ускорения нужна вспомогательная библиотека rnnoise_batch.so, см. MultiStreamDenoiser).
+    Очищенные каналы записываются сразу на свои места в чередующемся результате.
+
+    1. channels - количество каналов
+    2. f_name_lib - путь к библиотеке или её имя/субимя (см. RNNoise)
+    3. workers - количество потоков выполнения (если None - не больше количества каналов и ядер процессора)
+    4. model_path - путь к файлу весов модели (см. RNNoise), загруженная модель общая для всех каналов '''
+
+    sample_width = 2
+
+    def __init__(self, channels, f_name_lib=None, workers=None, model_path=None):
+        if channels < 1:
+            raise ValueError("'channels' must be greater than 0")
+
+        self.channels = channels
+        denoiser = RNNoise(f_name_lib, model_path)
+        self.denoisers = [denoiser] + [denoiser.spawn() for _ in range(channels - 1)]
+        self.sample_rate = denoiser.sample_rate
+
+        self.workers = workers or min(channels, os.cpu_count() or 1)
+        self.__executor = None
+        if self.workers > 1:
+            self.__executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.workers)
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+    def reset(self):
+        ''' Сбросить состояние нейронной сети всех каналов (см. RNNoise.reset()). '''
+
+        for denoiser in self.denoisers:
+            denoiser.reset()
+
+
+    def close(self):
+        ''' Дождаться завершения всех задач и остановить пул потоков выполнения. '''
+
+        if self.__executor is not None:
+            self.__executor.shutdown(wait=True)
+            self.__executor = None
+
+
+    def filter(self, audio, sample_rate=None, save_source_sample_rate=True, float_output=False):
+        ''' Очистить многоканальную аудиозапись от шума, каждый канал - отдельно. Удаление фреймов по вероятности наличия голоса
+        не поддерживается, т.к. у каналов она разная, а длина каналов должна совпадать.
+        1. audio - объект pydub.AudioSegment с аудиозаписью (количество каналов должно совпадать с channels), байтовая строка или любой
+            другой объект, поддерживающий буферный протокол, с чередующимися отсчётами 16 бит (без заголовков wav), или numpy.ndarray
+            int16 или float (значения от -1 до 1) формы (количество отсчётов, channels) или с чередующимися отсчётами
+        2. sample_rate - частота дискретизации (обязательно, когда audio - не pydub.AudioSegment)
+        3. save_source_sample_rate - True: приводить частоту дискретизации возвращаемой аудиозаписи к исходной
+        4. float_output - True: вернуть numpy.ndarray float32 (значения от -1 до 1) формы (количество отсчётов, channels)
+        5. возвращает аудиозапись, очищенную от шума: pydub.AudioSegment для pydub.AudioSegment, numpy.ndarray формы
+            (количество отсчётов, channels) для numpy.ndarray, байтовую строку с чередующимися отсчётами для остальных типов audio '''
+
+        samples, source_sample_rate = self.__get_samples(audio, sample_rate)
+        target_sample_rate = source_sample_rate if save_source_sample_rate else self.sample_rate
+
+        def filter_channel(channel):
+            return self.__filter_channel(self.denoisers[channel], samples[:, channel], source_sample_rate, target_sample_rate)
+
+        denoised_channels = list(self.__map(filter_channel, range(self.channels)))
+
+        is_float = float_output or (isinstance(audio, np.ndarray) and audio.dtype.kind == 'f')
+        denoised_samples = np.empty((denoised_channels[0].shape[0], self.channels), dtype=np.float32 if is_float else np.int16)
+        for channel, denoised_channel in enumerate(denoised_channels):
+            if is_float:
+                np.multiply(denoised_channel, np.float32(1.0 / 32768), out=denoised_samples[:, channel])
+            else:
+                self.denoisers[0].to_int16(denoised_channel, out=denoised_samples[:, channel])
+
+        if is_float or isinstance(audio, np.ndarray):
+            return denoised_samples
+        if isinstance(audio, AudioSegment):
+            return AudioSegment(data=denoised_samples.tobytes(), sample_width=self.sample_width, frame_rate=target_sample_rate,
+                                channels=self.channels)
+        return denoised_samples.tobytes()
+
+
+    def filter_file(self, f_name_wav, f_name_denoised_wav, save_source_sample_rate=True, block_duration_s=10):
+        ''' Очистить многоканальную .wav аудиозапись от шума и сохранить результат в другой .wav файл с постоянным расходом памяти
+        (см. RNNoise.filter_file()). Поддерживаются .wav аудиозаписи 8/16/24/32 бит и float, результат сохраняется в 16 бит.
+        1. f_name_wav - имя исходной .wav аудиозаписи (количество каналов должно совпадать с channels)
+        2. f_name_denoised_wav - имя .wav аудиозаписи для результата
+        3. save_source_sample_rate - True: сохранять результат в исходной частоте дискретизации, False - в 48 кГц
+        4. block_duration_s - длина обрабатываемого за раз блока в секундах
+        5. возвращает длину исходной аудиозаписи в секундах '''
+
+        wav_info = read_wav_info(f_name_wav)
+        if wav_info.channels != self.channels:
+            raise ValueError("'{}' has {} channels, expected {}".format(f_name_wav, wav_info.channels, self.channels))
+
+        streams = [RNNoiseStream(denoiser, wav_info.sample_rate, 0.0, save_source_sample_rate) for denoiser in self.denoisers]
+        channel_wav_info = wav_info._replace(channels=1)
+        target_sample_rate = wav_info.sample_rate if save_source_sample_rate else self.sample_rate
+        block_size = max(int(block_duration_s * wav_info.sample_rate), 1)
+
+        samples_count = 0
+        with WavWriter(f_name_denoised_wav, target_sample_rate, self.sample_width, self.channels) as wav_writer:
+            for block in iter_wav_blocks(f_name_wav, block_size):
+                samples_count += block.shape[0]
+
+                def push_channel(channel):
+                    return streams[channel].push_samples(to_mono(block[:, channel:channel+1], channel_wav_info))
+
+                wav_writer.write(self.__interleave(list(self.__map(push_channel, range(self.channels)))))
+            wav_writer.write(self.__interleave(list(self.__map(lambda channel: streams[channel].flush(), range(self.channels)))))
+
+        return samples_count / wav_info.sample_rate
+
+
+    def __get_samples(self, audio, sample_rate):
+        ''' Получить отсчёты многоканальной аудиозаписи без копирования.
+        1. audio - аудиозапись (см. filter())
+        2. sample_rate - частота дискретизации (обязательно, когда audio - не pydub.AudioSegment)
+        3. возвращает tuple из numpy.ndarray формы (количество отсчётов, channels) и частоты дискретизации '''
+
+        if isinstance(audio, AudioSegment):
+            if audio.channels != self.channels:
+                raise ValueError("'audio' has {} channels, expected {}".format(audio.channels, self.channels))
+            if audio.sample_width != self.sample_width:
+                audio = audio.set_sample_width(self.sample_width)
+            samples, sample_rate = _as_samples(audio.raw_data), audio.frame_rate
+        else:
+            if not sample_rate:
+                raise ValueError("when type(audio) = '{}', 'sample_rate' can not be None".format(type(audio).__name__))
+            if isinstance(audio, np.ndarray) and audio.ndim == 2:
+                if audio.shape[1] != self.channels:
+                    raise ValueError("'audio' must have shape (N, {}), got {}".format(self.channels, audio.shape))
+                return _as_samples(audio).reshape(audio.shape), sample_rate
+            samples = _as_samples(audio)
+
+        frames_count = samples.shape[0] // self.channels
+        return samples[:frames_count * self.channels].reshape(frames_count, self.channels), sample_rate
+
+
+    def __filter_channel(self, denoiser, samples, sample_rate, target_sample_rate):
+        ''' Очистить от шума один канал (выполняется в пуле потоков выполнения).
+        1. denoiser - объект RNNoise этого канала
+        2. samples - strided-представление канала в чередующихся отсчётах
+        3. sample_rate - частота дискретизации samples
+        4. target_sample_rate - частота дискретизации результата
+        5. возвращает одномерный numpy.ndarray float32 с очищенными отсчётами в шкале 16 бит '''
+
+        scale = _get_samples_scale(samples)
+        if sample_rate != denoiser.sample_rate:
+            samples = resample(samples, sample_rate, denoiser.sample_rate)
+
+        frames = np.zeros((-(-samples.shape[0] // denoiser.frame_size), denoiser.frame_size), dtype=np.float32)
+        _copy_samples(frames.reshape(-1)[:samples.shape[0]], samples, scale)
+        denoiser.process_block(frames)
+
+        if target_sample_rate != denoiser.sample_rate:
+            return resample(frames, denoiser.sample_rate, target_sample_rate)
+        return frames.reshape(-1)
+
+
+    def __interleave(self, denoised_chunks):
+        ''' Собрать очищенные части каналов (байтовые строки одинаковой длины) в чередующиеся отсчёты.
+        1. denoised_chunks - список байтовых строк с очищенными отсчётами каждого канала
+        2. возвращает numpy.ndarray int16 формы (количество отсчётов, channels) '''
+
+        denoised_samples = np.empty((len(denoised_chunks[0]) // self.sample_width, self.channels), dtype=np.int16)
+        for channel, denoised_chunk in enumerate(denoised_chunks):
+            denoised_samples[:, channel] = np.frombuffer(denoised_chunk, dtype=np.int16)
+        return denoised_samples
+
+
+    def __map(self, function, channels):
+        ''' Выполнить function для каждого канала в пуле потоков выполнения (или в текущем потоке, если workers = 1). '''
+
+        if self.__executor is None:
+            return map(function, channels)
+        return self.__executor.map(function, channels)
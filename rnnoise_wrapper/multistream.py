@@ -0,0 +1,151 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+#       OS : GNU/Linux Ubuntu 16.04 or later
+# LANGUAGE : Python 3.5.2 or later
+#   AUTHOR : Klim V. O.
+# - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+'''
+Параллельное шумоподавление множества независимых потоков в нескольких потоках выполнения одного процесса.
+
+Содержит классы MultiStreamDenoiser и ScheduledStream.
+
+Зависимости: pydub, numpy.
+'''
+
+import os
+import threading
+import collections
+import concurrent.futures
+
+from .rnnoise_wrapper import RNNoise, RNNoiseStream
+
+
+class ScheduledStream(object):
+    ''' Поток шумоподавления, обрабатываемый в пуле потоков выполнения MultiStreamDenoiser. Создаётся с помощью
+    MultiStreamDenoiser.open_stream().
+    - push(): поставить часть аудиозаписи в очередь на обработку, возвращает concurrent.futures.Future с результатом
+    - close(): обработать остаток потока, возвращает concurrent.futures.Future с результатом
+
+    Части одного потока всегда обрабатываются последовательно и в порядке поступления (у каждого потока своё состояние
+    нейронной сети), части разных потоков - параллельно. '''
+
+    def __init__(self, executor, session):
+        self.session = session
+        self.__executor = executor
+        self.__lock = threading.Lock()
+        self.__pending = collections.deque()
+        self.__is_draining = False
+        self.__is_closed = False
+
+
+    def push(self, chunk):
+        ''' Поставить часть аудиозаписи в очередь на шумоподавление.
+        1. chunk - байтовая строка с аудиоданными (без заголовков wav)
+        2. возвращает concurrent.futures.Future, результатом которого будет байтовая строка с очищенными от шума аудиоданными '''
+
+        return self.__submit(self.session.push, chunk)
+
+
+    def close(self):
+        ''' Обработать оставшийся неполный фрейм и закрыть поток. После вызова push() недоступен.
+        1. возвращает concurrent.futures.Future, результатом которого будет байтовая строка с очищенными от шума аудиоданными '''
+
+        future = self.__submit(self.session.flush)
+        self.__is_closed = True
+        return future
+
+
+    def __submit(self, method, *args):
+        ''' Добавить задачу в очередь потока и, если очередь ещё не обрабатывается, запустить её обработку в пуле.
+        1. method - метод сессии RNNoiseStream
+        2. args - аргументы метода
+        3. возвращает concurrent.futures.Future с результатом '''
+
+        future = concurrent.futures.Future()
+        with self.__lock:
+            if self.__is_closed:
+                raise RuntimeError('stream is closed')
+            self.__pending.append((future, method, args))
+            if not self.__is_draining:
+                self.__is_draining = True
+                self.__executor.submit(self.__drain)
+        return future
+
+
+    def __drain(self):
+        ''' Последовательно обработать все задачи из очереди потока (выполняется в пуле потоков выполнения). '''
+
+        while True:
+            with self.__lock:
+                if not self.__pending:
+                    self.__is_draining = False
+                    return
+                future, method, args = self.__pending.popleft()
+
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(method(*args))
+            except Exception as error:
+                future.set_exception(error)
+
+
+class MultiStreamDenoiser(object):
+    ''' Шумоподавление множества независимых потоков в пуле потоков выполнения одного процесса (без затрат на межпроцессное
+    взаимодействие). Все потоки используют одну загруженную библиотеку RNNoise, у каждого потока своё состояние нейронной сети.
+    - open_stream(): создать новый поток шумоподавления (ScheduledStream)
+    - filter_many(): параллельная очистка от шума списка аудиозаписей
+    - close(): остановить пул потоков выполнения
+
+    Параллельная работа возможна благодаря тому, что ctypes отпускает GIL на время вызова библиотеки. Для заметного ускорения
+    нужна вспомогательная библиотека rnnoise_batch.so (см. compile_rnnoise.sh), которая обрабатывает весь блок фреймов за один вызов.
+
+    1. workers - количество потоков выполнения (если None - по количеству ядер процессора)
+    2. f_name_lib - путь к библиотеке или её имя/субимя (см. RNNoise)
+    3. model_path - путь к файлу весов модели (см. RNNoise), загруженная модель общая для всех потоков шумоподавления '''
+
+    def __init__(self, workers=None, f_name_lib=None, model_path=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.denoiser = RNNoise(f_name_lib, model_path)
+        self.__executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.workers)
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+    def open_stream(self, sample_rate=None, voice_prob_threshold=0.0, save_source_sample_rate=True):
+        ''' Создать новый поток шумоподавления с отдельным состоянием нейронной сети.
+        1. sample_rate - частота дискретизации частей аудиозаписи (если None - 48 кГц)
+        2. voice_prob_threshold - порог вероятности наличия голоса в каждом фрейме (значение от 0 до 1, если 0 - использовать все фреймы)
+        3. save_source_sample_rate - True: приводить частоту дискретизации возвращаемых частей к исходной
+        4. возвращает объект ScheduledStream '''
+
+        session = RNNoiseStream(self.denoiser.spawn(), sample_rate, voice_prob_threshold, save_source_sample_rate)
+        return ScheduledStream(self.__executor, session)
+
+
+    def filter_many(self, audios, sample_rate=None, voice_prob_threshold=0.0, save_source_sample_rate=True):
+        ''' Параллельная очистка от шума списка аудиозаписей, каждая обрабатывается целиком со своим состоянием нейронной сети.
+        1. audios - список объектов pydub.AudioSegment или байтовых строк с аудиоданными (без заголовков wav)
+        2. sample_rate - частота дискретизации (обязательно только когда элементы audios - байтовые строки)
+        3. voice_prob_threshold - порог вероятности наличия голоса в каждом фрейме (значение от 0 до 1, если 0 - использовать все фреймы)
+        4. save_source_sample_rate - True: приводить частоту дискретизации возвращаемых аудиозаписей к исходной
+        5. возвращает список очищенных от шума аудиозаписей в порядке audios '''
+
+        def filter_audio(audio):
+            return self.denoiser.spawn().filter(audio, sample_rate, voice_prob_threshold, save_source_sample_rate)
+
+        return list(self.__executor.map(filter_audio, audios))
+
+
+    def close(self):
+        ''' Дождаться завершения всех задач и остановить пул потоков выполнения. '''
+
+        self.__executor.shutdown(wait=True)
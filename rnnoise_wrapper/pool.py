@@ -0,0 +1,146 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+#       OS : GNU/Linux Ubuntu 16.04 or later
+# LANGUAGE : Python 3.5.2 or later
+#   AUTHOR : Klim V. O.
+# - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+'''
+Пул заранее созданных объектов RNNoise для многопользовательских серверов.
+
+Содержит класс DenoiserPool.
+
+Зависимости: pydub, numpy.
+'''
+
+import time
+import queue
+import threading
+from contextlib import contextmanager
+
+from .metrics import Metrics
+from .rnnoise_wrapper import RNNoise
+
+
+class DenoiserPool(object):
+    ''' Ограниченный пул заранее созданных объектов RNNoise, использующих одну загруженную библиотеку RNNoise:
+    - acquire(): взять объект RNNoise из пула (при отсутствии свободных - ждать)
+    - release(): сбросить состояние объекта RNNoise и вернуть его в пул
+    - checkout(): контекстный менеджер над acquire()/release()
+    - filter_batch(): очистка от шума списка коротких аудиозаписей с переиспользованием объектов из пула
+    - enable_metrics(), disable_metrics(): включить/выключить сбор общих метрик работы всех объектов пула
+
+    Поиск и загрузка библиотеки выполняются один раз при создании пула, а сброс состояния при возврате в пул выполняется
+    без пересоздания объекта в библиотеке (см. RNNoise.reset()). Пул потокобезопасен.
+
+    1. size - количество объектов RNNoise в пуле
+    2. f_name_lib - путь к библиотеке или её имя/субимя (см. RNNoise)
+    3. model_path - путь к файлу весов модели (см. RNNoise), загруженная модель общая для всех объектов пула '''
+
+    metrics = None
+
+    def __init__(self, size=4, f_name_lib=None, model_path=None):
+        if size < 1:
+            raise ValueError("'size' must be greater than 0")
+
+        self.size = size
+        self.__denoiser = RNNoise(f_name_lib, model_path)
+        self.__denoisers = [self.__denoiser] + [self.__denoiser.spawn() for _ in range(size-1)]
+
+        self.__free_denoisers = queue.LifoQueue(maxsize=size)
+        for denoiser in self.__denoisers:
+            self.__free_denoisers.put_nowait(denoiser)
+
+        # id() объектов, выданных через acquire() и ещё не возвращённых через release()
+        self.__checked_out_ids = set()
+        self.__checked_out_lock = threading.Lock()
+
+
+    def acquire(self, timeout=None):
+        ''' Взять объект RNNoise из пула. Если свободных объектов нет - ждать, пока один из них не будет возвращён.
+        1. timeout - максимальное время ожидания в секундах (если None - ждать бесконечно)
+        2. возвращает объект RNNoise или вызывает TimeoutError, если за timeout не освободился ни один объект '''
+
+        metrics = self.metrics
+        if metrics is not None:
+            start_time = time.perf_counter()
+
+        try:
+            denoiser = self.__free_denoisers.get(timeout=timeout)
+        except queue.Empty:
+            raise TimeoutError('no free RNNoise objects in pool after {} s'.format(timeout))
+
+        with self.__checked_out_lock:
+            self.__checked_out_ids.add(id(denoiser))
+
+        if metrics is not None:
+            metrics.record_stage('pool_wait', time.perf_counter() - start_time)
+        return denoiser
+
+
+    def enable_metrics(self, metrics=None):
+        ''' Включить сбор общих метрик работы всех объектов RNNoise пула (см. RNNoise.enable_metrics()). Дополнительно учитывается
+        время ожидания свободного объекта в acquire() (этап 'pool_wait').
+        1. metrics - объект Metrics (если None - будет создан новый)
+        2. возвращает объект Metrics '''
+
+        self.metrics = metrics or Metrics()
+        for denoiser in self.__denoisers:
+            denoiser.enable_metrics(self.metrics)
+        return self.metrics
+
+
+    def disable_metrics(self):
+        ''' Выключить сбор метрик работы всех объектов RNNoise пула. '''
+
+        self.metrics = None
+        for denoiser in self.__denoisers:
+            denoiser.disable_metrics()
+
+
+    def release(self, denoiser):
+        ''' Сбросить состояние нейронной сети объекта RNNoise и вернуть его в пул.
+        1. denoiser - объект RNNoise, ранее полученный из этого пула через acquire() и ещё не возвращённый '''
+
+        if not any(denoiser is pool_denoiser for pool_denoiser in self.__denoisers):
+            raise ValueError("'denoiser' does not belong to this pool")
+        with self.__checked_out_lock:
+            if id(denoiser) not in self.__checked_out_ids:
+                raise ValueError("'denoiser' is not checked out from this pool (already released?)")
+            self.__checked_out_ids.remove(id(denoiser))
+
+        denoiser.reset()
+        self.__free_denoisers.put_nowait(denoiser)
+
+
+    @contextmanager
+    def checkout(self, timeout=None):
+        ''' Контекстный менеджер для получения объекта RNNoise из пула и его автоматического возврата.
+        1. timeout - максимальное время ожидания свободного объекта в секундах (если None - ждать бесконечно)
+        2. возвращает объект RNNoise '''
+
+        denoiser = self.acquire(timeout)
+        try:
+            yield denoiser
+        finally:
+            self.release(denoiser)
+
+
+    def filter_batch(self, clips, sample_rate=None, voice_prob_threshold=0.0, save_source_sample_rate=True, timeout=None):
+        ''' Очистка от шума списка коротких аудиозаписей. Для обработки берётся один объект RNNoise из пула, состояние которого
+        сбрасывается перед каждой аудиозаписью, поэтому аудиозаписи обрабатываются независимо друг от друга.
+        1. clips - список объектов pydub.AudioSegment или байтовых строк с аудиоданными (без заголовков wav)
+        2. sample_rate - частота дискретизации (обязательно только когда элементы clips - байтовые строки)
+        3. voice_prob_threshold - порог вероятности наличия голоса в каждом фрейме (значение от 0 до 1, если 0 - использовать все фреймы)
+        4. save_source_sample_rate - True: приводить частоту дискретизации возвращаемых аудиозаписей к исходной
+        5. timeout - максимальное время ожидания свободного объекта в секундах (если None - ждать бесконечно)
+        6. возвращает список очищенных от шума аудиозаписей (тип каждой соответствует типу исходной аудиозаписи) '''
+
+        denoised_clips = []
+        with self.checkout(timeout) as denoiser:
+            for i, clip in enumerate(clips):
+                if i > 0:
+                    denoiser.reset()
+                denoised_clips.append(denoiser.filter(clip, sample_rate, voice_prob_threshold, save_source_sample_rate))
+        return denoised_clips
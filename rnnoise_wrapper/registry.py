@@ -0,0 +1,254 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+#       OS : GNU/Linux Ubuntu 16.04 or later
+# LANGUAGE : Python 3.5.2 or later
+#   AUTHOR : Klim V. O.
+# - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+'''
+Реестр моделей RNNoise для серверов, обслуживающих несколько моделей (например, отдельную модель для русского языка):
+библиотеки загружаются при первом использовании, для каждой модели держится свой пул объектов RNNoise, неиспользуемые
+модели вытесняются.
+
+Содержит классы ModelRegistry и ModelStream.
+
+Зависимости: pydub, numpy.
+'''
+
+import os
+import time
+import threading
+import collections
+from contextlib import contextmanager
+
+from .pool import DenoiserPool
+from .rnnoise_wrapper import RNNoiseStream, find_library, is_model_file
+
+
+class ModelStream(RNNoiseStream):
+    ''' Сессия шумоподавления потокового аудио (см. RNNoiseStream), использующая объект RNNoise из пула модели реестра.
+    После завершения сессии объект нужно вернуть в пул с помощью close() (или использовать сессию как контекстный менеджер).
+
+    1. registry - объект ModelRegistry
+    2. model_path - ключ модели в реестре (см. ModelRegistry.loaded_models)
+    3. denoiser - объект RNNoise, полученный из пула модели
+    4. остальные аргументы - как у RNNoiseStream '''
+
+    def __init__(self, registry, model_path, denoiser, sample_rate=None, voice_prob_threshold=0.0, save_source_sample_rate=True,
+                 float_output=False):
+        super().__init__(denoiser, sample_rate, voice_prob_threshold, save_source_sample_rate, float_output)
+        self.model_path = model_path
+        self.__registry = registry
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+    def close(self):
+        ''' Вернуть объект RNNoise в пул модели (повторные вызовы ничего не делают). Остаток потока не обрабатывается,
+        при необходимости перед close() нужно вызвать flush(). '''
+
+        registry, self.__registry = self.__registry, None
+        if registry is not None:
+            registry._release(self.model_path, self.denoiser)
+
+
+class ModelRegistry(object):
+    ''' Реестр моделей RNNoise с ленивой загрузкой и вытеснением давно не использовавшихся моделей:
+    - register(): задать короткое имя модели (например, 'ru') для библиотеки или файла весов
+    - checkout(): контекстный менеджер для получения объекта RNNoise нужной модели из её пула
+    - filter(): очистка от шума аудиозаписи выбранной моделью
+    - open_stream(): сессия шумоподавления потокового аудио выбранной моделью (ModelStream)
+    - evict_idle(): вытеснить модели, не использовавшиеся дольше заданного времени
+    - loaded_models: ключи загруженных моделей (путь к библиотеке, для файлов весов - '<путь к библиотеке>:<путь к файлу весов>'),
+        от давно не использовавшейся к последней использованной
+
+    Модель выбирается по имени: зарегистрированному через register(), имени/субимени библиотеки (например, '5h_ru' или 'default'),
+    пути к ней (см. find_library()) или пути к файлу весов в формате rnnoise-nu (используется с библиотекой по умолчанию). Разные
+    имена одной и той же модели используют один пул. Модели из файлов весов используют одну общую библиотеку, поэтому их
+    загрузка быстрее и требует меньше памяти, чем загрузка отдельной библиотеки для каждой модели. Пул модели (DenoiserPool)
+    создаётся при первом обращении к ней, а когда загружено больше max_models моделей - вытесняется пул модели, дольше всех
+    не использовавшейся и не занятой в данный момент. При вытеснении освобождаются состояния нейронной сети всех объектов пула,
+    а модель из файла весов (RNNModel в куче) - вместе с последним использующим её объектом RNNoise (см. load_model()), поэтому
+    повторное обращение к ней заново загружает файл. Библиотека остаётся загруженной в процесс (безопасно выгрузить библиотеку
+    через ctypes нельзя), но встроенные в неё веса - это страницы файла только для чтения, которые операционная система освобождает
+    при нехватке памяти, а повторная загрузка такой модели после вытеснения сводится к созданию нового пула. Реестр потокобезопасен.
+
+    1. pool_size - количество объектов RNNoise в пуле каждой модели
+    2. max_models - максимальное количество одновременно загруженных моделей (если None - не ограничено)
+    3. default_model - имя модели по умолчанию (если None - как у RNNoise(): переменная окружения RNNOISE_LIB или librnnoise_5h_b_500k) '''
+
+    def __init__(self, pool_size=4, max_models=2, default_model=None):
+        if pool_size < 1:
+            raise ValueError("'pool_size' must be greater than 0")
+        if max_models is not None and max_models < 1:
+            raise ValueError("'max_models' must be greater than 0")
+
+        self.pool_size = pool_size
+        self.max_models = max_models
+        self.default_model = default_model
+
+        self.__aliases = {}
+        self.__models = collections.OrderedDict()
+        self.__lock = threading.Lock()
+
+
+    @property
+    def loaded_models(self):
+        with self.__lock:
+            return list(self.__models)
+
+
+    def register(self, name, f_name_lib=None, model_path=None):
+        ''' Задать короткое имя модели. Библиотека и файл весов при этом не загружаются.
+        1. name - имя модели, по которому её можно выбирать (например, 'ru')
+        2. f_name_lib - путь к библиотеке или её имя/субимя (см. RNNoise, если None - библиотека по умолчанию)
+        3. model_path - путь к файлу весов модели (см. RNNoise, если None - использовать модель, встроенную в библиотеку) '''
+
+        if f_name_lib is None and model_path is None:
+            raise ValueError("at least one of 'f_name_lib' and 'model_path' must be set")
+
+        with self.__lock:
+            self.__aliases[name] = (f_name_lib, model_path)
+
+
+    @contextmanager
+    def checkout(self, model=None, timeout=None):
+        ''' Контекстный менеджер для получения объекта RNNoise выбранной модели из её пула и его автоматического возврата
+        (см. DenoiserPool.checkout()). При первом обращении к модели загружается её библиотека и создаётся пул.
+        1. model - имя модели (если None - default_model)
+        2. timeout - максимальное время ожидания свободного объекта в секундах (если None - ждать бесконечно)
+        3. возвращает объект RNNoise '''
+
+        model_path, denoiser = self.__acquire(model, timeout)
+        try:
+            yield denoiser
+        finally:
+            self._release(model_path, denoiser)
+
+
+    def filter(self, audio, model=None, sample_rate=None, voice_prob_threshold=0.0, save_source_sample_rate=True, float_output=False,
+               timeout=None):
+        ''' Очистить аудиозапись от шума выбранной моделью (см. RNNoise.filter()). Аудиозапись обрабатывается со сброшенным
+        состоянием нейронной сети, независимо от предыдущих вызовов.
+        1. audio - аудиозапись (см. RNNoise.filter())
+        2. model - имя модели (если None - default_model)
+        3. sample_rate - частота дискретизации (обязательно, когда audio - не pydub.AudioSegment)
+        4. voice_prob_threshold - порог вероятности наличия голоса в каждом фрейме (значение от 0 до 1, если 0 - использовать все фреймы)
+        5. save_source_sample_rate - True: приводить частоту дискретизации возвращаемой аудиозаписи к исходной
+        6. float_output - True: вернуть numpy.ndarray float32 (значения от -1 до 1)
+        7. timeout - максимальное время ожидания свободного объекта RNNoise в секундах (если None - ждать бесконечно)
+        8. возвращает аудиозапись, очищенную от шума (тип как у RNNoise.filter()) '''
+
+        with self.checkout(model, timeout) as denoiser:
+            return denoiser.filter(audio, sample_rate, voice_prob_threshold, save_source_sample_rate, float_output)
+
+
+    def open_stream(self, model=None, sample_rate=None, voice_prob_threshold=0.0, save_source_sample_rate=True, float_output=False,
+                    timeout=None):
+        ''' Открыть сессию шумоподавления потокового аудио выбранной моделью. Объект RNNoise занят сессией до вызова
+        ModelStream.close(), модель сессии при этом не вытесняется.
+        1. model - имя модели (если None - default_model)
+        2. sample_rate, voice_prob_threshold, save_source_sample_rate, float_output - параметры сессии (см. RNNoiseStream)
+        3. timeout - максимальное время ожидания свободного объекта RNNoise в секундах (если None - ждать бесконечно)
+        4. возвращает объект ModelStream '''
+
+        model_path, denoiser = self.__acquire(model, timeout)
+        try:
+            return ModelStream(self, model_path, denoiser, sample_rate, voice_prob_threshold, save_source_sample_rate, float_output)
+        except Exception:
+            self._release(model_path, denoiser)
+            raise
+
+
+    def evict_idle(self, max_idle_s):
+        ''' Вытеснить модели, которые не использовались дольше max_idle_s секунд и не заняты в данный момент.
+        1. max_idle_s - время в секундах
+        2. возвращает список ключей вытесненных моделей '''
+
+        now = time.monotonic()
+        with self.__lock:
+            evicted_model_paths = [model_path for model_path, model_state in self.__models.items()
+                                   if model_state['in_use'] == 0 and now - model_state['last_used'] > max_idle_s]
+            for model_path in evicted_model_paths:
+                del self.__models[model_path]
+        return evicted_model_paths
+
+
+    def __acquire(self, model, timeout):
+        ''' Взять объект RNNoise из пула модели, загрузив модель при первом обращении.
+        1. model - имя модели
+        2. timeout - максимальное время ожидания свободного объекта в секундах
+        3. возвращает tuple из пути к библиотеке модели и объекта RNNoise '''
+
+        model_path, f_name_lib, f_name_model = self.__get_model_path(model)
+
+        with self.__lock:
+            model_state = self.__models.get(model_path)
+            if model_state is None:
+                # Пул создаётся под блокировкой реестра: загрузка модели выполняется один раз
+                model_state = {'pool': DenoiserPool(self.pool_size, f_name_lib, f_name_model), 'in_use': 0, 'last_used': time.monotonic()}
+                self.__models[model_path] = model_state
+            self.__models.move_to_end(model_path)
+            model_state['in_use'] += 1
+            model_state['last_used'] = time.monotonic()
+            self.__evict_lru()
+
+        try:
+            return model_path, model_state['pool'].acquire(timeout)
+        except Exception:
+            with self.__lock:
+                model_state['in_use'] -= 1
+            raise
+
+
+    def _release(self, model_path, denoiser):
+        ''' Вернуть объект RNNoise в пул модели (используется в checkout() и ModelStream.close()).
+        1. model_path - ключ модели в реестре
+        2. denoiser - объект RNNoise, полученный из пула этой модели '''
+
+        with self.__lock:
+            model_state = self.__models.get(model_path)
+            if model_state is not None:
+                model_state['in_use'] -= 1
+                model_state['last_used'] = time.monotonic()
+            self.__evict_lru()
+        if model_state is not None:
+            model_state['pool'].release(denoiser)
+
+
+    def __get_model_path(self, model):
+        ''' Получить ключ модели в реестре и параметры для создания её пула по имени модели (см. описание класса).
+        1. model - имя модели
+        2. возвращает tuple из ключа модели в реестре, пути к библиотеке и пути к файлу весов (или None) '''
+
+        model = model or self.default_model
+        with self.__lock:
+            f_name_lib, f_name_model = self.__aliases.get(model, (model, None))
+
+        if f_name_model is None and f_name_lib and is_model_file(f_name_lib):
+            f_name_lib, f_name_model = None, f_name_lib
+        f_name_lib = find_library(f_name_lib)
+
+        if f_name_model is None:
+            return f_name_lib, f_name_lib, None
+        f_name_model = os.path.abspath(f_name_model)
+        return '{}:{}'.format(f_name_lib, f_name_model), f_name_lib, f_name_model
+
+
+    def __evict_lru(self):
+        ''' Вытеснить давно не использовавшиеся незанятые модели, пока их больше max_models (вызывается под блокировкой). '''
+
+        if self.max_models is None:
+            return
+        for model_path in list(self.__models):
+            if len(self.__models) <= self.max_models:
+                break
+            if self.__models[model_path]['in_use'] == 0:
+                del self.__models[model_path]
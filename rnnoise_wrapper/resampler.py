@@ -0,0 +1,220 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+#       OS : GNU/Linux Ubuntu 16.04 or later
+# LANGUAGE : Python 3.5.2 or later
+#   AUTHOR : Klim V. O.
+# - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+'''
+Потоковый полифазный ресемплер для приведения частоты дискретизации к 48 кГц (поддерживается RNNoise) и обратно.
+
+Содержит классы Resampler и MultiRateResampler и функцию resample().
+
+Зависимости: numpy.
+'''
+
+import math
+import numpy as np
+from numpy.lib.stride_tricks import as_strided
+
+
+# Кэш банков фильтров, ключ - (up, down, zero_crossings, rolloff)
+_filter_banks = {}
+
+# Максимальное количество элементов матрицы окон (выходные отсчёты x отводы фазы), перемножаемой за один вызов dot(): dot()
+# копирует strided-представление в непрерывную матрицу, поэтому без ограничения пиковая память в десятки раз больше входных данных
+MAX_WINDOWS_SIZE = 2**20
+
+
+def _get_filter_bank(up, down, zero_crossings, rolloff):
+    ''' Получить (рассчитать или взять из кэша) полифазный банк ФНЧ-фильтров для ресемплинга с коэффициентом up/down.
+    Используется оконный (окно Кайзера) sinc-фильтр с частотой среза rolloff от частоты Найквиста меньшей из частот дискретизации.
+    1. up - коэффициент интерполяции
+    2. down - коэффициент децимации
+    3. zero_crossings - количество переходов sinc через ноль с каждой стороны от центра фильтра
+    4. rolloff - частота среза в долях от частоты Найквиста (значение от 0 до 1)
+    5. возвращает tuple из numpy.ndarray float32 формы (up, K) с фазами фильтра (в обратном порядке отсчётов) и задержки фильтра '''
+
+    key = (up, down, zero_crossings, rolloff)
+    if key not in _filter_banks:
+        cutoff = rolloff / max(up, down)
+        delay = zero_crossings * max(up, down)
+        taps_count = 2 * delay + 1
+        taps_per_phase = -(-taps_count // up)
+
+        taps = np.arange(taps_count, dtype=np.float64) - delay
+        filter_taps = up * cutoff * np.sinc(cutoff * taps) * np.kaiser(taps_count, 8.6)
+
+        filter_taps = np.concatenate((filter_taps, np.zeros(taps_per_phase * up - taps_count)))
+        filter_bank = filter_taps.reshape(taps_per_phase, up).T[:, ::-1]
+        _filter_banks[key] = (np.ascontiguousarray(filter_bank, dtype=np.float32), delay)
+    return _filter_banks[key]
+
+
+class Resampler(object):
+    ''' Потоковый полифазный ресемплер с сохранением истории фильтра между частями аудиозаписи. Благодаря этому на границах
+    частей не возникает разрывов, а результат обработки аудиозаписи по частям совпадает с обработкой целиком.
+    - process(): ресемплинг очередной части аудиозаписи
+    - flush(): получение оставшихся отсчётов в конце потока (после вызова ресемплер готов к новому потоку)
+    - reset(): сброс истории фильтра
+
+    Задержка фильтра скомпенсирована: на выходе отсчёты выровнены по времени с входными, а суммарная длина результата
+    (после flush()) равна ceil(длина_входа * target_sample_rate / source_sample_rate).
+
+    1. source_sample_rate - исходная частота дискретизации
+    2. target_sample_rate - желаемая частота дискретизации
+    3. zero_crossings - длина фильтра в переходах sinc через ноль с каждой стороны (больше - качественнее, но медленнее)
+    4. rolloff - частота среза в долях от частоты Найквиста меньшей из частот дискретизации '''
+
+    def __init__(self, source_sample_rate, target_sample_rate, zero_crossings=16, rolloff=0.95):
+        if source_sample_rate <= 0 or target_sample_rate <= 0:
+            raise ValueError("'source_sample_rate' and 'target_sample_rate' must be positive")
+
+        self.source_sample_rate = source_sample_rate
+        self.target_sample_rate = target_sample_rate
+
+        gcd = math.gcd(source_sample_rate, target_sample_rate)
+        self.up = target_sample_rate // gcd
+        self.down = source_sample_rate // gcd
+
+        self.__filter_bank, self.__delay = _get_filter_bank(self.up, self.down, zero_crossings, rolloff)
+        self.__taps_per_phase = self.__filter_bank.shape[1]
+        self.reset()
+
+
+    def reset(self):
+        ''' Сбросить историю фильтра и счётчики отсчётов (начать новый поток). '''
+
+        self.__history = np.zeros(self.__taps_per_phase - 1, dtype=np.float32)
+        self.__input_count = 0
+        self.__output_count = 0
+
+
+    def process(self, samples):
+        ''' Ресемплинг очередной части аудиозаписи.
+        1. samples - numpy.ndarray с отсчётами (любой числовой тип, например int16 или float32)
+        2. возвращает numpy.ndarray float32 с отсчётами в target_sample_rate (значения в шкале исходных отсчётов) '''
+
+        samples = np.asarray(samples, dtype=np.float32).reshape(-1)
+        if self.up == self.down:
+            self.__input_count += samples.shape[0]
+            self.__output_count += samples.shape[0]
+            return samples.copy()
+
+        buffer = np.concatenate((self.__history, samples))
+        buffer_start = self.__input_count - self.__history.shape[0]
+        self.__input_count += samples.shape[0]
+        self.__history = buffer[buffer.shape[0]-self.__history.shape[0]:].copy()
+
+        # Последний отсчёт, для которого уже есть все входные данные: n*down + delay <= input_count*up - 1
+        output_end = (self.__input_count * self.up - 1 - self.__delay) // self.down + 1
+        return self.__compute(buffer, buffer_start, output_end)
+
+
+    def flush(self):
+        ''' Получить оставшиеся отсчёты в конце потока (недостающие входные данные считаются нулями). После вызова
+        история фильтра сбрасывается.
+        1. возвращает numpy.ndarray float32 с оставшимися отсчётами '''
+
+        total_output_count = -(-self.__input_count * self.up // self.down)
+        output_count = total_output_count - self.__output_count
+        if output_count <= 0 or self.up == self.down:
+            self.reset()
+            return np.zeros(0, dtype=np.float32)
+
+        last_input_index = ((total_output_count - 1) * self.down + self.__delay) // self.up
+        padding = np.zeros(max(last_input_index + 1 - self.__input_count, 0), dtype=np.float32)
+        samples = self.process(padding)[:output_count]
+
+        self.reset()
+        return samples
+
+
+    def __compute(self, buffer, buffer_start, output_end):
+        ''' Вычислить выходные отсчёты с номерами от self.__output_count до output_end.
+        1. buffer - numpy.ndarray float32 с историей фильтра и новыми входными отсчётами
+        2. buffer_start - номер входного отсчёта (от начала потока), соответствующего buffer[0]
+        3. output_end - номер выходного отсчёта (от начала потока), до которого (не включая) выполнять вычисление
+        4. возвращает numpy.ndarray float32 с выходными отсчётами '''
+
+        output_start = self.__output_count
+        if output_end <= output_start:
+            return np.zeros(0, dtype=np.float32)
+
+        # Выходные отсчёты с одинаковым остатком от деления номера на up используют одну и ту же фазу фильтра, а их входные окна
+        # сдвинуты друг относительно друга ровно на down отсчётов. Поэтому для каждой фазы окна - это strided-представление buffer
+        # без копирования, а вычисление сводится к умножению матрицы на вектор (по блокам не более MAX_WINDOWS_SIZE элементов)
+        samples = np.empty(output_end - output_start, dtype=np.float32)
+        item_size = buffer.strides[0]
+        block_size = max(MAX_WINDOWS_SIZE // self.__taps_per_phase, 1)
+        for residue in range(min(self.up, output_end - output_start)):
+            first_output = output_start + residue
+            outputs_count = -(-(output_end - first_output) // self.up)
+            position = first_output * self.down + self.__delay
+            first_window_start = position // self.up - buffer_start - self.__taps_per_phase + 1
+            phase = self.__filter_bank[position % self.up]
+            residue_samples = samples[residue::self.up]
+
+            for block_start in range(0, outputs_count, block_size):
+                block_outputs_count = min(block_size, outputs_count - block_start)
+                windows = as_strided(buffer[first_window_start+block_start*self.down:],
+                                     shape=(block_outputs_count, self.__taps_per_phase),
+                                     strides=(self.down * item_size, item_size), writeable=False)
+                residue_samples[block_start:block_start+block_outputs_count] = windows.dot(phase)
+
+        self.__output_count = output_end
+        return samples
+
+
+class MultiRateResampler(object):
+    ''' Потоковый ресемплинг одного сигнала сразу в несколько частот дискретизации (например, 16 кГц для ASR и 48 кГц для архива).
+    Для каждой частоты используется отдельный Resampler, совпадающая с исходной частота передаётся без изменений.
+    1. source_sample_rate - исходная частота дискретизации
+    2. target_sample_rates - список желаемых частот дискретизации
+    3. zero_crossings, rolloff - параметры фильтра (см. Resampler) '''
+
+    def __init__(self, source_sample_rate, target_sample_rates, zero_crossings=16, rolloff=0.95):
+        self.source_sample_rate = source_sample_rate
+        self.resamplers = {sample_rate: Resampler(source_sample_rate, sample_rate, zero_crossings, rolloff)
+                           for sample_rate in target_sample_rates}
+
+
+    def process(self, samples):
+        ''' Ресемплинг очередной части аудиозаписи во все частоты дискретизации.
+        1. samples - numpy.ndarray с отсчётами
+        2. возвращает dict, в котором ключ - частота дискретизации, значение - numpy.ndarray float32 с отсчётами '''
+
+        samples = np.asarray(samples, dtype=np.float32)
+        return {sample_rate: resampler.process(samples) for sample_rate, resampler in self.resamplers.items()}
+
+
+    def flush(self):
+        ''' Получить оставшиеся отсчёты в конце потока для всех частот дискретизации.
+        1. возвращает dict, в котором ключ - частота дискретизации, значение - numpy.ndarray float32 с отсчётами '''
+
+        return {sample_rate: resampler.flush() for sample_rate, resampler in self.resamplers.items()}
+
+
+    def reset(self):
+        ''' Сбросить историю фильтров для всех частот дискретизации. '''
+
+        for resampler in self.resamplers.values():
+            resampler.reset()
+
+
+def resample(samples, source_sample_rate, target_sample_rate, zero_crossings=16, rolloff=0.95):
+    ''' Ресемплинг всей аудиозаписи целиком.
+    1. samples - numpy.ndarray с отсчётами
+    2. source_sample_rate - исходная частота дискретизации
+    3. target_sample_rate - желаемая частота дискретизации
+    4. zero_crossings, rolloff - параметры фильтра (см. Resampler)
+    5. возвращает numpy.ndarray float32 с отсчётами в target_sample_rate '''
+
+    if source_sample_rate == target_sample_rate:
+        return np.asarray(samples, dtype=np.float32).reshape(-1)
+
+    resampler = Resampler(source_sample_rate, target_sample_rate, zero_crossings, rolloff)
+    head = resampler.process(samples)
+    tail = resampler.flush()
+    return np.concatenate((head, tail)) if tail.shape[0] else head
@@ -9,120 +9,663 @@
 '''
 Предназначен для подавления шума в wav аудиозаписи с помощью библиотеки RNNoise (https://github.com/xiph/rnnoise).
 
-Содержит класс RNNoise. Подробнее в https://github.com/Desklop/RNNoise_Wrapper.
+Содержит классы RNNoise и RNNoiseStream. Подробнее в https://github.com/Desklop/RNNoise_Wrapper.
 
 Зависимости: pydub, numpy.
 '''
 
 import os
+import struct
 import platform
 import time
 import ctypes
-import pkg_resources
+import ctypes.util
+import threading
 import numpy as np
 from pydub import AudioSegment
 
+from .bypass import AdaptiveBypass
+from .metrics import Metrics
+from .resampler import Resampler, resample
+from .vad import TimeMap, get_speech_segments
+from .wav_io import WavWriter, iter_wav_blocks, read_wav_info, read_wav_samples, to_mono
+
 
 __version__ = 1.1
 
 
+# Переменная окружения, в которой можно указать путь к библиотеке (или её имя/субимя), используемой по умолчанию
+RNNOISE_LIB_ENV = 'RNNOISE_LIB'
+
+# Реестр библиотек RNNoise: найденные пути (ключ - (f_name_lib, текущая папка)) и загруженные библиотеки (ключ - абсолютный путь)
+_found_f_names_lib = {}
+_loaded_libs = {}
+_libs_lock = threading.Lock()
+
+# Модели, загруженные из файлов весов (ключ - (абсолютный путь, размер, время изменения)), счётчики ссылок на них (ключ - адрес
+# RNNModel, значение - [ключ в _loaded_models, библиотека, количество ссылок]) и стандартная библиотека C для fopen(). Для моделей
+# используется RLock, т.к. release_model() вызывается из RNNoise.__del__(), который может сработать при сборке мусора в том же потоке
+_loaded_models = {}
+_model_refs = {}
+_models_lock = threading.RLock()
+_libc = None
+
+# Первая строка файла весов модели в формате rnnoise-nu (см. rnnoise_model_from_file() в rnn_reader.c)
+MODEL_FILE_HEADER = 'rnnoise-nu model file version 1'
+
+# Заголовок снимка состояния нейронной сети (см. RNNoise.snapshot()): сигнатура, версия формата, размер DenoiseState без RNNState
+# и размеры состояний GRU-слоёв
+_SNAPSHOT_HEADER = struct.Struct('<4sIIIII')
+_SNAPSHOT_MAGIC = b'RNNS'
+_SNAPSHOT_VERSION = 1
+
+
+def _get_folder_name_libs():
+    ''' Получить путь к папке libs с библиотеками, поставляемыми с пакетом.
+    1. возвращает путь к папке '''
+
+    try:
+        from importlib.resources import files
+        return str(files(__package__).joinpath('libs'))
+    except (ImportError, TypeError):
+        return os.path.join(os.path.dirname(os.path.abspath(__file__)), 'libs')
+
+
+def _find_lib(f_name_lib, root_folder='.'):
+    ''' Выполнить рекурсивный поиск файла f_name_lib в папке root_folder и всех её подпапках.
+    1. f_name_lib - имя искомого файла или его субимя (часть имени, позволяющая однозначно идентифицировать файл)
+    2. root_folder - корневая папка, из которой начинать поиск
+    3. возвращает найденный существующий путь или None '''
+
+    f_name_lib_full = os.path.abspath(f_name_lib)
+    if os.path.isfile(f_name_lib_full):
+        return f_name_lib_full
+
+    for path, folder_names, f_names in os.walk(root_folder):
+        for f_name in f_names:
+            if f_name.rfind(f_name_lib) != -1:
+                return os.path.abspath(os.path.join(path, f_name))
+
+
+def find_library(f_name_lib=None):
+    ''' Найти и/или проверить путь к скомпилированной библиотеке RNNoise. Результат кэшируется, поэтому поиск (в том числе
+    рекурсивный обход текущей папки) выполняется только один раз для каждого значения f_name_lib.
+
+    1. f_name_lib - путь к библиотеке, если None - использовать значение переменной окружения RNNOISE_LIB, а если она не задана и:
+            - тип используемой ОС linux или mac (darwin) - использовать librnnoise_5h_b_500k.so.0.4.1 из файлов пакета
+            - тип используемой ОС windows или другое - выполнить поиск в текущей папке и её подпапках файла с префиксом 'librnnoise'
+        если является путём к библиотеке/именем библиотеки - проверить существование переданного пути/имени библиотеки и если:
+            - имя/субимя совпадает с одной из библиотек пакета - вернуть абсолютный путь к ней
+            - путь/имя существует - вернуть абсолютный путь
+            - путь/имя не существует - выполнить поиск в текущей папке и её подпапках файла/пути, используя переданное значение в качестве субимени
+    2. возвращает абсолютный путь к найденной библиотеке '''
+
+    if not f_name_lib:
+        f_name_lib = os.environ.get(RNNOISE_LIB_ENV) or None
+
+    key = (f_name_lib, os.getcwd())
+    found_f_name_lib = _found_f_names_lib.get(key)
+    if found_f_name_lib:
+        return found_f_name_lib
+
+    folder_name_libs = _get_folder_name_libs()
+    if not f_name_lib:
+        subname = 'librnnoise'
+        system = platform.system()
+        found_f_name_lib = None
+        if system == 'Linux' or system == 'Darwin':
+            found_f_name_lib = os.path.join(folder_name_libs, '{}_5h_b_500k.so.0.4.1'.format(subname))
+            if not os.path.exists(found_f_name_lib):
+                found_f_name_lib = _find_lib(subname)
+        else:
+            found_f_name_lib = _find_lib(subname)
+
+        if not found_f_name_lib:
+            raise NameError("could not find RNNoise library with subname '{}'".format(subname))
+
+    else:
+        f_names_available_libs = os.listdir(folder_name_libs) if os.path.isdir(folder_name_libs) else []
+        for available_lib in sorted(f_names_available_libs):
+            if available_lib.startswith('librnnoise') and available_lib.find(f_name_lib) != -1:
+                f_name_lib = os.path.join(folder_name_libs, available_lib)
+
+        found_f_name_lib = _find_lib(f_name_lib)
+        if not found_f_name_lib:
+            raise NameError("could not find RNNoise library with name/subname '{}'".format(f_name_lib))
+
+    _found_f_names_lib[key] = found_f_name_lib
+    return found_f_name_lib
+
+
+def load_library(f_name_lib):
+    ''' Загрузить библиотеку RNNoise и настроить типы аргументов её функций. Каждая библиотека загружается один раз на процесс,
+    повторные вызовы возвращают тот же объект ctypes.CDLL.
+    1. f_name_lib - путь к библиотеке (результат find_library())
+    2. возвращает ctypes.CDLL с дополнительными атрибутами rnnoise_obj_size (размер DenoiseState) и process_frame_ptr
+        (адрес rnnoise_process_frame() для вспомогательной библиотеки rnnoise_batch.so) '''
+
+    f_name_lib = os.path.abspath(f_name_lib)
+    rnnoise_lib = _loaded_libs.get(f_name_lib)
+    if rnnoise_lib is not None:
+        return rnnoise_lib
+
+    with _libs_lock:
+        rnnoise_lib = _loaded_libs.get(f_name_lib)
+        if rnnoise_lib is not None:
+            return rnnoise_lib
+
+        rnnoise_lib = ctypes.cdll.LoadLibrary(f_name_lib)
+
+        # Указатели на фреймы передаются как c_void_p, что позволяет в filter_block() передавать просто адрес фрейма внутри блока
+        # (целое число) без создания ctypes-объекта на каждый фрейм
+        rnnoise_lib.rnnoise_process_frame.argtypes = [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p]
+        rnnoise_lib.rnnoise_process_frame.restype = ctypes.c_float
+        rnnoise_lib.rnnoise_create.argtypes = [ctypes.c_void_p]
+        rnnoise_lib.rnnoise_create.restype = ctypes.c_void_p
+        rnnoise_lib.rnnoise_destroy.argtypes = [ctypes.c_void_p]
+        rnnoise_lib.rnnoise_get_size.restype = ctypes.c_int
+        if hasattr(rnnoise_lib, 'rnnoise_model_from_file'):
+            rnnoise_lib.rnnoise_model_from_file.argtypes = [ctypes.c_void_p]
+            rnnoise_lib.rnnoise_model_from_file.restype = ctypes.c_void_p
+        if hasattr(rnnoise_lib, 'rnnoise_model_free'):
+            rnnoise_lib.rnnoise_model_free.argtypes = [ctypes.c_void_p]
+
+        rnnoise_lib.rnnoise_obj_size = rnnoise_lib.rnnoise_get_size()
+        rnnoise_lib.process_frame_ptr = ctypes.cast(rnnoise_lib.rnnoise_process_frame, ctypes.c_void_p).value
+
+        _loaded_libs[f_name_lib] = rnnoise_lib
+    return rnnoise_lib
+
+
+def _get_libc():
+    ''' Загрузить (один раз на процесс) стандартную библиотеку C для открытия файла весов через fopen().
+    1. возвращает ctypes.CDLL '''
+
+    global _libc
+
+    if _libc is None:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') if platform.system() != 'Windows' else 'msvcrt')
+        libc.fopen.argtypes = [ctypes.c_char_p, ctypes.c_char_p]
+        libc.fopen.restype = ctypes.c_void_p
+        libc.fclose.argtypes = [ctypes.c_void_p]
+        _libc = libc
+    return _libc
+
+
+def load_model(f_name_model, rnnoise_lib):
+    ''' Загрузить модель RNNoise из файла весов в формате rnnoise-nu (создаётся в training_utils/dump_rnn_mod.py или
+    RNNoise.save_model()). Файл загружается один раз, а полученная модель (RNNModel) используется всеми объектами RNNoise с этим
+    файлом. Каждый вызов добавляет ссылку на модель, которую нужно освободить через release_model() (RNNoise делает это сам при
+    удалении объекта): когда удалена последняя ссылка, модель освобождается, и следующий вызов загрузит файл заново. Если файл
+    изменился (размер или время изменения), он загружается заново, а уже созданные объекты продолжают использовать прежнюю модель.
+    1. f_name_model - путь к файлу весов
+    2. rnnoise_lib - загруженная библиотека RNNoise (результат load_library())
+    3. возвращает адрес RNNModel (целое число) '''
+
+    f_name_model = os.path.abspath(f_name_model)
+    if not os.path.isfile(f_name_model):
+        raise NameError("could not find RNNoise model file '{}'".format(f_name_model))
+    if not hasattr(rnnoise_lib, 'rnnoise_model_from_file'):
+        raise ValueError('RNNoise library does not support loading models from files (rnnoise_model_from_file() not found)')
+
+    stat = os.stat(f_name_model)
+    key = (f_name_model, stat.st_size, stat.st_mtime_ns)
+
+    with _models_lock:
+        rnnoise_model = _loaded_models.get(key)
+        if rnnoise_model is not None:
+            _model_refs[rnnoise_model][2] += 1
+            return rnnoise_model
+
+        libc = _get_libc()
+        f_model = libc.fopen(f_name_model.encode(), b'r')
+        if not f_model:
+            raise ValueError("could not open RNNoise model file '{}'".format(f_name_model))
+        try:
+            rnnoise_model = rnnoise_lib.rnnoise_model_from_file(f_model)
+        finally:
+            libc.fclose(f_model)
+        if not rnnoise_model:
+            raise ValueError("'{}' is not a valid RNNoise model file (expected '{}' format)".format(f_name_model, MODEL_FILE_HEADER))
+
+        _loaded_models[key] = rnnoise_model
+        _model_refs[rnnoise_model] = [key, rnnoise_lib, 1]
+    return rnnoise_model
+
+
+def _retain_model(rnnoise_model):
+    ''' Добавить ссылку на уже загруженную модель (например, для объекта, созданного через RNNoise.spawn()).
+    1. rnnoise_model - адрес RNNModel (результат load_model()) '''
+
+    with _models_lock:
+        _model_refs[rnnoise_model][2] += 1
+
+
+def release_model(rnnoise_model):
+    ''' Освободить ссылку на модель, полученную через load_model(). Когда удалена последняя ссылка, модель удаляется из кэша
+    загруженных моделей и освобождается через rnnoise_model_free() (если библиотека его поддерживает).
+    1. rnnoise_model - адрес RNNModel (результат load_model()) '''
+
+    with _models_lock:
+        model_ref = _model_refs.get(rnnoise_model)
+        if model_ref is None:
+            raise ValueError('RNNoise model {:#x} was not loaded by load_model() or is already released'.format(rnnoise_model))
+        model_ref[2] -= 1
+        if model_ref[2] > 0:
+            return
+
+        key, rnnoise_lib = model_ref[:2]
+        del _model_refs[rnnoise_model]
+        if _loaded_models.get(key) == rnnoise_model:
+            del _loaded_models[key]
+    if hasattr(rnnoise_lib, 'rnnoise_model_free'):
+        rnnoise_lib.rnnoise_model_free(rnnoise_model)
+
+
+def is_model_file(f_name):
+    ''' Проверить, является ли файл файлом весов модели RNNoise в формате rnnoise-nu (по первой строке).
+    1. f_name - путь к файлу
+    2. возвращает True/False '''
+
+    if not os.path.isfile(f_name):
+        return False
+    with open(f_name, 'rb') as f_model:
+        return f_model.read(len(MODEL_FILE_HEADER)) == MODEL_FILE_HEADER.encode()
+
+
+# Вспомогательная библиотека для обработки блока фреймов за один вызов (собирается в compile_rnnoise.sh из rnnoise_batch.c).
+# Если она не собрана - filter_block() обрабатывает фреймы в цикле на Python
+_batch_lib = None
+_batch_lib_loaded = False
+
+
+def _load_batch_lib():
+    ''' Загрузить (один раз на процесс) вспомогательную библиотеку rnnoise_batch.so.
+    1. возвращает ctypes.CDLL или None, если библиотека не найдена '''
+
+    global _batch_lib, _batch_lib_loaded
+
+    if not _batch_lib_loaded:
+        f_name_batch_lib = os.path.join(_get_folder_name_libs(), 'rnnoise_batch.so')
+        try:
+            _batch_lib = ctypes.cdll.LoadLibrary(f_name_batch_lib)
+            _batch_lib.rnnoise_process_frames.argtypes = [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p, ctypes.c_int, ctypes.c_void_p]
+            _batch_lib.rnnoise_process_frames.restype = ctypes.c_int
+        except OSError:
+            _batch_lib = None
+        _batch_lib_loaded = True
+    return _batch_lib
+
+
+class _DenseLayer(ctypes.Structure):
+    ''' Структура DenseLayer из rnn.h библиотеки RNNoise (веса - signed char, масштаб 1/256). '''
+
+    _fields_ = [('bias', ctypes.POINTER(ctypes.c_byte)), ('input_weights', ctypes.POINTER(ctypes.c_byte)),
+                ('nb_inputs', ctypes.c_int), ('nb_neurons', ctypes.c_int), ('activation', ctypes.c_int)]
+
+
+class _GRULayer(ctypes.Structure):
+    ''' Структура GRULayer из rnn.h библиотеки RNNoise (веса - signed char, масштаб 1/256). '''
+
+    _fields_ = [('bias', ctypes.POINTER(ctypes.c_byte)), ('input_weights', ctypes.POINTER(ctypes.c_byte)),
+                ('recurrent_weights', ctypes.POINTER(ctypes.c_byte)), ('nb_inputs', ctypes.c_int), ('nb_neurons', ctypes.c_int),
+                ('activation', ctypes.c_int)]
+
+
+class _RNNModel(ctypes.Structure):
+    ''' Структура RNNModel из rnn_data.h библиотеки RNNoise (размеры слоёв и указатели на DenseLayer/GRULayer). '''
+
+    _fields_ = [('input_dense_size', ctypes.c_int), ('input_dense', ctypes.c_void_p),
+                ('vad_gru_size', ctypes.c_int), ('vad_gru', ctypes.c_void_p),
+                ('noise_gru_size', ctypes.c_int), ('noise_gru', ctypes.c_void_p),
+                ('denoise_gru_size', ctypes.c_int), ('denoise_gru', ctypes.c_void_p),
+                ('denoise_output_size', ctypes.c_int), ('denoise_output', ctypes.c_void_p),
+                ('vad_output_size', ctypes.c_int), ('vad_output', ctypes.c_void_p)]
+
+
+# Порядок слоёв в файле весов и их типы (см. rnnoise_model_from_file() в rnn_reader.c)
+_MODEL_FILE_LAYERS = (('input_dense', _DenseLayer), ('vad_gru', _GRULayer), ('noise_gru', _GRULayer), ('denoise_gru', _GRULayer),
+                      ('denoise_output', _DenseLayer), ('vad_output', _DenseLayer))
+
+
+def _write_model_file(f_model, rnnoise_model):
+    ''' Записать модель RNNoise в текстовом формате rnnoise-nu.
+    1. f_model - открытый на запись текстовый файл
+    2. rnnoise_model - объект _RNNModel '''
+
+    def write_weights(weights_ptr, count):
+        f_model.write(' '.join(map(str, weights_ptr[:count])) + '\n')
+
+    f_model.write(MODEL_FILE_HEADER + '\n')
+    for layer_name, layer_type in _MODEL_FILE_LAYERS:
+        layer = layer_type.from_address(getattr(rnnoise_model, layer_name))
+        f_model.write('{} {} {}\n'.format(layer.nb_inputs, layer.nb_neurons, layer.activation))
+        if layer_type is _GRULayer:
+            write_weights(layer.input_weights, layer.nb_inputs * layer.nb_neurons * 3)
+            write_weights(layer.recurrent_weights, layer.nb_neurons * layer.nb_neurons * 3)
+            write_weights(layer.bias, layer.nb_neurons * 3)
+        else:
+            write_weights(layer.input_weights, layer.nb_inputs * layer.nb_neurons)
+            write_weights(layer.bias, layer.nb_neurons)
+
+
+class _RNNState(ctypes.Structure):
+    ''' Структура RNNState из rnn_data.h библиотеки RNNoise. Является последним полем DenoiseState, содержит указатель
+    на модель и указатели на состояния GRU-слоёв, выделенные в rnnoise_init(). '''
+
+    _fields_ = [('model', ctypes.POINTER(_RNNModel)), ('vad_gru_state', ctypes.POINTER(ctypes.c_float)),
+                ('noise_gru_state', ctypes.POINTER(ctypes.c_float)), ('denoise_gru_state', ctypes.POINTER(ctypes.c_float))]
+
+
+def _as_samples(audio_data):
+    ''' Получить отсчёты из аудиоданных без копирования.
+    1. audio_data - numpy.ndarray (int16 или с плавающей точкой в диапазоне от -1 до 1) или любой объект, поддерживающий буферный
+        протокол (bytes, bytearray, memoryview, array.array, mmap и т.д.), с аудиоданными 16 бит
+    2. возвращает одномерный numpy.ndarray: int16 (представление audio_data) или исходный массив с плавающей точкой '''
+
+    if isinstance(audio_data, np.ndarray):
+        if audio_data.dtype != np.int16 and audio_data.dtype.kind != 'f':
+            raise TypeError("numpy.ndarray with audio data can only have dtype int16 or float, got {}".format(audio_data.dtype))
+        return audio_data.reshape(-1)
+
+    try:
+        audio_buffer = memoryview(audio_data)
+    except TypeError:
+        raise TypeError("audio data can only be AudioSegment, numpy.ndarray or an object supporting the buffer protocol (bytes, " + \
+                        "bytearray, memoryview), got {}".format(type(audio_data).__name__))
+    return np.frombuffer(audio_buffer, dtype=np.int16, count=audio_buffer.nbytes // 2)
+
+
+def _get_samples_scale(samples):
+    ''' Получить множитель для приведения отсчётов к шкале 16 бит: 32768 для отсчётов с плавающей точкой (от -1 до 1), иначе 1. '''
+
+    return 32768.0 if samples.dtype.kind == 'f' else 1.0
+
+
+def _copy_samples(dst, src, scale=1.0):
+    ''' Скопировать отсчёты в буфер float32, масштабируя их в том же проходе (без промежуточного массива). '''
+
+    if scale != 1.0:
+        np.multiply(src, scale, out=dst, casting='unsafe')
+    else:
+        dst[...] = src
+
+
+def _measure(metrics, stage, function, *args):
+    ''' Выполнить function(*args) и учесть время выполнения как этап stage (если metrics = None - просто выполнить).
+    1. metrics - объект Metrics или None
+    2. stage - имя этапа обработки
+    3. function - выполняемая функция
+    4. возвращает результат function '''
+
+    if metrics is None:
+        return function(*args)
+    start_time = time.perf_counter()
+    result = function(*args)
+    metrics.record_stage(stage, time.perf_counter() - start_time)
+    return result
+
+
+def _start_call(metrics):
+    ''' Начать учёт вызова публичного метода.
+    1. metrics - объект Metrics или None
+    2. возвращает время начала вызова (или None, если metrics = None) '''
+
+    return time.perf_counter() if metrics is not None else None
+
+
+def _end_call(metrics, method, start_time, audio_duration):
+    ''' Завершить учёт вызова публичного метода (см. Metrics.record_call()).
+    1. metrics - объект Metrics или None (тот же, что был передан в _start_call())
+    2. method - имя метода
+    3. start_time - значение, которое вернула _start_call()
+    4. audio_duration - длительность обработанного в вызове аудио в секундах '''
+
+    if metrics is not None:
+        metrics.record_call(method, time.perf_counter() - start_time, audio_duration)
+
+
+def _drop_frames(metrics, frames, vad_probabilities, voice_prob_threshold):
+    ''' Удалить фреймы с вероятностью наличия голоса ниже voice_prob_threshold и учесть их в метриках.
+    1. metrics - объект Metrics или None
+    2. frames - numpy.ndarray с очищенными фреймами
+    3. vad_probabilities - numpy.ndarray с вероятностью наличия голоса в каждом фрейме
+    4. voice_prob_threshold - порог вероятности наличия голоса (если 0 - использовать все фреймы)
+    5. возвращает numpy.ndarray с оставшимися фреймами '''
+
+    if voice_prob_threshold <= 0.0:
+        return frames
+    kept_frames = frames[vad_probabilities >= voice_prob_threshold]
+    if metrics is not None:
+        metrics.record_dropped(frames.shape[0] - kept_frames.shape[0])
+    return kept_frames
+
+
 class RNNoise(object):
     ''' Предоставляет методы для упрощения работы с шумодавом RNNoise:
     - read_wav(): загрузка .wav аудиозаписи и приведение её в поддерживаемый формат
     - write_wav(): сохранение .wav аудиозаписи
     - filter(): разбиение аудиозаписи на фреймы и очистка их от шума
+    - filter_multirate(): очистка аудиозаписи от шума с приведением результата сразу к нескольким частотам дискретизации
+    - filter_file(): очистка от шума .wav аудиозаписи любой длины с сохранением результата в файл (постоянный расход памяти)
+    - filter_block(): очистка блока фреймов от шума на месте в одном непрерывном буфере float32
+    - process_block(): то же самое без приведения результата к int16
     - filter_frame(): очистка только одного фрейма от шума (обращение напрямую к бинарнику RNNoise)
-    - reset(): пересоздать объект RNNoise из библиотеки для сброса состояния нейронной сети
-
-    1. f_name_lib - путь к библиотеке, если None и:
-            - тип используемой ОС linux или mac (darwin) - использовать librnnoise_5h_b_500k.so.0.4.1 из файлов пакета
-            - тип используемой ОС windows или другое - выполнить поиск в текущей папке и её подпапках файла с префиксом 'librnnoise'
-        если является путём к библиотеке/именем библиотеки - проверить существование переданного пути/имени библиотеки и если:
-            - путь/имя существует - вернуть абсолютный путь
-            - путь/имя не существует - выполнить поиск в текущей папке и её подпапках файла/пути, используя переданное значение в качестве субимени'''
+    - get_vad(): получить вероятность наличия голоса в каждом фрейме (без формирования очищенной аудиозаписи)
+    - detect_speech(): найти фрагменты с речью по вероятности наличия голоса во фреймах
+    - filter_speech(): очистить аудиозапись от шума и оставить в ней только фрагменты с речью
+    - filter_iter(): очистка от шума потокового аудио, представленного итерируемым объектом из частей аудиозаписи
+    - reset(): сбросить состояние нейронной сети (без пересоздания объекта RNNoise в библиотеке)
+    - snapshot(), restore(): сохранить состояние нейронной сети в байтовую строку и восстановить его (в том числе в другом объекте
+        или процессе)
+    - spawn(): создать новый объект RNNoise с отдельным состоянием нейронной сети, использующий уже загруженную библиотеку
+    - save_model(): сохранить используемую модель в файл весов (например, для перехода с отдельной библиотеки на model_path)
+    - enable_metrics(), disable_metrics(): включить/выключить сбор метрик работы (см. metrics.Metrics)
+    - enable_bypass(), disable_bypass(): включить/выключить адаптивный пропуск тишины и чистых участков (см. bypass.AdaptiveBypass)
+
+    1. f_name_lib - путь к библиотеке или её имя/субимя (подробнее см. find_library()). Найденный путь и загруженная библиотека
+        кэшируются на уровне модуля, поэтому все объекты RNNoise с одной и той же библиотекой используют один ctypes.CDLL, а создание
+        объекта после первого сводится к вызову rnnoise_create()
+    2. model_path - путь к файлу весов модели в формате rnnoise-nu (см. load_model()), если None - использовать модель, встроенную
+        в библиотеку. Позволяет использовать разные модели с одной библиотекой: файл загружается один раз, и все объекты RNNoise с этим
+        файлом (в том числе созданные через spawn()) используют одну общую модель, которая освобождается при удалении последнего
+        из них'''
 
     sample_width = 2
     channels = 1
     sample_rate = 48000
     frame_duration_ms = 10
+    frame_size = 480
+    metrics = None
+    bypass = None
 
-    def __init__(self, f_name_lib=None):
-        f_name_lib = self.__get_f_name_lib(f_name_lib)
-        self.rnnoise_lib = ctypes.cdll.LoadLibrary(f_name_lib)
+    def __init__(self, f_name_lib=None, model_path=None):
+        self.f_name_lib = find_library(f_name_lib)
+        self.rnnoise_lib = load_library(self.f_name_lib)
 
-        self.rnnoise_lib.rnnoise_process_frame.argtypes = [ctypes.c_void_p, ctypes.POINTER(ctypes.c_float), ctypes.POINTER(ctypes.c_float)]
-        self.rnnoise_lib.rnnoise_process_frame.restype = ctypes.c_float
-        self.rnnoise_lib.rnnoise_create.restype = ctypes.c_void_p
-        self.rnnoise_lib.rnnoise_destroy.argtypes = [ctypes.c_void_p]
+        self.model_path = os.path.abspath(model_path) if model_path else None
+        self.rnnoise_model = load_model(self.model_path, self.rnnoise_lib) if self.model_path else None
 
-        self.rnnoise_obj = self.rnnoise_lib.rnnoise_create(None)
+        self.rnnoise_obj = self.rnnoise_lib.rnnoise_create(self.rnnoise_model)
+        self.rnnoise_obj_size = self.rnnoise_lib.rnnoise_obj_size
 
+        self.batch_lib = _load_batch_lib()
+        self.process_frame_ptr = self.rnnoise_lib.process_frame_ptr
 
-    def __get_f_name_lib(self, f_name_lib=None):
-        ''' Найти и/или проверить путь к скомпилированной библиотеке RNNoise.
 
-        1. f_name_lib - путь к библиотеке, если None и:
-                - тип используемой ОС linux или mac (darwin) - использовать librnnoise_5h_b_500k.so.0.4.1 из файлов пакета
-                - тип используемой ОС windows или другое - выполнить поиск в текущей папке и её подпапках файла с префиксом 'librnnoise'
-            если является путём к библиотеке/именем библиотеки - проверить существование переданного пути/имени библиотеки и если:
-                - путь/имя существует - вернуть абсолютный путь
-                - путь/имя не существует - выполнить поиск в текущей папке и её подпапках файла/пути, используя переданное значение в качестве субимени
-        2. возвращает f_name_lib с проверенным абсолютным путём к найденной библиотеке '''
+    def __del__(self):
+        rnnoise_obj = getattr(self, 'rnnoise_obj', None)
+        if rnnoise_obj:
+            self.rnnoise_lib.rnnoise_destroy(rnnoise_obj)
+            self.rnnoise_obj = None
+        # Ссылка на модель из файла весов освобождается после состояния нейронной сети, которое её использует
+        rnnoise_model = getattr(self, 'rnnoise_model', None)
+        if rnnoise_model:
+            self.rnnoise_model = None
+            release_model(rnnoise_model)
 
-        package_name = __file__
-        package_name = package_name[package_name.rfind('/')+1:package_name.rfind('.py')]
 
-        if not f_name_lib:
-            subname = 'librnnoise'
-            system = platform.system()
-            if system == 'Linux' or system == 'Darwin':
-                found_f_name_lib = pkg_resources.resource_filename(package_name, 'libs/{}_5h_b_500k.so.0.4.1'.format(subname))
-                if not os.path.exists(found_f_name_lib):
-                    found_f_name_lib = self.__find_lib(subname)
-            else:
-                found_f_name_lib = self.__find_lib(subname)
-            
-            if not found_f_name_lib:
-                raise NameError("could not find RNNoise library with subname '{}'".format(subname))
+    def spawn(self):
+        ''' Создать новый объект RNNoise с отдельным состоянием нейронной сети, использующий уже загруженную библиотеку этого объекта
+        (без повторного поиска и загрузки библиотеки). Удобно, когда нужно несколько независимых потоков шумоподавления.
+        1. возвращает новый объект RNNoise '''
 
-        else:
-            f_names_available_libs = pkg_resources.resource_listdir(package_name, 'libs/')
-            for available_lib in f_names_available_libs:
-                if available_lib.find(f_name_lib) != -1:
-                    f_name_lib = pkg_resources.resource_filename(package_name, 'libs/{}'.format(available_lib))
+        denoiser = object.__new__(type(self))
+        denoiser.__dict__.update(self.__dict__)
+        if self.rnnoise_model:
+            _retain_model(self.rnnoise_model)
+        denoiser.rnnoise_obj = self.rnnoise_lib.rnnoise_create(self.rnnoise_model)
+        if self.bypass is not None:
+            denoiser.bypass = self.bypass.copy()
+        return denoiser
 
-            found_f_name_lib = self.__find_lib(f_name_lib)
-            if not found_f_name_lib:
-                raise NameError("could not find RNNoise library with name/subname '{}'".format(f_name_lib))
 
-        return found_f_name_lib
+    def save_model(self, f_name_model):
+        ''' Сохранить используемую модель (встроенную в библиотеку или загруженную из файла) в файл весов в формате rnnoise-nu.
+        Полученный файл можно передать в model_path, например, чтобы использовать модели из librnnoise_5h_ru_500k и
+        librnnoise_5h_b_500k с одной библиотекой.
+        1. f_name_model - путь к файлу весов '''
+
+        rnn_state = self.__get_rnn_state()
+        with open(f_name_model, 'w') as f_model:
+            _write_model_file(f_model, rnn_state.model.contents)
+
+
+    def enable_metrics(self, metrics=None):
+        ''' Включить сбор метрик работы: количество обработанных и удалённых по voice_prob_threshold фреймов, время обработки фреймов
+        RNNoise, ресемплинга и разбиения на фреймы, распределение вероятности наличия голоса, гистограмма длительности вызовов
+        и пропуски реального времени (подробнее см. metrics.Metrics). Пока сбор метрик выключен, его стоимость - одна проверка
+        атрибута на вызов.
+
+        Объекты, созданные через spawn() после включения, используют те же метрики. Один объект Metrics можно передать
+        нескольким объектам RNNoise для сбора общих метрик (так делает DenoiserPool.enable_metrics()).
+
+        1. metrics - объект Metrics (если None - будет создан новый)
+        2. возвращает объект Metrics '''
+
+        self.metrics = metrics or Metrics()
+        return self.metrics
+
+
+    def disable_metrics(self):
+        ''' Выключить сбор метрик работы. '''
 
+        self.metrics = None
 
-    def __find_lib(self, f_name_lib, root_folder='.'):
-        ''' Выполнить рекурсивный поиск файла f_name_lib в папке root_folder и всех её подпапках.
-        1. f_name_lib - имя искомого файла или его субимя (часть имени, позволяющая однозначно идентифицировать файл)
-        2. root_folder - корневая папка, из которой начинать поиск
-        3. возвращает найденный существующий путь или None '''
 
-        f_name_lib_full = os.path.abspath(f_name_lib)
-        if os.path.isfile(f_name_lib_full) and os.path.exists(f_name_lib_full):
-            return f_name_lib_full
+    def enable_bypass(self, silence=True, min_snr_db=None, context_frames=4):
+        ''' Включить адаптивный пропуск фреймов, которые не нужно очищать от шума: цифровой тишины и (если задан min_snr_db)
+        участков с высоким оценочным отношением сигнал/шум. Пропущенные фреймы не обрабатываются нейронной сетью, что ускоряет
+        обработку записей с длинными паузами и чистых записей. Состояние нейронной сети при этом остаётся согласованным с сигналом:
+        начало каждого пропускаемого участка и контекст перед возобновлением обработки проходят через RNNoise (подробнее см.
+        bypass.AdaptiveBypass). Доля пропущенных фреймов - bypass.bypassed_fraction (при включённом сборе метрик также учитывается
+        в Metrics.frames_bypassed).
 
-        for path, folder_names, f_names in os.walk(root_folder):
-            for f_name in f_names:
-                if f_name.rfind(f_name_lib) != -1:
-                    return os.path.join(path, f_name)
+        Объекты, созданные через spawn() после включения, получают собственный AdaptiveBypass с теми же параметрами.
+
+        1. silence - True: пропускать цифровую тишину (результат - тишина, вероятность наличия голоса - 0)
+        2. min_snr_db - минимальное оценочное отношение сигнал/шум в дБ для пропуска чистых фреймов (результат - исходные отсчёты),
+            например 40 (если None - чистые фреймы не пропускаются)
+        3. context_frames - количество фреймов контекста, обрабатываемых RNNoise на границах пропускаемых участков
+        4. возвращает объект AdaptiveBypass '''
+
+        self.bypass = AdaptiveBypass(self.frame_size, silence, min_snr_db, context_frames)
+        return self.bypass
+
+
+    def disable_bypass(self):
+        ''' Выключить адаптивный пропуск фреймов. '''
+
+        self.bypass = None
 
 
     def reset(self):
-        ''' Сбросить состояние нейронной сети путём создания нового объекта RNNoise в скомпилированной исходной библиотеке.
-        Может быть полезно, когда шумоподавление используется на большом количестве аудиозаписей для предотвращения ухудшения
-        качества работы.
-        
-        Эффективность и надобность в данном методе не доказана. Реализовано просто на всякий случай :) '''
+        ''' Сбросить состояние нейронной сети. Может быть полезно, когда шумоподавление используется на большом количестве аудиозаписей
+        для предотвращения ухудшения качества работы.
+
+        Результат такой же, как у rnnoise_init(): состояние обнуляется, а модель сохраняется. Но память под состояние не перевыделяется
+        (rnnoise_init() при повторном вызове для того же объекта выделил бы новые буферы GRU-слоёв без освобождения старых), поэтому
+        сброс дешёвый и его можно выполнять после каждой аудиозаписи. '''
+
+        rnn_state = self.__get_rnn_state()
+        saved_rnn_state = _RNNState.from_buffer_copy(rnn_state)
+
+        ctypes.memset(self.rnnoise_obj, 0, self.rnnoise_obj_size)
+        ctypes.memmove(ctypes.addressof(rnn_state), ctypes.addressof(saved_rnn_state), ctypes.sizeof(_RNNState))
+
+        model = saved_rnn_state.model.contents
+        float_size = ctypes.sizeof(ctypes.c_float)
+        ctypes.memset(saved_rnn_state.vad_gru_state, 0, model.vad_gru_size * float_size)
+        ctypes.memset(saved_rnn_state.noise_gru_state, 0, model.noise_gru_size * float_size)
+        ctypes.memset(saved_rnn_state.denoise_gru_state, 0, model.denoise_gru_size * float_size)
+
+        if self.bypass is not None:
+            self.bypass.reset()
+
 
-        self.rnnoise_lib.rnnoise_destroy(self.rnnoise_obj)
-        self.rnnoise_obj = self.rnnoise_lib.rnnoise_create(None)
+    def snapshot(self):
+        ''' Сохранить состояние нейронной сети (DenoiseState вместе с состояниями GRU-слоёв) в байтовую строку. Снимок не содержит
+        указателей, поэтому его можно восстановить в любом объекте RNNoise с той же моделью, в том числе в другом процессе (например,
+        для переноса потока между процессами-обработчиками).
+
+        Позволяет избежать ухудшения качества в начале аудиозаписи, пока нейронная сеть не адаптировалась к шуму (около 1 секунды):
+        достаточно один раз обработать типичный для источника шум, сохранить снимок и восстанавливать его перед обработкой каждой
+        короткой аудиозаписи вместо reset().
+
+        1. возвращает байтовую строку со снимком состояния '''
+
+        rnn_state = self.__get_rnn_state()
+        model = rnn_state.model.contents
+        state_size = self.rnnoise_obj_size - ctypes.sizeof(_RNNState)
+        float_size = ctypes.sizeof(ctypes.c_float)
+
+        return b''.join((_SNAPSHOT_HEADER.pack(_SNAPSHOT_MAGIC, _SNAPSHOT_VERSION, state_size, model.vad_gru_size,
+                                               model.noise_gru_size, model.denoise_gru_size),
+                         ctypes.string_at(self.rnnoise_obj, state_size),
+                         ctypes.string_at(rnn_state.vad_gru_state, model.vad_gru_size * float_size),
+                         ctypes.string_at(rnn_state.noise_gru_state, model.noise_gru_size * float_size),
+                         ctypes.string_at(rnn_state.denoise_gru_state, model.denoise_gru_size * float_size)))
+
+
+    def restore(self, snapshot):
+        ''' Восстановить состояние нейронной сети из снимка, полученного через snapshot(). Модель объекта не меняется, поэтому снимок
+        должен быть получен с той же моделью (проверяется только совпадение размеров слоёв). Состояние адаптивного пропуска фреймов
+        (если включён) сбрасывается.
+        1. snapshot - байтовая строка (или любой объект, поддерживающий буферный протокол) со снимком состояния '''
+
+        snapshot = memoryview(snapshot).cast('B')
+        if len(snapshot) < _SNAPSHOT_HEADER.size:
+            raise ValueError('snapshot is too short')
+        magic, version, state_size, vad_gru_size, noise_gru_size, denoise_gru_size = _SNAPSHOT_HEADER.unpack_from(snapshot)
+        if magic != _SNAPSHOT_MAGIC or version != _SNAPSHOT_VERSION:
+            raise ValueError('unsupported snapshot format')
+
+        rnn_state = self.__get_rnn_state()
+        model = rnn_state.model.contents
+        if state_size != self.rnnoise_obj_size - ctypes.sizeof(_RNNState) or \
+           (vad_gru_size, noise_gru_size, denoise_gru_size) != (model.vad_gru_size, model.noise_gru_size, model.denoise_gru_size):
+            raise ValueError('snapshot was made with another RNNoise library or model')
+
+        float_size = ctypes.sizeof(ctypes.c_float)
+        expected_size = _SNAPSHOT_HEADER.size + state_size + (vad_gru_size + noise_gru_size + denoise_gru_size) * float_size
+        if len(snapshot) != expected_size:
+            raise ValueError('snapshot size is {}, expected {}'.format(len(snapshot), expected_size))
+
+        offset = _SNAPSHOT_HEADER.size
+        for address, size in ((self.rnnoise_obj, state_size), (rnn_state.vad_gru_state, vad_gru_size * float_size),
+                              (rnn_state.noise_gru_state, noise_gru_size * float_size),
+                              (rnn_state.denoise_gru_state, denoise_gru_size * float_size)):
+            ctypes.memmove(address, bytes(snapshot[offset:offset+size]), size)
+            offset += size
+
+        if self.bypass is not None:
+            self.bypass.reset()
+
+
+    def __get_rnn_state(self):
+        ''' Получить структуру RNNState, являющуюся последним полем DenoiseState этого объекта (без копирования). '''
+
+        return _RNNState.from_address(self.rnnoise_obj + self.rnnoise_obj_size - ctypes.sizeof(_RNNState))
 
 
     def filter_frame(self, frame):
@@ -137,17 +680,106 @@ class RNNoise(object):
         # (т.е. длина фрейма 10 мс (0.01 сек) при частоте дискретизации 48000 Гц, 48000*0.01*2=960).
         # Если len(frame) != 960, будет ошибка сегментирования либо сильные искажения на итоговой аудиозаписи.
 
-        # Если вынести np.ndarray((480,), 'h', frame).astype(ctypes.c_float) в __get_frames(), то прирост в скорости работы составит
-        # не более 5-7% на аудиозаписях, длиной от 60 секунд. На более коротких аудиозаписях прирост скорости менее заметен и несущественен.
+        metrics = self.metrics
+        start_time = _start_call(metrics)
+        frame_buf = np.ndarray((1, self.frame_size), 'h', frame).astype(np.float32)
+        vad_probabilities, denoised_frame = self.filter_block(frame_buf)
+        _end_call(metrics, 'filter_frame', start_time, self.frame_duration_ms / 1000)
+        return float(vad_probabilities[0]), denoised_frame.tobytes()
+
+
+    def filter_block(self, frames, out=None):
+        ''' Очистка блока фреймов от шума с помощью RNNoise. Все фреймы обрабатываются на месте в одном непрерывном буфере,
+        без создания промежуточных объектов на каждый фрейм.
+
+        Если собрана вспомогательная библиотека rnnoise_batch.so (см. compile_rnnoise.sh), весь блок обрабатывается за один вызов
+        с отпусканием GIL, что позволяет обрабатывать несколько независимых потоков параллельно в разных потоках выполнения.
+
+        1. frames - numpy.ndarray float32 формы (N, 480) с фреймами длиной 10 мс 48 кГц в шкале 16 бит (значения от -32768 до 32767),
+            должен быть C-непрерывным и доступным для записи (после вызова содержит очищенные фреймы в float32)
+        2. out - numpy.ndarray int16 формы (N, 480) для записи результата (если None - будет создан новый)
+        3. возвращает tuple из numpy.ndarray float32 с вероятностью наличия голоса в каждом фрейме и out с очищенными фреймами
+        
+        При приведении к int16 значения, выходящие за пределы диапазона 16 бит, ограничиваются (а не переполняются). '''
+
+        self.__check_frames(frames)
+        if out is None:
+            out = np.empty(frames.shape, dtype=np.int16)
+        elif not isinstance(out, np.ndarray) or out.dtype != np.int16 or out.shape != frames.shape:
+            raise ValueError("'out' must be numpy.ndarray with dtype int16 and shape {}".format(frames.shape))
+
+        vad_probabilities = self.__process_frames(frames)
+        return vad_probabilities, self.to_int16(frames, out)
+
+
+    def process_block(self, frames):
+        ''' Очистка блока фреймов от шума на месте без приведения результата к int16 (см. filter_block()). Удобно, когда очищенные
+        отсчёты дальше нужны в float32 (например, для ресемплинга или признаков для ASR).
+        1. frames - numpy.ndarray float32 формы (N, 480) с фреймами длиной 10 мс 48 кГц в шкале 16 бит, должен быть C-непрерывным
+            и доступным для записи (после вызова содержит очищенные фреймы)
+        2. возвращает numpy.ndarray float32 с вероятностью наличия голоса в каждом фрейме '''
+
+        self.__check_frames(frames)
+        return self.__process_frames(frames)
+
 
-        frame_buf = np.ndarray((480,), 'h', frame).astype(ctypes.c_float)
-        frame_buf_ptr = frame_buf.ctypes.data_as(ctypes.POINTER(ctypes.c_float))
+    def __check_frames(self, frames):
+        ''' Проверить, что блок фреймов можно передать в RNNoise для обработки на месте. '''
 
-        vad_probability = self.rnnoise_lib.rnnoise_process_frame(self.rnnoise_obj, frame_buf_ptr, frame_buf_ptr)
-        return vad_probability, frame_buf.astype(ctypes.c_short).tobytes()
+        if not isinstance(frames, np.ndarray) or frames.dtype != np.float32:
+            raise TypeError("'frames' can only be numpy.ndarray with dtype float32")
+        if frames.ndim != 2 or frames.shape[1] != self.frame_size:
+            raise ValueError("'frames' must have shape (N, {}), got {}".format(self.frame_size, frames.shape))
+        if not frames.flags.c_contiguous or not frames.flags.writeable:
+            raise ValueError("'frames' must be C-contiguous and writeable")
 
 
-    def filter(self, audio, sample_rate=None, voice_prob_threshold=0.0, save_source_sample_rate=True):
+    def __process_frames(self, frames):
+        ''' Очистка фреймов от шума на месте (без приведения результата к int16).
+        1. frames - проверенный numpy.ndarray float32 формы (N, 480)
+        2. возвращает numpy.ndarray float32 с вероятностью наличия голоса в каждом фрейме '''
+
+        metrics = self.metrics
+        if metrics is not None:
+            start_time = time.perf_counter()
+
+        bypass = self.bypass
+        if bypass is None:
+            vad_probabilities = self.__run_frames(frames)
+        else:
+            frames_bypassed = bypass.frames_bypassed
+            vad_probabilities = bypass.process(frames, self.__run_frames)
+
+        if metrics is not None:
+            metrics.record_frames(vad_probabilities, time.perf_counter() - start_time)
+            if bypass is not None:
+                metrics.record_bypassed(bypass.frames_bypassed - frames_bypassed)
+        return vad_probabilities
+
+
+    def __run_frames(self, frames):
+        ''' Обработка фреймов RNNoise на месте (все фреймы блока, без адаптивного пропуска).
+        1. frames - C-непрерывный numpy.ndarray float32 формы (N, 480)
+        2. возвращает numpy.ndarray float32 с вероятностью наличия голоса в каждом фрейме '''
+
+        vad_probabilities = np.empty(frames.shape[0], dtype=np.float32)
+
+        # Весь блок обрабатывается за один вызов вспомогательной библиотеки (на время вызова GIL отпускается)
+        if self.batch_lib is not None and frames.shape[0] > 0:
+            self.batch_lib.rnnoise_process_frames(self.process_frame_ptr, self.rnnoise_obj, frames.ctypes.data, frames.shape[0],
+                                                  vad_probabilities.ctypes.data)
+        else:
+            process_frame = self.rnnoise_lib.rnnoise_process_frame
+            rnnoise_obj = self.rnnoise_obj
+            frame_ptr = frames.ctypes.data
+            frame_stride = frames.strides[0]
+            for i in range(frames.shape[0]):
+                vad_probabilities[i] = process_frame(rnnoise_obj, frame_ptr, frame_ptr)
+                frame_ptr += frame_stride
+        return vad_probabilities
+
+
+    def filter(self, audio, sample_rate=None, voice_prob_threshold=0.0, save_source_sample_rate=True, float_output=False):
         ''' Получить фреймы из аудиозаписи и очистить их от шума. Для шумоподавления используется RNNoise.
         
         RNNoise дополнительно для каждого фрейма возвращает вероятность наличия голоса в этом фрейме (в виде числа от 0 до 1) и
@@ -164,22 +796,47 @@ class RNNoise(object):
         и кратна 10 (т.к. библиотека RNNoise поддерживает только фреймы длиной 10 мс). Такой вариант работы на качество шумоподавления
         практически не влияет.
 
-        1. audio - объект pydub.AudioSegment с аудиозаписью или байтовая строка с аудиоданными (без заголовков wav)
-        2. sample_rate - частота дискретизации (обязательно только когда audio - байтовая строка)
+        1. audio - объект pydub.AudioSegment с аудиозаписью, байтовая строка с аудиоданными (без заголовков wav) или любой другой объект,
+            поддерживающий буферный протокол (bytearray, memoryview и т.д., используется без копирования), или numpy.ndarray int16
+            или float (значения от -1 до 1)
+        2. sample_rate - частота дискретизации (обязательно, когда audio - не pydub.AudioSegment)
         3. voice_prob_threshold - порог вероятности наличия голоса в каждом фрейме (значение от 0 до 1, если 0 - использовать все фреймы)
         4. save_source_sample_rate - True: приводить частоту дискретизации возвращаемой аудиозаписи к исходной
-        5. возвращает pydub.AudioSegment или байтовую строку (без заголовков wav), очищенную от шума (тип возвращаемого объекта соответствует типу audio) '''
+        5. float_output - True: вернуть numpy.ndarray float32 (значения от -1 до 1) без приведения к int16
+        6. возвращает аудиозапись, очищенную от шума: pydub.AudioSegment для pydub.AudioSegment, numpy.ndarray того же вида для
+            numpy.ndarray (int16 или float32), байтовую строку (без заголовков wav) для остальных типов audio '''
 
+        metrics = self.metrics
+        start_time = _start_call(metrics)
         frames, source_sample_rate = self.__get_frames(audio, sample_rate)
-        if not save_source_sample_rate:
-            source_sample_rate = None
+        target_sample_rate = source_sample_rate if save_source_sample_rate else self.sample_rate
+
+        denoised_samples = self.__filter_frames(frames, voice_prob_threshold, target_sample_rate)
+        denoised_audio = self.__get_output(audio, denoised_samples, target_sample_rate, float_output)
+        _end_call(metrics, 'filter', start_time, frames.shape[0] * self.frame_duration_ms / 1000)
+        return denoised_audio
 
-        denoised_audio = self.__filter_frames(frames, voice_prob_threshold, source_sample_rate)
 
-        if isinstance(audio, AudioSegment):
-            return denoised_audio
-        else:
-            return denoised_audio.raw_data
+    def filter_iter(self, chunks, sample_rate=None, voice_prob_threshold=0.0, save_source_sample_rate=True, float_output=False):
+        ''' Очистка от шума потокового аудио. Является генератором над RNNoiseStream: части аудиозаписи могут быть любой длины,
+        неполные фреймы накапливаются между частями и не дополняются тишиной (кроме последнего фрейма потока).
+        1. chunks - итерируемый объект с частями аудиозаписи (см. RNNoiseStream.push())
+        2. sample_rate - частота дискретизации частей аудиозаписи (если None - 48 кГц)
+        3. voice_prob_threshold - порог вероятности наличия голоса в каждом фрейме (значение от 0 до 1, если 0 - использовать все фреймы)
+        4. save_source_sample_rate - True: приводить частоту дискретизации возвращаемых частей к исходной
+        5. float_output - True: возвращать части в виде numpy.ndarray float32 (значения от -1 до 1)
+        6. возвращает генератор байтовых строк (или numpy.ndarray float32) с очищенными от шума частями аудиозаписи (пустые части
+            не возвращаются) '''
+
+        stream = RNNoiseStream(self, sample_rate, voice_prob_threshold, save_source_sample_rate, float_output)
+        for chunk in chunks:
+            denoised_chunk = stream.push(chunk)
+            if len(denoised_chunk) > 0:
+                yield denoised_chunk
+
+        denoised_chunk = stream.flush()
+        if len(denoised_chunk) > 0:
+            yield denoised_chunk
 
 
     def __filter_frames(self, frames, voice_prob_threshold=0.0, sample_rate=None):
@@ -196,82 +853,263 @@ class RNNoise(object):
         (т.к. RNNoise поддерживает только фреймы длиной 10 мс). Такой вариант работы на качество шумоподавления не влияет и может использоваться
         для шумоподавления аудио в потоке.
 
-        1. frames - список фреймов длиной по 10 миллисекунд
+        1. frames - numpy.ndarray float32 формы (N, 480) с фреймами длиной по 10 миллисекунд (очищается на месте)
         2. voice_prob_threshold - порог вероятности наличия голоса в каждом фрейме (значение от 0 до 1, если 0 - использовать все фреймы)
-        3. sample_rate - желаемая частота дискретизации очищенной аудиозаписи (если None - не менять частоту дискретизации)
-        4. возвращает объект pydub.AudioSegment с аудиозаписью, очищенной от шума '''
+        3. sample_rate - желаемая частота дискретизации очищенной аудиозаписи
+        4. возвращает одномерный numpy.ndarray float32 с очищенными отсчётами в шкале 16 бит '''
 
-        denoised_frames_with_probability = [self.filter_frame(frame) for frame in frames]
-        denoised_frames = [frame_with_prob[1] for frame_with_prob in denoised_frames_with_probability if frame_with_prob[0] >= voice_prob_threshold]
-        denoised_audio_bytes = b''.join(denoised_frames)
+        vad_probabilities = self.__process_frames(frames)
+        frames = _drop_frames(self.metrics, frames, vad_probabilities, voice_prob_threshold)
 
-        denoised_audio = AudioSegment(data=denoised_audio_bytes, sample_width=self.sample_width, frame_rate=self.sample_rate, channels=self.channels)
+        # Ресемплинг выполняется из float32 буфера, в котором после обработки остались очищенные фреймы
+        if sample_rate != self.sample_rate:
+            return _measure(self.metrics, 'resample', resample, frames, self.sample_rate, sample_rate)
+        return frames.reshape(-1)
 
-        if sample_rate:
-            denoised_audio = denoised_audio.set_frame_rate(sample_rate)
-        return denoised_audio
+
+    def __get_output(self, audio, denoised_samples, sample_rate, float_output=False):
+        ''' Привести очищенные отсчёты к типу результата, соответствующему типу исходных аудиоданных.
+        1. audio - исходные аудиоданные
+        2. denoised_samples - numpy.ndarray float32 с очищенными отсчётами в шкале 16 бит
+        3. sample_rate - частота дискретизации очищенных отсчётов
+        4. float_output - True: вернуть numpy.ndarray float32 (значения от -1 до 1) независимо от типа audio
+        5. возвращает pydub.AudioSegment, numpy.ndarray (int16 или float32) или байтовую строку (см. filter()) '''
+
+        if float_output or (isinstance(audio, np.ndarray) and audio.dtype.kind == 'f'):
+            return np.multiply(denoised_samples, np.float32(1.0 / 32768), dtype=np.float32)
+
+        denoised_samples = self.to_int16(denoised_samples)
+        if isinstance(audio, AudioSegment):
+            return AudioSegment(data=denoised_samples.tobytes(), sample_width=self.sample_width, frame_rate=sample_rate,
+                                channels=self.channels)
+        elif isinstance(audio, np.ndarray):
+            return denoised_samples
+        return denoised_samples.tobytes()
+
+
+    def filter_multirate(self, audio, target_sample_rates, sample_rate=None, voice_prob_threshold=0.0, float_output=False):
+        ''' Получить фреймы из аудиозаписи, очистить их от шума и привести результат сразу к нескольким частотам дискретизации
+        (например, 16 кГц для ASR и 48 кГц для архива). Шумоподавление выполняется один раз.
+        1. audio - аудиозапись (см. filter())
+        2. target_sample_rates - список желаемых частот дискретизации
+        3. sample_rate - частота дискретизации (обязательно, когда audio - не pydub.AudioSegment)
+        4. voice_prob_threshold - порог вероятности наличия голоса в каждом фрейме (значение от 0 до 1, если 0 - использовать все фреймы)
+        5. float_output - True: возвращать numpy.ndarray float32 (значения от -1 до 1)
+        6. возвращает dict, в котором ключ - частота дискретизации, значение - очищенная от шума аудиозапись (тип как у filter()) '''
+
+        metrics = self.metrics
+        start_time = _start_call(metrics)
+        frames, source_sample_rate = self.__get_frames(audio, sample_rate)
+        audio_duration = frames.shape[0] * self.frame_duration_ms / 1000
+        vad_probabilities = self.__process_frames(frames)
+        frames = _drop_frames(metrics, frames, vad_probabilities, voice_prob_threshold)
+
+        denoised_audios = {}
+        for target_sample_rate in target_sample_rates:
+            if target_sample_rate == self.sample_rate:
+                denoised_samples = frames.reshape(-1)
+            else:
+                denoised_samples = _measure(metrics, 'resample', resample, frames, self.sample_rate, target_sample_rate)
+            denoised_audios[target_sample_rate] = self.__get_output(audio, denoised_samples, target_sample_rate, float_output)
+        _end_call(metrics, 'filter_multirate', start_time, audio_duration)
+        return denoised_audios
+
+
+    def get_vad(self, audio, sample_rate=None):
+        ''' Получить вероятность наличия голоса в каждом фрейме аудиозаписи. Быстрый вариант filter(): очищенные фреймы не приводятся
+        к int16 и исходной частоте дискретизации.
+        1. audio - аудиозапись (см. filter())
+        2. sample_rate - частота дискретизации (обязательно, когда audio - не pydub.AudioSegment)
+        3. возвращает numpy.ndarray float32 с вероятностью наличия голоса в каждом фрейме длиной 10 мс '''
+
+        metrics = self.metrics
+        start_time = _start_call(metrics)
+        frames, source_sample_rate = self.__get_frames(audio, sample_rate)
+        vad_probabilities = self.__process_frames(frames)
+        _end_call(metrics, 'get_vad', start_time, frames.shape[0] * self.frame_duration_ms / 1000)
+        return vad_probabilities
+
+
+    def detect_speech(self, audio, sample_rate=None, threshold=0.5, threshold_off=None, min_speech_ms=100, hangover_ms=200, padding_ms=50):
+        ''' Найти фрагменты с речью в аудиозаписи по вероятности наличия голоса во фреймах (подробнее о параметрах см. vad.get_speech_segments()).
+        1. audio - аудиозапись (см. filter())
+        2. sample_rate - частота дискретизации (обязательно, когда audio - не pydub.AudioSegment)
+        3. threshold - порог вероятности наличия голоса для начала фрагмента
+        4. threshold_off - порог вероятности наличия голоса для продолжения фрагмента (если None - threshold - 0.15)
+        5. min_speech_ms - минимальная длина фрагмента в миллисекундах
+        6. hangover_ms - длительность паузы в миллисекундах, после которой фрагмент завершается
+        7. padding_ms - длительность в миллисекундах, на которую фрагмент расширяется с каждой стороны
+        8. возвращает tuple из numpy.ndarray float32 с вероятностью наличия голоса в каждом фрейме и списка фрагментов с речью
+            в виде tuple из времени начала и конца в секундах '''
+
+        metrics = self.metrics
+        start_time = _start_call(metrics)
+        frames, source_sample_rate = self.__get_frames(audio, sample_rate)
+        vad_probabilities = self.__process_frames(frames)
+        frame_segments = self.__get_speech_segments(vad_probabilities, threshold, threshold_off, min_speech_ms, hangover_ms, padding_ms)
+
+        audio_duration = self.__get_duration(audio, source_sample_rate)
+        segments = [(start * self.frame_duration_ms / 1000, min(end * self.frame_duration_ms / 1000, audio_duration))
+                    for start, end in frame_segments.tolist()]
+        _end_call(metrics, 'detect_speech', start_time, audio_duration)
+        return vad_probabilities, segments
+
+
+    def filter_speech(self, audio, sample_rate=None, save_source_sample_rate=True, threshold=0.5, threshold_off=None, min_speech_ms=100,
+                      hangover_ms=200, padding_ms=50, float_output=False):
+        ''' Очистить аудиозапись от шума и оставить в ней только фрагменты с речью (за один проход). В отличие от voice_prob_threshold
+        в filter(), фреймы отбираются не по отдельности, а фрагментами с гистерезисом, поэтому речь не обрывается на паузах.
+        1. audio - аудиозапись (см. filter())
+        2. sample_rate - частота дискретизации (обязательно, когда audio - не pydub.AudioSegment)
+        3. save_source_sample_rate - True: приводить частоту дискретизации возвращаемой аудиозаписи к исходной
+        4. threshold, threshold_off, min_speech_ms, hangover_ms, padding_ms - параметры выделения фрагментов с речью (см. detect_speech())
+        5. float_output - True: вернуть аудиозапись в виде numpy.ndarray float32 (значения от -1 до 1)
+        6. возвращает tuple из аудиозаписи только с речью (тип как у filter()) и объекта vad.TimeMap, который
+            позволяет получить для каждого отсчёта итоговой аудиозаписи время в исходной аудиозаписи '''
+
+        metrics = self.metrics
+        start_time = _start_call(metrics)
+        frames, source_sample_rate = self.__get_frames(audio, sample_rate)
+        vad_probabilities = self.__process_frames(frames)
+        frame_segments = self.__get_speech_segments(vad_probabilities, threshold, threshold_off, min_speech_ms, hangover_ms, padding_ms)
+
+        target_sample_rate = source_sample_rate if save_source_sample_rate else self.sample_rate
+        speech_frames = frames[np.concatenate([np.arange(start, end) for start, end in frame_segments.tolist()] or [np.zeros(0, np.int64)])]
+
+        if target_sample_rate != self.sample_rate:
+            denoised_samples = _measure(metrics, 'resample', resample, speech_frames, self.sample_rate, target_sample_rate)
+        else:
+            denoised_samples = speech_frames.reshape(-1)
+
+        # Начала фрагментов в итоговой аудиозаписи пересчитываются в отсчёты target_sample_rate с округлением вниз,
+        # длина последнего фрагмента ограничивается длиной итоговой аудиозаписи
+        frame_lengths = frame_segments[:, 1] - frame_segments[:, 0]
+        output_starts = ((np.cumsum(frame_lengths) - frame_lengths) * self.frame_size * target_sample_rate) // self.sample_rate
+        lengths = np.diff(np.concatenate((output_starts, [denoised_samples.shape[0]])))
+        input_starts = frame_segments[:, 0] * self.frame_duration_ms / 1000
+        time_map = TimeMap(output_starts, input_starts, lengths, target_sample_rate)
+
+        denoised_audio = self.__get_output(audio, denoised_samples, target_sample_rate, float_output)
+        _end_call(metrics, 'filter_speech', start_time, frames.shape[0] * self.frame_duration_ms / 1000)
+        return denoised_audio, time_map
+
+
+    def __get_speech_segments(self, vad_probabilities, threshold, threshold_off, min_speech_ms, hangover_ms, padding_ms):
+        ''' Найти фрагменты с речью (в номерах фреймов), переведя параметры из миллисекунд во фреймы. '''
+
+        return get_speech_segments(vad_probabilities, threshold, threshold_off, min_speech_ms // self.frame_duration_ms,
+                                   hangover_ms // self.frame_duration_ms, padding_ms // self.frame_duration_ms)
+
+
+    def __get_duration(self, audio, sample_rate):
+        ''' Получить длительность аудиозаписи в секундах.
+        1. audio - аудиозапись (см. filter())
+        2. sample_rate - частота дискретизации аудиозаписи
+        3. возвращает длительность в секундах '''
+
+        if isinstance(audio, AudioSegment):
+            return audio.frame_count() / audio.frame_rate
+        return _as_samples(audio).shape[0] / sample_rate
+
+
+    @staticmethod
+    def to_int16(samples, out=None):
+        ''' Привести отсчёты к int16 с ограничением значений, выходящих за пределы диапазона 16 бит (за один проход).
+        1. samples - numpy.ndarray с отсчётами в шкале 16 бит
+        2. out - numpy.ndarray int16 для записи результата (если None - будет создан новый)
+        3. возвращает out с отсчётами int16 '''
+
+        if out is None:
+            out = np.empty(samples.shape, dtype=np.int16)
+        return np.clip(samples, -32768, 32767, out=out, casting='unsafe')
 
 
     def __get_frames(self, audio, sample_rate=None):
-        ''' Получить фреймы из аудиозаписи. Фреймы представляют собой байтовые строки с аудиоданными фиксированной длины.
-        RNNoise поддерживает только фреймы длиной 10 миллисекунд.
+        ''' Получить фреймы из аудиозаписи. Фреймы представляют собой строки одного непрерывного numpy.ndarray float32 формы (N, 480),
+        т.к. RNNoise поддерживает только фреймы длиной 10 миллисекунд. Последний фрейм при необходимости дополняется нулями.
 
         ВНИМАНИЕ! Частота дискретизации аудиозаписи принудительно приводится к 48 кГц. Другие значения не поддерживаются RNNoise.
 
-        1. audio - объект pydub.AudioSegment с аудиозаписью или байтовая строка с аудиоданными (без заголовков wav)
-        2. sample_rate - частота дискретизации (обязательно только когда audio - байтовая строка):
+        1. audio - аудиозапись (см. filter())
+        2. sample_rate - частота дискретизации (обязательно, когда audio - не pydub.AudioSegment):
             если частота дискретизации не поддерживается - она будет приведена к поддерживаемым 48 кГц
-        3. возвращает tuple из списка фреймов и исходной частоты дискретизации аудиозаписи '''
+        3. возвращает tuple из numpy.ndarray с фреймами и исходной частоты дискретизации аудиозаписи '''
 
         if isinstance(audio, AudioSegment):
-            sample_rate = source_sample_rate = audio.frame_rate
-            if sample_rate != self.sample_rate:
-                audio = audio.set_frame_rate(self.sample_rate)
-            audio_bytes = audio.raw_data
-        elif isinstance(audio, bytes):
+            source_sample_rate = audio.frame_rate
+            samples = _as_samples(audio.raw_data)
+        else:
+            samples = _as_samples(audio)
             if not sample_rate:
-                raise ValueError("when type(audio) = 'bytes', 'sample_rate' can not be None")
-            audio_bytes = audio
+                raise ValueError("when type(audio) = '{}', 'sample_rate' can not be None".format(type(audio).__name__))
             source_sample_rate = sample_rate
-            if sample_rate != self.sample_rate:
-                audio = AudioSegment(data=audio_bytes, sample_width=self.sample_width, frame_rate=sample_rate, channels=self.channels)
-                audio = audio.set_frame_rate(self.sample_rate)
-                audio_bytes = audio.raw_data
-        else:
-            raise TypeError("'audio' can only be AudioSegment or bytes")
-
-        frame_width = int(self.sample_rate * (self.frame_duration_ms / 1000.0) * 2)
-        if len(audio_bytes) % frame_width != 0:
-            silence_duration = frame_width - len(audio_bytes) % frame_width
-            audio_bytes += b'\x00' * silence_duration
-
-        offset = 0
-        frames = []
-        while offset + frame_width <= len(audio_bytes):
-            frames.append(audio_bytes[offset:offset + frame_width])
-            offset += frame_width
+
+        # Ресемплинг линеен, поэтому отсчёты с плавающей точкой масштабируются к шкале 16 бит уже при копировании во фреймы
+        metrics = self.metrics
+        scale = _get_samples_scale(samples)
+        if source_sample_rate != self.sample_rate:
+            samples = _measure(metrics, 'resample', resample, samples, source_sample_rate, self.sample_rate)
+        frames_count = -(-samples.shape[0] // self.frame_size)
+
+        if metrics is not None:
+            start_time = time.perf_counter()
+        frames = np.zeros((frames_count, self.frame_size), dtype=np.float32)
+        _copy_samples(frames.reshape(-1)[:samples.shape[0]], samples, scale)
+        if metrics is not None:
+            metrics.record_stage('framing', time.perf_counter() - start_time)
         return frames, source_sample_rate
 
 
+    def filter_file(self, f_name_wav, f_name_denoised_wav, voice_prob_threshold=0.0, save_source_sample_rate=True, block_duration_s=10):
+        ''' Очистить .wav аудиозапись от шума и сохранить результат в другой .wav файл с постоянным расходом памяти, не зависящим
+        от длины аудиозаписи. Аудиоданные читаются через numpy.memmap, обрабатываются блоками длиной block_duration_s (с сохранением
+        состояния между блоками, см. RNNoiseStream) и сразу дописываются в итоговый файл, заголовок которого обновляется в конце.
+
+        Поддерживаются .wav аудиозаписи 8/16/24/32 бит и float, многоканальные приводятся к моно (см. wav_io.to_mono()).
+
+        1. f_name_wav - имя исходной .wav аудиозаписи
+        2. f_name_denoised_wav - имя .wav аудиозаписи для результата
+        3. voice_prob_threshold - порог вероятности наличия голоса в каждом фрейме (значение от 0 до 1, если 0 - использовать все фреймы)
+        4. save_source_sample_rate - True: сохранять результат в исходной частоте дискретизации, False - в 48 кГц
+        5. block_duration_s - длина обрабатываемого за раз блока в секундах
+        6. возвращает длину исходной аудиозаписи в секундах '''
+
+        wav_info = read_wav_info(f_name_wav)
+        stream = RNNoiseStream(self, wav_info.sample_rate, voice_prob_threshold, save_source_sample_rate)
+        target_sample_rate = wav_info.sample_rate if save_source_sample_rate else self.sample_rate
+        block_size = max(int(block_duration_s * wav_info.sample_rate), 1)
+
+        samples_count = 0
+        with WavWriter(f_name_denoised_wav, target_sample_rate, self.sample_width, self.channels) as wav_writer:
+            for block in iter_wav_blocks(f_name_wav, block_size):
+                samples_count += block.shape[0]
+                wav_writer.write(stream.push_samples(to_mono(block, wav_info)))
+            wav_writer.write(stream.flush())
+
+        return samples_count / wav_info.sample_rate
+
+
     def read_wav(self, f_name_wav, sample_rate=None):
-        ''' Загрузить .wav аудиозапись. Поддерживаются только моно аудиозаписи 2 байта/16 бит. Если параметры у загружаемой аудиозаписи
-        отличаются от указанных - она будет приведена в требуемый формат.
+        ''' Загрузить .wav аудиозапись. Поддерживаются аудиозаписи 8/16/24/32 бит и float с любым количеством каналов: если параметры
+        у загружаемой аудиозаписи отличаются от требуемых (16 бит, моно) - она будет приведена в требуемый формат за один проход
+        (см. wav_io.to_mono()), а не цепочкой преобразований с копированием на каждом шаге. Аудиозапись 16 бит моно не преобразуется.
         1. f_name_wav - имя .wav аудиозаписи или BytesIO
-        2. sample_rate - желаемая частота дискретизации (если None - не менять частоту дискретизации)
+        2. sample_rate - желаемая частота дискретизации (если None - не менять частоту дискретизации). Если аудиозапись загружается
+            для шумоподавления, лучше не указывать: filter() сам приведёт её к 48 кГц, а повторного ресемплинга не будет
         3. возвращает объект pydub.AudioSegment с аудиозаписью '''
 
         if isinstance(f_name_wav, str) and f_name_wav.rfind('.wav') == -1:
             raise ValueError("'f_name_wav' must contain the name .wav audio recording")
 
-        audio = AudioSegment.from_wav(f_name_wav)
+        wav_info, samples = read_wav_samples(f_name_wav)
+        frame_rate = wav_info.sample_rate
+        if sample_rate and sample_rate != frame_rate:
+            samples = resample(samples, frame_rate, sample_rate)
+            frame_rate = sample_rate
+        if samples.dtype != np.int16:
+            samples = self.to_int16(samples)
 
-        if sample_rate:
-            audio = audio.set_frame_rate(sample_rate)
-        if audio.sample_width != self.sample_width:
-            audio = audio.set_sample_width(self.sample_width)
-        if audio.channels != self.channels:
-            audio = audio.set_channels(self.channels)
-        return audio
+        return AudioSegment(data=samples.tobytes(), sample_width=self.sample_width, frame_rate=frame_rate, channels=self.channels)
 
 
     def write_wav(self, f_name_wav, audio_data, sample_rate=None):
@@ -300,9 +1138,19 @@ class RNNoise(object):
         2. audio - объект pydub.AudioSegment с аудиозаписью
         3. desired_sample_rate - желаемая частота дискретизации (если None - не менять частоту дискретизации) '''
 
-        if desired_sample_rate:
+        if desired_sample_rate and desired_sample_rate != audio.frame_rate:
+            if audio.sample_width == self.sample_width and audio.channels == self.channels:
+                self.write_wav_from_bytes(f_name_wav, audio.raw_data, audio.frame_rate, desired_sample_rate)
+                return
             audio = audio.set_frame_rate(desired_sample_rate)
-        audio.export(f_name_wav, format='wav')
+
+        audio_bytes = audio.raw_data
+        # pydub хранит 8-битные отсчёты со знаком, а в .wav они без знака со смещением 128 (обратно to_mono())
+        if audio.sample_width == 1:
+            audio_bytes = (np.frombuffer(audio_bytes, dtype=np.uint8) + np.uint8(128)).tobytes()
+
+        with WavWriter(f_name_wav, audio.frame_rate, audio.sample_width, audio.channels) as wav_writer:
+            wav_writer.write(audio_bytes)
 
 
     def write_wav_from_bytes(self, f_name_wav, audio_bytes, sample_rate, desired_sample_rate=None):
@@ -312,12 +1160,208 @@ class RNNoise(object):
         3. sample_rate - частота дискретизации
         4. desired_sample_rate - желаемая частота дискретизации (если None - не менять частоту дискретизации) '''
 
-        audio = AudioSegment(data=audio_bytes, sample_width=self.sample_width, frame_rate=sample_rate, channels=self.channels)
         if desired_sample_rate and desired_sample_rate != sample_rate:
-            audio = audio.set_frame_rate(desired_sample_rate)
+            samples = np.frombuffer(audio_bytes, dtype=np.int16, count=len(audio_bytes) // self.sample_width)
+            audio_bytes = self.to_int16(resample(samples, sample_rate, desired_sample_rate)).tobytes()
+            sample_rate = desired_sample_rate
+
+        with WavWriter(f_name_wav, sample_rate, self.sample_width, self.channels) as wav_writer:
+            wav_writer.write(audio_bytes)
+
+
+
+
+class RNNoiseStream(object):
+    ''' Сессия шумоподавления потокового аудио с сохранением состояния между частями аудиозаписи:
+    - push(): очистка от шума очередной части аудиозаписи, возвращает готовые к этому моменту очищенные данные
+    - push_samples(): то же самое для части аудиозаписи в виде numpy.ndarray с отсчётами в шкале 16 бит
+    - flush(): очистка от шума оставшегося неполного фрейма в конце потока
+
+    В отличие от вызова RNNoise.filter() на каждой части, остаток, не кратный 10 мс, не дополняется тишиной, а хранится до
+    следующей части. Для обработки используется один переиспользуемый буфер фреймов, а не новые объекты на каждую часть.
+
+    ВНИМАНИЕ! Сессия использует состояние нейронной сети переданного объекта RNNoise, поэтому один объект RNNoise нельзя
+    одновременно использовать в нескольких сессиях.
+
+    Если у denoiser включён сбор метрик (см. RNNoise.enable_metrics()), вызовы push() и push_samples() учитываются под именем
+    'stream.push' (длительность аудио - длительность части), а flush() - под именем 'stream.flush'.
+
+    1. denoiser - объект RNNoise
+    2. sample_rate - частота дискретизации частей аудиозаписи (если None - 48 кГц)
+    3. voice_prob_threshold - порог вероятности наличия голоса в каждом фрейме (значение от 0 до 1, если 0 - использовать все фреймы)
+    4. save_source_sample_rate - True: приводить частоту дискретизации возвращаемых частей к исходной
+    5. float_output - True: возвращать очищенные части в виде numpy.ndarray float32 (значения от -1 до 1), False - байтовыми строками
+    6. vad_callback - функция, которая вызывается с numpy.ndarray float32 вероятностей наличия голоса каждый раз, когда обработаны
+        очередные фреймы (по порядку, по одному значению на фрейм длиной 10 мс), если None - не вызывается '''
+
+    def __init__(self, denoiser, sample_rate=None, voice_prob_threshold=0.0, save_source_sample_rate=True, float_output=False,
+                 vad_callback=None):
+        self.denoiser = denoiser
+        self.sample_rate = sample_rate or denoiser.sample_rate
+        self.voice_prob_threshold = voice_prob_threshold
+        self.save_source_sample_rate = save_source_sample_rate
+        self.float_output = float_output
+        self.vad_callback = vad_callback
+
+        self.__input_resampler = None
+        self.__output_resampler = None
+        # Множитель отсчётов последней части: им же приводится к шкале 16 бит хвост входного ресемплера в flush()
+        self.__input_scale = 1.0
+        if self.sample_rate != denoiser.sample_rate:
+            self.__input_resampler = Resampler(self.sample_rate, denoiser.sample_rate)
+            if save_source_sample_rate:
+                self.__output_resampler = Resampler(denoiser.sample_rate, self.sample_rate)
+
+        self.__remainder = np.zeros(denoiser.frame_size, dtype=np.float32)
+        self.__remainder_size = 0
+        self.__frames = np.zeros((1, denoiser.frame_size), dtype=np.float32)
+        self.__denoised_samples = np.zeros(denoiser.frame_size, dtype=np.int16)
+
+
+    def push(self, chunk):
+        ''' Очистка от шума очередной части аудиозаписи. Неполный фрейм в конце части сохраняется до следующего вызова.
+        1. chunk - часть аудиозаписи моно с частотой дискретизации sample_rate: байтовая строка с аудиоданными 16 бит (без заголовков wav)
+            или любой другой объект, поддерживающий буферный протокол (bytearray, memoryview и т.д., используется без копирования),
+            или numpy.ndarray int16 или float (значения от -1 до 1)
+        2. возвращает байтовую строку (или numpy.ndarray float32, если float_output) с очищенными от шума аудиоданными (может быть
+            пустой, если не набрался ни один фрейм) '''
+
+        metrics = self.denoiser.metrics
+        start_time = _start_call(metrics)
+        samples = _as_samples(chunk)
+        audio_duration = samples.shape[0] / self.sample_rate
+        scale = self.__input_scale = _get_samples_scale(samples)
+        if self.__input_resampler:
+            samples = _measure(metrics, 'resample', self.__input_resampler.process, samples)
+        denoised_chunk = self.__push_samples(samples, scale)
+        _end_call(metrics, 'stream.push', start_time, audio_duration)
+        return denoised_chunk
+
+
+    def push_samples(self, samples):
+        ''' Очистка от шума очередной части аудиозаписи, представленной отсчётами в numpy.ndarray (без промежуточной байтовой строки).
+        1. samples - одномерный numpy.ndarray с отсчётами в шкале 16 бит (например, int16) с частотой дискретизации sample_rate
+        2. возвращает байтовую строку (или numpy.ndarray float32, если float_output) с очищенными от шума аудиоданными (может быть
+            пустой, если не набрался ни один фрейм) '''
+
+        metrics = self.denoiser.metrics
+        start_time = _start_call(metrics)
+        audio_duration = samples.shape[0] / self.sample_rate
+        self.__input_scale = 1.0
+        if self.__input_resampler:
+            samples = _measure(metrics, 'resample', self.__input_resampler.process, samples)
+        denoised_chunk = self.__push_samples(samples)
+        _end_call(metrics, 'stream.push', start_time, audio_duration)
+        return denoised_chunk
+
+
+    def __push_samples(self, samples, scale=1.0):
+        ''' Очистка от шума очередной части аудиозаписи, уже приведённой к 48 кГц.
+        1. samples - numpy.ndarray с отсчётами
+        2. scale - множитель для приведения отсчётов к шкале 16 бит (применяется при копировании в буфер фреймов)
+        3. возвращает очищенные от шума аудиоданные '''
+
+        frame_size = self.denoiser.frame_size
+        frames_count = (self.__remainder_size + samples.shape[0]) // frame_size
+        if frames_count == 0:
+            _copy_samples(self.__remainder[self.__remainder_size:self.__remainder_size+samples.shape[0]], samples, scale)
+            self.__remainder_size += samples.shape[0]
+            return self.__get_output()
+
+        metrics = self.denoiser.metrics
+        if metrics is not None:
+            start_time = time.perf_counter()
+
+        frames = self.__get_frames_buffer(frames_count)
+        frames_flat = frames.reshape(-1)
+        used_samples_count = frames_count * frame_size - self.__remainder_size
+        frames_flat[:self.__remainder_size] = self.__remainder[:self.__remainder_size]
+        _copy_samples(frames_flat[self.__remainder_size:], samples[:used_samples_count], scale)
+
+        self.__remainder_size = samples.shape[0] - used_samples_count
+        _copy_samples(self.__remainder[:self.__remainder_size], samples[used_samples_count:], scale)
+
+        if metrics is not None:
+            metrics.record_stage('framing', time.perf_counter() - start_time)
+        return self.__filter_frames(frames)
+
+
+    def flush(self):
+        ''' Очистка от шума оставшегося неполного фрейма. Фрейм дополняется тишиной только для обработки, в результат
+        попадает лишь реальная длина остатка. После вызова сессию можно использовать для следующего потока (состояние
+        нейронной сети при этом не сбрасывается).
+        1. возвращает байтовую строку (или numpy.ndarray float32, если float_output) с очищенными от шума аудиоданными (может быть пустой) '''
+
+        metrics = self.denoiser.metrics
+        start_time = _start_call(metrics)
+
+        denoised_chunks = []
+        if self.__input_resampler:
+            resampler_tail = _measure(metrics, 'resample', self.__input_resampler.flush)
+            denoised_chunks.append(self.__push_samples(resampler_tail, self.__input_scale))
+
+        if self.__remainder_size > 0:
+            frames = self.__get_frames_buffer(1)
+            frames[0, :self.__remainder_size] = self.__remainder[:self.__remainder_size]
+            frames[0, self.__remainder_size:] = 0.0
+            remainder_size = self.__remainder_size
+            self.__remainder_size = 0
+            denoised_chunks.append(self.__filter_frames(frames, remainder_size))
+
+        if self.__output_resampler:
+            denoised_chunks.append(self.__get_output(_measure(metrics, 'resample', self.__output_resampler.flush)))
+
+        if self.float_output:
+            denoised_chunk = np.concatenate(denoised_chunks) if denoised_chunks else self.__get_output()
+        else:
+            denoised_chunk = b''.join(denoised_chunks)
+        _end_call(metrics, 'stream.flush', start_time, 0.0)
+        return denoised_chunk
+
+
+    def __get_frames_buffer(self, frames_count):
+        ''' Получить представление переиспользуемого буфера фреймов нужной длины (буфер увеличивается только при необходимости).
+        1. frames_count - необходимое количество фреймов
+        2. возвращает numpy.ndarray float32 формы (frames_count, 480) '''
+
+        if self.__frames.shape[0] < frames_count:
+            self.__frames = np.zeros((frames_count, self.denoiser.frame_size), dtype=np.float32)
+        return self.__frames[:frames_count]
+
+
+    def __filter_frames(self, frames, samples_count=None):
+        ''' Очистка фреймов из буфера от шума и приведение результата к исходной частоте дискретизации.
+        1. frames - представление буфера фреймов
+        2. samples_count - количество реальных отсчётов в frames (если None - все отсчёты)
+        3. возвращает очищенные от шума аудиоданные '''
 
-        audio.export(f_name_wav, format='wav')
+        metrics = self.denoiser.metrics
+        vad_probabilities = self.denoiser.process_block(frames)
+        if self.vad_callback is not None:
+            self.vad_callback(vad_probabilities)
+        frames = _drop_frames(metrics, frames, vad_probabilities, self.voice_prob_threshold)
 
+        denoised_samples = frames.reshape(-1)
+        if samples_count is not None:
+            denoised_samples = denoised_samples[:samples_count]
+        if self.__output_resampler:
+            denoised_samples = _measure(metrics, 'resample', self.__output_resampler.process, denoised_samples)
+        return self.__get_output(denoised_samples)
+
+
+    def __get_output(self, denoised_samples=None):
+        ''' Привести очищенные отсчёты к формату результата. Приведение к int16 выполняется в переиспользуемый буфер.
+        1. denoised_samples - numpy.ndarray float32 с очищенными отсчётами в шкале 16 бит (если None - пустой результат)
+        2. возвращает байтовую строку или numpy.ndarray float32 (значения от -1 до 1) '''
+
+        if denoised_samples is None:
+            return np.zeros(0, dtype=np.float32) if self.float_output else b''
+        if self.float_output:
+            return np.multiply(denoised_samples, np.float32(1.0 / 32768), dtype=np.float32)
+
+        if self.__denoised_samples.shape[0] < denoised_samples.shape[0]:
+            self.__denoised_samples = np.zeros(denoised_samples.shape[0], dtype=np.int16)
+        return self.denoiser.to_int16(denoised_samples, self.__denoised_samples[:denoised_samples.shape[0]]).tobytes()
 
 
 
@@ -363,17 +1407,15 @@ def main():
 
     denoised_audio = b''
     buffer_size_ms = 10
+    stream = RNNoiseStream(denoiser, sample_rate=audio.frame_rate)
 
     start_time = time.time()
     elapsed_time_per_frame = []
-    for i in range(buffer_size_ms, len(audio), buffer_size_ms):
-        time_per_frame = time.time()
-        denoised_audio += denoiser.filter(audio[i-buffer_size_ms:i].raw_data, sample_rate=audio.frame_rate)
-        elapsed_time_per_frame.append(time.time() - time_per_frame)
-    if len(audio) % buffer_size_ms != 0:
+    for i in range(0, len(audio), buffer_size_ms):
         time_per_frame = time.time()
-        denoised_audio += denoiser.filter(audio[len(audio)-(len(audio)%buffer_size_ms):].raw_data, sample_rate=audio.frame_rate)
+        denoised_audio += stream.push(audio[i:i+buffer_size_ms].raw_data)
         elapsed_time_per_frame.append(time.time() - time_per_frame)
+    denoised_audio += stream.flush()
     elapsed_time = time.time() - start_time
     average_elapsed_time_per_frame = sum(elapsed_time_per_frame) / len(elapsed_time_per_frame)
 
@@ -0,0 +1,531 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+#       OS : GNU/Linux Ubuntu 16.04 or later
+# LANGUAGE : Python 3.6 or later
+#   AUTHOR : Klim V. O.
+# - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+'''
+asyncio сервер шумоподавления потокового аудио в реальном времени (Unix-сокет или TCP) для запуска рядом с медиасерверами.
+Не требует внешних сервисов, поэтому его можно нагрузочно тестировать на одной машине.
+
+Протокол:
+1. Клиент отправляет строку JSON с параметрами потока: 'sample_rate' (по умолчанию 48000, от 8000 до 192000), 'chunk_ms'
+    (по умолчанию 20), 'vad' (возвращать вероятности наличия голоса), 'voice_prob_threshold' и 'output_format' ('s16le' или 'f32le').
+    Вместо параметров можно отправить {"command": "stats"} - сервер ответит строкой JSON со статистикой (см. StreamingServer.stats())
+    и закроет соединение
+2. Сервер отвечает строкой JSON с согласованными параметрами ('status': 'ok', длительность части приводится к кратной 10 мс
+    в допустимых пределах, 'chunk_bytes' - размер части в байтах) или с ошибкой ('status': 'error', 'error') и закрывает соединение
+3. Клиент отправляет аудиоданные 16 бит моно без заголовков, сервер обрабатывает их частями по chunk_bytes и на каждую часть
+    отправляет ответ: заголовок из 4 чисел uint32 little-endian (размер очищенных аудиоданных в байтах, количество значений
+    вероятности наличия голоса, глубина очереди соединения и количество пропусков реального времени в соединении), очищенные
+    аудиоданные и вероятности наличия голоса (float32 little-endian)
+4. Когда клиент закрывает передачу (shutdown(SHUT_WR)), сервер обрабатывает остаток, отправляет последний ответ и закрывает соединение
+
+Содержит классы StreamingServer и StreamingClient и CLI сервера (функция main()).
+
+Зависимости: pydub, numpy.
+'''
+
+import sys
+import json
+import math
+import time
+import struct
+import asyncio
+import argparse
+import numpy as np
+
+from .rnnoise_wrapper import RNNoise
+from .metrics import Metrics
+from .aio import AsyncRNNoiseStream
+
+
+# Заголовок ответа на каждую часть: размер очищенных аудиоданных в байтах, количество значений вероятности наличия голоса,
+# глубина очереди соединения и количество пропусков реального времени в соединении
+_RESPONSE_HEADER = struct.Struct('<IIII')
+
+# Форматы очищенных аудиоданных (размер отсчёта в байтах) и допустимая длительность части в миллисекундах
+OUTPUT_FORMATS = {'s16le': 2, 'f32le': 4}
+MIN_CHUNK_MS = 10
+MAX_CHUNK_MS = 1000
+
+# Допустимая частота дискретизации потока: ресемплер для произвольной частоты (например, простого числа) строится долго и
+# занимает много памяти, поэтому запросы вне этого диапазона отклоняются
+MIN_SAMPLE_RATE = 8000
+MAX_SAMPLE_RATE = 192000
+
+
+def _reject_json_constant(constant):
+    ''' Отклонить NaN, Infinity и -Infinity в JSON с параметрами потока (json.loads() по умолчанию их принимает).
+    1. constant - строка с константой из JSON '''
+
+    raise ValueError("invalid JSON value '{}'".format(constant))
+
+
+class StreamingServer(object):
+    ''' asyncio сервер шумоподавления потокового аудио (протокол - см. описание модуля):
+    - start_unix(), start_tcp(): запустить сервер на Unix-сокете или TCP (возвращают asyncio.AbstractServer)
+    - stats(): статистика сервера
+
+    У каждого соединения своё состояние нейронной сети (объект RNNoise, созданный через spawn()), части обрабатываются в пуле потоков
+    выполнения (см. aio.AsyncRNNoiseStream), поэтому цикл событий не блокируется. Задержка ограничена: в обработке и в ожидании
+    отправки находится не более max_pending частей соединения, а результат каждой части отправляется сразу после её обработки.
+    Если клиент не успевает читать результаты, сервер перестаёт читать его аудиоданные.
+
+    Часть считается пропустившей реальное время, если от её получения до отправки результата прошло больше, чем
+    deadline_factor * длительность части. Пропуски и глубина очереди передаются клиенту в каждом ответе, а в stats() - суммарно.
+
+    1. f_name_lib - путь к библиотеке или её имя/субимя (см. RNNoise)
+    2. model_path - путь к файлу весов модели (см. RNNoise)
+    3. max_pending - максимальное количество частей одного соединения, находящихся в обработке и ожидающих отправки
+    4. deadline_factor - доля длительности части, за которую её результат должен быть отправлен
+    5. max_connections - максимальное количество одновременных соединений (если None - не ограничено)
+    6. executor - concurrent.futures.Executor для обработки (если None - общий пул потоков по количеству ядер процессора) '''
+
+    def __init__(self, f_name_lib=None, model_path=None, max_pending=4, deadline_factor=1.0, max_connections=None, executor=None):
+        if max_pending < 1:
+            raise ValueError("'max_pending' must be greater than 0")
+        if max_connections is not None and max_connections < 1:
+            raise ValueError("'max_connections' must be greater than 0")
+
+        self.denoiser = RNNoise(f_name_lib, model_path)
+        self.metrics = self.denoiser.enable_metrics(Metrics(deadline_factor=deadline_factor))
+        self.max_pending = max_pending
+        self.max_connections = max_connections
+        self.executor = executor
+
+        self.connections = 0
+        self.connections_total = 0
+        self.connections_rejected = 0
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+
+
+    async def start_unix(self, socket_path):
+        ''' Запустить сервер на Unix-сокете.
+        1. socket_path - путь к сокету
+        2. возвращает asyncio.AbstractServer '''
+
+        return await asyncio.start_unix_server(self.handle_connection, socket_path)
+
+
+    async def start_tcp(self, host='127.0.0.1', port=8765):
+        ''' Запустить сервер на TCP.
+        1. host - адрес
+        2. port - порт
+        3. возвращает asyncio.AbstractServer '''
+
+        return await asyncio.start_server(self.handle_connection, host, port)
+
+
+    def stats(self):
+        ''' Получить статистику сервера.
+        1. возвращает dict: количество текущих, всех и отклонённых соединений, суммарная глубина очередей соединений (части,
+            полученные, но ещё не отправленные обратно) и её максимум, количество обработанных частей и пропусков реального времени,
+            а также метрики шумоподавления (см. Metrics.as_dict(), время от получения части до отправки результата - 'server.chunk') '''
+
+        metrics = self.metrics.as_dict()
+        return {'connections': self.connections, 'connections_total': self.connections_total,
+                'connections_rejected': self.connections_rejected, 'queue_depth': self.queue_depth, 'max_queue_depth': self.max_queue_depth,
+                'chunks': metrics['calls'].get('server.chunk', 0), 'deadline_misses': metrics['deadline_misses'].get('server.chunk', 0),
+                'metrics': metrics}
+
+
+    async def handle_connection(self, reader, writer):
+        ''' Обслужить одно соединение (используется как client_connected_cb в asyncio.start_server()/start_unix_server()).
+        1. reader - asyncio.StreamReader
+        2. writer - asyncio.StreamWriter '''
+
+        try:
+            params = await self.__negotiate(reader, writer)
+            if params is not None:
+                try:
+                    await self.__serve_stream(reader, writer, params)
+                finally:
+                    self.connections -= 1
+        except (ConnectionResetError, BrokenPipeError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+    async def __negotiate(self, reader, writer):
+        ''' Получить параметры потока от клиента и отправить согласованные параметры (или статистику сервера). Принятое соединение
+        учитывается в connections сразу, до отправки ответа, чтобы одновременные подключения не превысили max_connections.
+        1. reader - asyncio.StreamReader
+        2. writer - asyncio.StreamWriter
+        3. возвращает dict с согласованными параметрами или None, если поток не будет обрабатываться '''
+
+        try:
+            request = json.loads((await reader.readline()).decode('utf-8'), parse_constant=_reject_json_constant)
+            if not isinstance(request, dict):
+                raise ValueError('stream parameters must be a JSON object')
+
+            if request.get('command') == 'stats':
+                response = dict(self.stats(), status='ok')
+            elif self.max_connections is not None and self.connections >= self.max_connections:
+                self.connections_rejected += 1
+                response = {'status': 'error', 'error': 'too many connections (maximum is {})'.format(self.max_connections)}
+            else:
+                response = dict(self.__get_stream_params(request), status='ok')
+        except (ValueError, TypeError, OverflowError) as e:
+            response = {'status': 'error', 'error': str(e)}
+
+        is_accepted = response['status'] == 'ok' and 'chunk_bytes' in response
+        if is_accepted:
+            self.connections += 1
+            self.connections_total += 1
+
+        writer.write(json.dumps(response).encode('utf-8') + b'\n')
+        try:
+            await writer.drain()
+        except Exception:
+            if is_accepted:
+                self.connections -= 1
+            raise
+        return response if is_accepted else None
+
+
+    def __get_stream_params(self, request):
+        ''' Согласовать параметры потока.
+        1. request - dict с параметрами, запрошенными клиентом
+        2. возвращает dict с согласованными параметрами '''
+
+        sample_rate = int(request.get('sample_rate') or self.denoiser.sample_rate)
+        if sample_rate < MIN_SAMPLE_RATE or sample_rate > MAX_SAMPLE_RATE:
+            raise ValueError("'sample_rate' must be from {} to {}".format(MIN_SAMPLE_RATE, MAX_SAMPLE_RATE))
+        output_format = request.get('output_format') or 's16le'
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError("unsupported output format '{}', expected one of: {}".format(output_format, ', '.join(OUTPUT_FORMATS)))
+        voice_prob_threshold = float(request.get('voice_prob_threshold') or 0.0)
+        if not 0.0 <= voice_prob_threshold <= 1.0:
+            raise ValueError("'voice_prob_threshold' must be from 0 to 1")
+
+        # Длительность части приводится к кратной длительности фрейма RNNoise, чтобы каждая часть давала результат без остатка.
+        # Слишком большие числа в JSON (например, 1e400) превращаются в inf, а не в NaN/Infinity, поэтому проверяются отдельно
+        frame_duration_ms = self.denoiser.frame_duration_ms
+        chunk_ms = float(request.get('chunk_ms') or 20)
+        if not math.isfinite(chunk_ms):
+            raise ValueError("'chunk_ms' must be a finite number")
+        chunk_ms = min(max(int(round(chunk_ms / frame_duration_ms)) * frame_duration_ms, MIN_CHUNK_MS), MAX_CHUNK_MS)
+        chunk_samples = max(sample_rate * chunk_ms // 1000, 1)
+
+        return {'sample_rate': sample_rate, 'chunk_ms': chunk_ms, 'chunk_bytes': chunk_samples * self.denoiser.sample_width,
+                'vad': bool(request.get('vad')), 'voice_prob_threshold': voice_prob_threshold, 'output_format': output_format,
+                'max_pending': self.max_pending}
+
+
+    async def __serve_stream(self, reader, writer, params):
+        ''' Обрабатывать аудиоданные соединения частями, пока клиент не закроет передачу. Чтение частей и отправка результатов
+        выполняются параллельно: результат отправляется сразу после обработки, не дожидаясь следующей части.
+        1. reader - asyncio.StreamReader
+        2. writer - asyncio.StreamWriter
+        3. params - dict с согласованными параметрами потока '''
+
+        session = AsyncRNNoiseStream(self.denoiser.spawn(), params['sample_rate'], params['voice_prob_threshold'], True, self.executor,
+                                     self.max_pending, params['output_format'] == 'f32le', True)
+        results = asyncio.Queue(maxsize=self.max_pending)
+        connection_state = {'queue_depth': 0, 'deadline_misses': 0}
+
+        receiver = asyncio.ensure_future(self.__receive_chunks(reader, session, results, params, connection_state))
+        sender = asyncio.ensure_future(self.__send_results(writer, results, params['vad'], connection_state))
+        try:
+            # Если одна из задач завершилась с ошибкой (например, клиент разорвал соединение), вторая отменяется
+            done, pending = await asyncio.wait([receiver, sender], return_when=asyncio.FIRST_EXCEPTION)
+            for task in pending:
+                task.cancel()
+            for task in done:
+                task.result()
+        finally:
+            for task in (receiver, sender):
+                if not task.done():
+                    task.cancel()
+            self.__change_queue_depth(connection_state, -connection_state['queue_depth'])
+
+
+    async def __receive_chunks(self, reader, session, results, params, connection_state):
+        ''' Читать аудиоданные соединения частями и ставить их в очередь на шумоподавление.
+        1. reader - asyncio.StreamReader
+        2. session - объект aio.AsyncRNNoiseStream соединения
+        3. results - asyncio.Queue для результатов частей (см. __send_results())
+        4. params - dict с согласованными параметрами потока
+        5. connection_state - dict с глубиной очереди и количеством пропусков реального времени соединения '''
+
+        chunk_bytes = params['chunk_bytes']
+        bytes_per_second = params['sample_rate'] * self.denoiser.sample_width
+        while True:
+            try:
+                chunk = await reader.readexactly(chunk_bytes)
+            except asyncio.IncompleteReadError as e:
+                chunk = e.partial
+
+            # Неполный отсчёт в конце потока отбрасывается
+            chunk = chunk[:len(chunk) - len(chunk) % self.denoiser.sample_width]
+            if chunk:
+                received_time = time.perf_counter()
+                self.__change_queue_depth(connection_state, 1)
+                await results.put((await session.push(chunk), received_time, len(chunk) / bytes_per_second))
+            if len(chunk) < chunk_bytes:
+                break
+
+        self.__change_queue_depth(connection_state, 1)
+        await results.put((await session.flush(), time.perf_counter(), 0.0))
+        await results.put(None)
+
+
+    async def __send_results(self, writer, results, is_vad, connection_state):
+        ''' Отправлять результаты частей по порядку по мере их готовности.
+        1. writer - asyncio.StreamWriter
+        2. results - asyncio.Queue с tuple из asyncio.Future результата, времени получения части и её длительности (None - конец потока)
+        3. is_vad - True: отправлять вероятности наличия голоса
+        4. connection_state - dict с глубиной очереди и количеством пропусков реального времени соединения '''
+
+        while True:
+            result = await results.get()
+            if result is None:
+                return
+            future, received_time, chunk_duration = result
+            denoised_chunk, vad_probabilities = await future
+
+            if isinstance(denoised_chunk, np.ndarray):
+                denoised_chunk = denoised_chunk.astype('<f4', copy=False).tobytes()
+            vad_data = vad_probabilities.astype('<f4', copy=False).tobytes() if is_vad else b''
+
+            self.__change_queue_depth(connection_state, -1)
+            writer.write(_RESPONSE_HEADER.pack(len(denoised_chunk), len(vad_data) // 4, connection_state['queue_depth'],
+                                               connection_state['deadline_misses']) + denoised_chunk + vad_data)
+            await writer.drain()
+
+            if chunk_duration > 0:
+                call_record = self.metrics.record_call('server.chunk', time.perf_counter() - received_time, chunk_duration)
+                connection_state['deadline_misses'] += call_record.is_deadline_missed
+
+
+    def __change_queue_depth(self, connection_state, delta):
+        ''' Изменить глубину очереди соединения и суммарную глубину очередей сервера.
+        1. connection_state - dict с глубиной очереди соединения
+        2. delta - изменение '''
+
+        connection_state['queue_depth'] += delta
+        self.queue_depth += delta
+        self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+
+
+class StreamingClient(object):
+    ''' asyncio клиент сервера шумоподавления потокового аудио (например, для нагрузочного тестирования):
+    - connect_unix(), connect_tcp(): подключиться к серверу и согласовать параметры потока (параметры - в атрибуте params)
+    - send(): отправить часть аудиоданных
+    - receive(): получить очередной ответ сервера
+    - close_input(): закрыть передачу (сервер обработает остаток и закроет соединение после последнего ответа)
+    - close(): закрыть соединение
+    - get_stats_unix(), get_stats_tcp(): получить статистику сервера
+
+    1. reader - asyncio.StreamReader
+    2. writer - asyncio.StreamWriter
+    3. params - dict с согласованными параметрами потока '''
+
+    def __init__(self, reader, writer, params):
+        self.params = params
+        self.__reader = reader
+        self.__writer = writer
+
+
+    @classmethod
+    async def connect_unix(cls, socket_path, sample_rate=None, chunk_ms=20, vad=False, voice_prob_threshold=0.0, output_format='s16le'):
+        ''' Подключиться к серверу на Unix-сокете.
+        1. socket_path - путь к сокету
+        2. остальные аргументы - параметры потока (см. описание модуля)
+        3. возвращает объект StreamingClient '''
+
+        reader, writer = await asyncio.open_unix_connection(socket_path)
+        return await cls.__open(reader, writer, sample_rate, chunk_ms, vad, voice_prob_threshold, output_format)
+
+
+    @classmethod
+    async def connect_tcp(cls, host='127.0.0.1', port=8765, sample_rate=None, chunk_ms=20, vad=False, voice_prob_threshold=0.0,
+                          output_format='s16le'):
+        ''' Подключиться к серверу на TCP.
+        1. host - адрес
+        2. port - порт
+        3. остальные аргументы - параметры потока (см. описание модуля)
+        4. возвращает объект StreamingClient '''
+
+        reader, writer = await asyncio.open_connection(host, port)
+        return await cls.__open(reader, writer, sample_rate, chunk_ms, vad, voice_prob_threshold, output_format)
+
+
+    @staticmethod
+    async def get_stats_unix(socket_path):
+        ''' Получить статистику сервера на Unix-сокете (см. StreamingServer.stats()).
+        1. socket_path - путь к сокету
+        2. возвращает dict '''
+
+        return await StreamingClient.__get_stats(*(await asyncio.open_unix_connection(socket_path)))
+
+
+    @staticmethod
+    async def get_stats_tcp(host='127.0.0.1', port=8765):
+        ''' Получить статистику сервера на TCP (см. StreamingServer.stats()).
+        1. host - адрес
+        2. port - порт
+        3. возвращает dict '''
+
+        return await StreamingClient.__get_stats(*(await asyncio.open_connection(host, port)))
+
+
+    def send(self, chunk):
+        ''' Отправить часть аудиоданных (16 бит моно без заголовков, длина может не совпадать с chunk_bytes).
+        1. chunk - байтовая строка '''
+
+        self.__writer.write(chunk)
+
+
+    async def drain(self):
+        ''' Дождаться, пока отправленные данные не будут переданы в сокет. '''
+
+        await self.__writer.drain()
+
+
+    async def receive(self):
+        ''' Получить очередной ответ сервера.
+        1. возвращает tuple из очищенных аудиоданных (байтовая строка), numpy.ndarray float32 с вероятностями наличия голоса,
+            глубины очереди соединения и количества пропусков реального времени или None, если сервер закрыл соединение '''
+
+        try:
+            header = await self.__reader.readexactly(_RESPONSE_HEADER.size)
+        except asyncio.IncompleteReadError as e:
+            if e.partial:
+                raise
+            return None
+        data_size, vad_count, queue_depth, deadline_misses = _RESPONSE_HEADER.unpack(header)
+        denoised_chunk = await self.__reader.readexactly(data_size)
+        vad_probabilities = np.frombuffer(await self.__reader.readexactly(vad_count * 4), dtype='<f4')
+        return denoised_chunk, vad_probabilities, queue_depth, deadline_misses
+
+
+    def close_input(self):
+        ''' Закрыть передачу аудиоданных. '''
+
+        self.__writer.write_eof()
+
+
+    def close(self):
+        ''' Закрыть соединение. '''
+
+        self.__writer.close()
+
+
+    @classmethod
+    async def __open(cls, reader, writer, sample_rate, chunk_ms, vad, voice_prob_threshold, output_format):
+        ''' Согласовать параметры потока с сервером.
+        1. reader - asyncio.StreamReader
+        2. writer - asyncio.StreamWriter
+        3. остальные аргументы - параметры потока
+        4. возвращает объект StreamingClient '''
+
+        request = {'sample_rate': sample_rate, 'chunk_ms': chunk_ms, 'vad': vad, 'voice_prob_threshold': voice_prob_threshold,
+                   'output_format': output_format}
+        response = await cls.__request(reader, writer, request)
+        return cls(reader, writer, response)
+
+
+    @staticmethod
+    async def __get_stats(reader, writer):
+        ''' Запросить статистику сервера и закрыть соединение. '''
+
+        try:
+            return await StreamingClient.__request(reader, writer, {'command': 'stats'})
+        finally:
+            writer.close()
+
+
+    @staticmethod
+    async def __request(reader, writer, request):
+        ''' Отправить строку JSON и получить ответ сервера.
+        1. reader - asyncio.StreamReader
+        2. writer - asyncio.StreamWriter
+        3. request - dict с запросом
+        4. возвращает dict с ответом '''
+
+        writer.write(json.dumps(request).encode('utf-8') + b'\n')
+        await writer.drain()
+        line = await reader.readline()
+        if not line:
+            writer.close()
+            raise ConnectionError('server closed the connection')
+        response = json.loads(line.decode('utf-8'))
+        if response.get('status') != 'ok':
+            writer.close()
+            raise RuntimeError('RNNoise server error: {}'.format(response.get('error')))
+        return response
+
+
+async def _print_stats(server, interval_s):
+    ''' Периодически выводить статистику сервера в stderr.
+    1. server - объект StreamingServer
+    2. interval_s - интервал в секундах '''
+
+    while True:
+        await asyncio.sleep(interval_s)
+        stats = server.stats()
+        sys.stderr.write('[i] Connections: {connections} (total: {connections_total}, rejected: {connections_rejected}), queue depth: ' \
+                         '{queue_depth} (max: {max_queue_depth}), chunks: {chunks}, deadline misses: {deadline_misses}\n'.format(**stats))
+        sys.stderr.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='asyncio real-time streaming denoising server of RNNoise_Wrapper (Unix socket or TCP).')
+    parser.add_argument('-s', '--socket', type=str, default=None,
+                        help='Path to Unix socket to listen on (instead of TCP)')
+    parser.add_argument('--host', type=str, default='127.0.0.1',
+                        help='TCP address to listen on (default: 127.0.0.1)')
+    parser.add_argument('-p', '--port', type=int, default=8765,
+                        help='TCP port to listen on (default: 8765)')
+    parser.add_argument('-l', '--lib', type=str, default=None,
+                        help='Path to RNNoise library or its name/subname (default: RNNOISE_LIB or librnnoise_5h_b_500k)')
+    parser.add_argument('--model', type=str, default=None,
+                        help='Path to RNNoise model weights file (rnnoise-nu format) to use instead of the model built into the library')
+    parser.add_argument('--max_pending', type=int, default=4,
+                        help='Maximum number of chunks of one connection being processed or waiting to be sent (default: 4)')
+    parser.add_argument('--deadline_factor', type=float, default=1.0,
+                        help='A chunk misses its deadline if its result is sent later than this fraction of its duration after ' + \
+                             'receiving it (default: 1.0)')
+    parser.add_argument('--max_connections', type=int, default=None,
+                        help='Maximum number of concurrent connections (default: unlimited)')
+    parser.add_argument('--stats_interval_s', type=float, default=None,
+                        help='Print server statistics to stderr with this interval in seconds')
+
+    args = parser.parse_args()
+
+    server = StreamingServer(args.lib, args.model, args.max_pending, args.deadline_factor, args.max_connections)
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    if args.socket:
+        listening_server = loop.run_until_complete(server.start_unix(args.socket))
+        address = args.socket
+    else:
+        listening_server = loop.run_until_complete(server.start_tcp(args.host, args.port))
+        address = '{}:{}'.format(args.host, args.port)
+    stats_task = None
+    if args.stats_interval_s:
+        stats_task = asyncio.ensure_future(_print_stats(server, args.stats_interval_s))
+
+    print("[i] RNNoise streaming server is listening on '{}' (library '{}', model '{}')".format(address, server.denoiser.f_name_lib,
+                                                                                              server.denoiser.model_path))
+    sys.stdout.flush()
+    try:
+        loop.run_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if stats_task is not None:
+            stats_task.cancel()
+        listening_server.close()
+        loop.run_until_complete(listening_server.wait_closed())
+        loop.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+#       OS : GNU/Linux Ubuntu 16.04 or later
+# LANGUAGE : Python 3.5.2 or later
+#   AUTHOR : Klim V. O.
+# - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+'''
+Выделение фрагментов с речью по вероятностям наличия голоса, которые RNNoise возвращает для каждого фрейма.
+
+Содержит функцию get_speech_segments() и класс TimeMap.
+
+Зависимости: numpy.
+'''
+
+import numpy as np
+
+
+def get_speech_segments(vad_probabilities, threshold=0.5, threshold_off=None, min_speech_frames=10, hangover_frames=20, padding_frames=5):
+    ''' Получить фрагменты с речью по вероятностям наличия голоса во фреймах. Используется гистерезис: фрагмент начинается, когда
+    вероятность достигает threshold, и продолжается, пока вероятность не опустится ниже threshold_off дольше, чем на hangover_frames
+    фреймов. Короткие фрагменты отбрасываются, оставшиеся расширяются на padding_frames с каждой стороны, пересекающиеся объединяются.
+    1. vad_probabilities - numpy.ndarray с вероятностью наличия голоса в каждом фрейме
+    2. threshold - порог вероятности для начала фрагмента
+    3. threshold_off - порог вероятности для продолжения фрагмента (если None - threshold - 0.15)
+    4. min_speech_frames - минимальная длина фрагмента во фреймах (до расширения)
+    5. hangover_frames - количество фреймов ниже threshold_off, после которого фрагмент завершается
+    6. padding_frames - количество фреймов, на которое фрагмент расширяется с каждой стороны
+    7. возвращает numpy.ndarray int64 формы (K, 2) с номерами первого фрейма и фрейма после последнего для каждого фрагмента '''
+
+    if threshold_off is None:
+        threshold_off = max(threshold - 0.15, 0.0)
+
+    vad_probabilities = np.asarray(vad_probabilities)
+    frames_count = vad_probabilities.shape[0]
+    is_speech_start = (vad_probabilities >= threshold).tolist()
+    is_speech_continue = (vad_probabilities >= threshold_off).tolist()
+
+    segments = []
+    start = last_speech = None
+    for i in range(frames_count):
+        if start is None:
+            if is_speech_start[i]:
+                start = last_speech = i
+        elif is_speech_continue[i]:
+            last_speech = i
+        elif i - last_speech > hangover_frames:
+            segments.append((start, last_speech + 1))
+            start = None
+    if start is not None:
+        segments.append((start, last_speech + 1))
+
+    merged_segments = []
+    for start, end in segments:
+        if end - start < min_speech_frames:
+            continue
+        start, end = max(start - padding_frames, 0), min(end + padding_frames, frames_count)
+        if merged_segments and start <= merged_segments[-1][1]:
+            merged_segments[-1][1] = max(merged_segments[-1][1], end)
+        else:
+            merged_segments.append([start, end])
+
+    return np.array(merged_segments, dtype=np.int64).reshape(-1, 2)
+
+
+class TimeMap(object):
+    ''' Соответствие между отсчётами аудиозаписи, из которой оставлены только фрагменты с речью, и временем в исходной аудиозаписи.
+    Хранится компактно: по одной записи на каждый фрагмент.
+    - to_input_time(): получить время в исходной аудиозаписи для отсчётов итоговой аудиозаписи
+    - segments: список фрагментов в виде tuple из начала в итоговой аудиозаписи, начала в исходной аудиозаписи и длительности (в секундах)
+
+    1. output_starts - номера первых отсчётов фрагментов в итоговой аудиозаписи
+    2. input_starts - время начала фрагментов в исходной аудиозаписи в секундах
+    3. lengths - длина фрагментов в отсчётах итоговой аудиозаписи
+    4. sample_rate - частота дискретизации итоговой аудиозаписи '''
+
+    def __init__(self, output_starts, input_starts, lengths, sample_rate):
+        self.output_starts = np.asarray(output_starts, dtype=np.int64)
+        self.input_starts = np.asarray(input_starts, dtype=np.float64)
+        self.lengths = np.asarray(lengths, dtype=np.int64)
+        self.sample_rate = sample_rate
+
+
+    def __len__(self):
+        return self.output_starts.shape[0]
+
+
+    @property
+    def segments(self):
+        return [(output_start / self.sample_rate, input_start, length / self.sample_rate)
+                for output_start, input_start, length in zip(self.output_starts.tolist(), self.input_starts.tolist(), self.lengths.tolist())]
+
+
+    def to_input_time(self, output_samples=None):
+        ''' Получить время в исходной аудиозаписи для отсчётов итоговой аудиозаписи.
+        1. output_samples - номер или numpy.ndarray с номерами отсчётов итоговой аудиозаписи (если None - все отсчёты)
+        2. возвращает время в секундах (число или numpy.ndarray float64) '''
+
+        if output_samples is None:
+            output_samples = np.arange(int(self.lengths.sum()))
+
+        output_samples = np.asarray(output_samples)
+        if self.output_starts.shape[0] == 0:
+            raise ValueError('time map is empty')
+
+        segment_indices = np.clip(np.searchsorted(self.output_starts, output_samples, side='right') - 1, 0, None)
+        return self.input_starts[segment_indices] + (output_samples - self.output_starts[segment_indices]) / self.sample_rate
@@ -0,0 +1,336 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+#       OS : GNU/Linux Ubuntu 16.04 or later
+# LANGUAGE : Python 3.5.2 or later
+#   AUTHOR : Klim V. O.
+# - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+'''
+Чтение и запись .wav аудиозаписей без pydub: разбор заголовка, отображение аудиоданных в память (numpy.memmap), приведение
+отсчётов любого формата (8/16/24/32 бит, float, несколько каналов) к моно за один проход и пошаговая запись с обновлением
+заголовка в конце. Также поддерживается чтение аудиоданных без заголовка (raw PCM) из потока, например, из stdin.
+
+Содержит функции read_wav_info(), read_wav_samples(), open_wav_memmap(), iter_wav_blocks(), get_raw_wav_info(), iter_raw_blocks()
+и to_mono() и класс WavWriter.
+
+Зависимости: numpy.
+'''
+
+import struct
+import collections
+import numpy as np
+
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+# Тип отсчётов в файле для каждого сочетания формата и ширины отсчёта (24-битные отсчёты читаются как тройки байтов)
+_SAMPLES_DTYPES = {(WAVE_FORMAT_PCM, 1): np.dtype('u1'), (WAVE_FORMAT_PCM, 2): np.dtype('<i2'), (WAVE_FORMAT_PCM, 3): np.dtype('u1'),
+                   (WAVE_FORMAT_PCM, 4): np.dtype('<i4'), (WAVE_FORMAT_IEEE_FLOAT, 4): np.dtype('<f4'),
+                   (WAVE_FORMAT_IEEE_FLOAT, 8): np.dtype('<f8')}
+
+# Множитель для приведения отсчётов к шкале 16 бит (24-битные отсчёты перед этим сдвигаются в старшие байты int32)
+_SAMPLES_SCALES = {np.dtype('u1'): 256.0, np.dtype('<i2'): 1.0, np.dtype('<i4'): 1.0 / 65536, np.dtype('<f4'): 32768.0,
+                   np.dtype('<f8'): 32768.0}
+
+
+# Форматы аудиоданных без заголовка (названия как у ffmpeg -f): формат и ширина отсчёта в байтах
+PCM_FORMATS = collections.OrderedDict([('u8', (WAVE_FORMAT_PCM, 1)), ('s16le', (WAVE_FORMAT_PCM, 2)), ('s24le', (WAVE_FORMAT_PCM, 3)),
+                                       ('s32le', (WAVE_FORMAT_PCM, 4)), ('f32le', (WAVE_FORMAT_IEEE_FLOAT, 4)),
+                                       ('f64le', (WAVE_FORMAT_IEEE_FLOAT, 8))])
+
+
+WavInfo = collections.namedtuple('WavInfo', ['sample_rate', 'sample_width', 'channels', 'audio_format', 'data_offset', 'data_size'])
+WavInfo.__doc__ = ''' Параметры .wav аудиозаписи: частота дискретизации, ширина отсчёта в байтах, количество каналов, формат отсчётов
+(WAVE_FORMAT_PCM или WAVE_FORMAT_IEEE_FLOAT), смещение аудиоданных от начала файла и их размер в байтах. '''
+
+
+def _read_chunks(f_wav, f_name_wav):
+    ''' Найти чанки fmt и data в открытом .wav файле.
+    1. f_wav - файловый объект, открытый на чтение в двоичном режиме
+    2. f_name_wav - имя аудиозаписи для сообщений об ошибках
+    3. возвращает tuple из содержимого чанка fmt, смещения аудиоданных от начала файла и их размера в байтах '''
+
+    f_wav.seek(0, 2)
+    file_size = f_wav.tell()
+    f_wav.seek(0)
+
+    riff_header = f_wav.read(12)
+    if len(riff_header) < 12 or riff_header[:4] != b'RIFF' or riff_header[8:12] != b'WAVE':
+        raise ValueError("'{}' is not a RIFF/WAVE file".format(f_name_wav))
+
+    fmt = None
+    while True:
+        chunk_header = f_wav.read(8)
+        if len(chunk_header) < 8:
+            raise ValueError("'{}' has no 'data' chunk".format(f_name_wav))
+        chunk_id, chunk_size = chunk_header[:4], struct.unpack('<I', chunk_header[4:])[0]
+
+        if chunk_id == b'fmt ':
+            fmt = f_wav.read(chunk_size)
+            if chunk_size % 2:
+                f_wav.seek(1, 1)
+        elif chunk_id == b'data':
+            if fmt is None:
+                raise ValueError("'{}' has 'data' chunk before 'fmt ' chunk".format(f_name_wav))
+            data_offset = f_wav.tell()
+            # Размер 0 или 0xFFFFFFFF встречается у .wav, записанных потоково (без обновления заголовка)
+            if chunk_size in (0, 0xFFFFFFFF) or data_offset + chunk_size > file_size:
+                chunk_size = file_size - data_offset
+            return fmt, data_offset, chunk_size
+        else:
+            f_wav.seek(chunk_size + chunk_size % 2, 1)
+
+
+def read_wav_info(f_name_wav):
+    ''' Прочитать и разобрать заголовок .wav аудиозаписи (чанки fmt и data), не загружая аудиоданные.
+    1. f_name_wav - имя .wav аудиозаписи или файловый объект, открытый на чтение в двоичном режиме (например, BytesIO)
+    2. возвращает WavInfo '''
+
+    if isinstance(f_name_wav, str):
+        with open(f_name_wav, 'rb') as f_wav:
+            fmt, data_offset, chunk_size = _read_chunks(f_wav, f_name_wav)
+    else:
+        fmt, data_offset, chunk_size = _read_chunks(f_name_wav, type(f_name_wav).__name__)
+
+    audio_format, channels, sample_rate, byte_rate, block_align, bits_per_sample = struct.unpack('<HHIIHH', fmt[:16])
+    if audio_format == WAVE_FORMAT_EXTENSIBLE and len(fmt) >= 26:
+        audio_format = struct.unpack('<H', fmt[24:26])[0]
+    if audio_format not in (WAVE_FORMAT_PCM, WAVE_FORMAT_IEEE_FLOAT):
+        raise ValueError("'{}' has unsupported audio format 0x{:04x}".format(f_name_wav, audio_format))
+
+    sample_width = block_align // channels
+    if (audio_format, sample_width) not in _SAMPLES_DTYPES:
+        raise ValueError("'{}' has unsupported sample width {} bit".format(f_name_wav, sample_width * 8))
+
+    data_size = chunk_size - chunk_size % block_align
+    return WavInfo(sample_rate, sample_width, channels, audio_format, data_offset, data_size)
+
+
+def _get_samples_shape(wav_info, frames_count):
+    ''' Получить форму массива с отсчётами в файле: (количество отсчётов, количество каналов), для 24 бит - с дополнительной
+    осью из 3 байтов. '''
+
+    if wav_info.sample_width == 3:
+        return (frames_count, wav_info.channels, 3)
+    return (frames_count, wav_info.channels)
+
+
+def open_wav_memmap(f_name_wav):
+    ''' Отобразить аудиоданные .wav аудиозаписи в память без загрузки (numpy.memmap только для чтения). Расход памяти
+    не зависит от длины аудиозаписи: страницы файла подгружаются операционной системой по мере обращения к ним.
+    1. f_name_wav - имя .wav аудиозаписи
+    2. возвращает tuple из WavInfo и numpy.memmap с отсчётами в формате файла формы (количество отсчётов, количество каналов)
+        (для 24 бит - uint8 формы (количество отсчётов, количество каналов, 3), привести к моно можно с помощью to_mono()) '''
+
+    wav_info = read_wav_info(f_name_wav)
+    dtype = _SAMPLES_DTYPES[(wav_info.audio_format, wav_info.sample_width)]
+    frames_count = wav_info.data_size // (wav_info.sample_width * wav_info.channels)
+    if frames_count == 0:
+        return wav_info, np.zeros(_get_samples_shape(wav_info, 0), dtype=dtype)
+
+    samples = np.memmap(f_name_wav, dtype=dtype, mode='r', offset=wav_info.data_offset, shape=_get_samples_shape(wav_info, frames_count))
+    return wav_info, samples
+
+
+def iter_wav_blocks(f_name_wav, block_size):
+    ''' Последовательно отображать в память блоки аудиоданных .wav аудиозаписи. Каждый блок - отдельный numpy.memmap,
+    который освобождается (вместе с прочитанными страницами файла) после перехода к следующему блоку, поэтому расход памяти
+    процесса не растёт с длиной аудиозаписи.
+    1. f_name_wav - имя .wav аудиозаписи
+    2. block_size - количество отсчётов (на канал) в блоке
+    3. возвращает генератор numpy.memmap с отсчётами в формате файла (см. open_wav_memmap()) '''
+
+    wav_info = read_wav_info(f_name_wav)
+    dtype = _SAMPLES_DTYPES[(wav_info.audio_format, wav_info.sample_width)]
+    block_align = wav_info.sample_width * wav_info.channels
+    frames_count = wav_info.data_size // block_align
+    for block_start in range(0, frames_count, block_size):
+        block_frames_count = min(block_size, frames_count - block_start)
+        yield np.memmap(f_name_wav, dtype=dtype, mode='r', offset=wav_info.data_offset + block_start * block_align,
+                        shape=_get_samples_shape(wav_info, block_frames_count))
+
+
+def get_raw_wav_info(sample_rate, pcm_format='s16le', channels=1):
+    ''' Получить параметры аудиоданных без заголовка (raw PCM) в виде WavInfo (для iter_raw_blocks() и to_mono()).
+    1. sample_rate - частота дискретизации
+    2. pcm_format - формат отсчётов (один из PCM_FORMATS)
+    3. channels - количество каналов
+    4. возвращает WavInfo с нулевыми смещением и размером аудиоданных '''
+
+    if pcm_format not in PCM_FORMATS:
+        raise ValueError("unsupported 'pcm_format' {!r}, supported: {}".format(pcm_format, ', '.join(PCM_FORMATS)))
+    if sample_rate <= 0 or channels < 1:
+        raise ValueError("'sample_rate' and 'channels' must be greater than 0")
+
+    audio_format, sample_width = PCM_FORMATS[pcm_format]
+    return WavInfo(sample_rate, sample_width, channels, audio_format, 0, 0)
+
+
+def iter_raw_blocks(f_raw, wav_info, block_size):
+    ''' Последовательно читать блоки аудиоданных без заголовка (raw PCM) из двоичного потока (например, sys.stdin.buffer) в один
+    переиспользуемый буфер. Если поток поддерживает readinto1(), блок возвращается, как только в потоке есть хотя бы один целый
+    отсчёт всех каналов, не дожидаясь заполнения буфера, поэтому задержка не превышает длительности block_size. Неполный отсчёт
+    в конце части переносится в начало буфера, неполный отсчёт в конце потока отбрасывается.
+    1. f_raw - двоичный поток с методом readinto()
+    2. wav_info - параметры аудиоданных (см. get_raw_wav_info())
+    3. block_size - максимальное количество отсчётов (на канал) в блоке
+    4. возвращает генератор numpy.ndarray с отсчётами в формате потока (см. open_wav_memmap()). Каждый блок - представление буфера,
+        которое действительно только до перехода к следующему блоку '''
+
+    dtype = _SAMPLES_DTYPES[(wav_info.audio_format, wav_info.sample_width)]
+    block_align = wav_info.sample_width * wav_info.channels
+    raw_buffer = bytearray(max(block_size, 1) * block_align)
+    raw_view = memoryview(raw_buffer)
+    readinto = getattr(f_raw, 'readinto1', None) or f_raw.readinto
+
+    buffer_size = 0
+    while True:
+        read_size = readinto(raw_view[buffer_size:])
+        if not read_size:
+            return
+        buffer_size += read_size
+
+        frames_count = buffer_size // block_align
+        if frames_count == 0:
+            continue
+        data_size = frames_count * block_align
+        yield np.frombuffer(raw_buffer, dtype=dtype, count=data_size // dtype.itemsize).reshape(_get_samples_shape(wav_info, frames_count))
+
+        buffer_size -= data_size
+        raw_view[:buffer_size] = raw_view[data_size:data_size+buffer_size]
+
+
+def read_wav_samples(f_name_wav):
+    ''' Загрузить .wav аудиозапись любого поддерживаемого формата и привести её к моно в шкале 16 бит (см. to_mono()). Аудиоданные
+    читаются из файла одним вызовом read(), и если аудиозапись уже 16 бит моно - возвращается представление прочитанного буфера
+    без копирования и преобразований.
+    1. f_name_wav - имя .wav аудиозаписи или файловый объект, открытый на чтение в двоичном режиме (например, BytesIO)
+    2. возвращает tuple из WavInfo и одномерного numpy.ndarray int16 или float32 с отсчётами '''
+
+    if isinstance(f_name_wav, str):
+        with open(f_name_wav, 'rb') as f_wav:
+            return read_wav_samples(f_wav)
+
+    wav_info = read_wav_info(f_name_wav)
+    f_name_wav.seek(wav_info.data_offset)
+    audio_bytes = f_name_wav.read(wav_info.data_size)
+
+    frames_count = len(audio_bytes) // (wav_info.sample_width * wav_info.channels)
+    samples_shape = _get_samples_shape(wav_info, frames_count)
+    samples = np.frombuffer(audio_bytes, dtype=_SAMPLES_DTYPES[(wav_info.audio_format, wav_info.sample_width)],
+                            count=int(np.prod(samples_shape))).reshape(samples_shape)
+    return wav_info, to_mono(samples, wav_info)
+
+
+def to_mono(samples, wav_info):
+    ''' Привести отсчёты .wav аудиозаписи к моно в шкале 16 бит: приведение к float32, сложение каналов и масштабирование
+    выполняются векторно на месте в одном буфере, без промежуточных копий всей многоканальной аудиозаписи (в отличие от цепочки
+    set_sample_width() и set_channels() в pydub). 16 бит моно возвращается без копирования.
+    1. samples - numpy.ndarray с отсчётами в формате файла (см. open_wav_memmap())
+    2. wav_info - WavInfo аудиозаписи
+    3. возвращает одномерный numpy.ndarray: int16 (представление samples) для 16 бит моно, иначе float32 '''
+
+    channels = wav_info.channels
+    if samples.dtype == np.int16 and channels == 1:
+        return samples[:, 0]
+
+    if wav_info.sample_width == 3:
+        # 3 байта отсчёта записываются в старшие байты int32, т.е. 24-битный отсчёт становится 32-битным (со знаком)
+        widened_samples = np.zeros(samples.shape[:2] + (4,), dtype=np.uint8)
+        widened_samples[:, :, 1:] = samples
+        samples = widened_samples.view('<i4')[:, :, 0]
+
+    # Каналы накапливаются на месте в одном буфере float32 (сложение по оси каналов через np.add.reduce в несколько раз медленнее)
+    mono_samples = samples[:, 0].astype(np.float32)
+    for channel in range(1, channels):
+        mono_samples += samples[:, channel]
+
+    scale = _SAMPLES_SCALES[samples.dtype] / channels
+    if scale != 1.0:
+        mono_samples *= np.float32(scale)
+
+    # 8-битные отсчёты хранятся без знака со смещением 128
+    if samples.dtype == np.uint8:
+        mono_samples -= np.float32(32768.0)
+    return mono_samples
+
+
+class WavWriter(object):
+    ''' Пошаговая запись .wav аудиозаписи (PCM). Заголовок записывается сразу с нулевыми размерами, аудиоданные дописываются
+    по мере поступления, а при закрытии размеры в заголовке обновляются. Вся аудиозапись в памяти не хранится.
+    - write(): дописать аудиоданные
+    - close(): обновить заголовок и закрыть файл
+
+    1. f_name_wav - имя .wav аудиозаписи или файловый объект, открытый на запись в двоичном режиме (с поддержкой seek())
+    2. sample_rate - частота дискретизации
+    3. sample_width - ширина отсчёта в байтах
+    4. channels - количество каналов '''
+
+    def __init__(self, f_name_wav, sample_rate, sample_width=2, channels=1):
+        self.sample_rate = sample_rate
+        self.sample_width = sample_width
+        self.channels = channels
+        self.data_size = 0
+
+        if isinstance(f_name_wav, str):
+            self.__f_wav = open(f_name_wav, 'wb')
+            self.__is_own_file = True
+        else:
+            self.__f_wav = f_name_wav
+            self.__is_own_file = False
+
+        self.__header_offset = self.__f_wav.tell()
+        self.__f_wav.write(self.__get_header(0))
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+    def __get_header(self, data_size):
+        ''' Сформировать 44-байтный заголовок .wav PCM. Размеры больше 4 ГБ ограничиваются максимальным значением.
+        1. data_size - размер аудиоданных в байтах
+        2. возвращает байтовую строку с заголовком '''
+
+        block_align = self.sample_width * self.channels
+        riff_size = min(36 + data_size + data_size % 2, 0xFFFFFFFF)
+        return b'RIFF' + struct.pack('<I', riff_size) + b'WAVE' + \
+               b'fmt ' + struct.pack('<IHHIIHH', 16, WAVE_FORMAT_PCM, self.channels, self.sample_rate, self.sample_rate * block_align,
+                                     block_align, self.sample_width * 8) + \
+               b'data' + struct.pack('<I', min(data_size, 0xFFFFFFFF))
+
+
+    def write(self, audio_data):
+        ''' Дописать аудиоданные в конец .wav аудиозаписи.
+        1. audio_data - байтовая строка с аудиоданными (без заголовков wav) или numpy.ndarray с отсчётами в формате аудиозаписи '''
+
+        if isinstance(audio_data, np.ndarray):
+            audio_data = memoryview(np.ascontiguousarray(audio_data)).cast('B')
+        self.__f_wav.write(audio_data)
+        self.data_size += len(audio_data)
+
+
+    def close(self):
+        ''' Обновить размеры в заголовке и закрыть файл (файловый объект, переданный при создании, не закрывается). '''
+
+        if self.__f_wav is None:
+            return
+
+        if self.data_size % 2:
+            self.__f_wav.write(b'\x00')
+        end_offset = self.__f_wav.tell()
+        self.__f_wav.seek(self.__header_offset)
+        self.__f_wav.write(self.__get_header(self.data_size))
+        self.__f_wav.seek(end_offset)
+
+        if self.__is_own_file:
+            self.__f_wav.close()
+        self.__f_wav = None
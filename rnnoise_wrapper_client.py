@@ -0,0 +1,280 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+#       OS : GNU/Linux Ubuntu 16.04 or later
+# LANGUAGE : Python 3.8 or later
+#   AUTHOR : Klim V. O.
+# - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+'''
+Тонкий клиент локального демона шумоподавления (см. rnnoise_wrapper.daemon). Модуль намеренно находится вне пакета rnnoise_wrapper
+и использует только стандартную библиотеку: запуск клиента не импортирует numpy и pydub и не загружает библиотеку RNNoise, поэтому
+вызов клиента для каждой аудиозаписи почти ничего не стоит.
+
+Протокол: по Unix-сокету передаются сообщения JSON, перед каждым - его длина (4 байта, big-endian). На одном соединении можно
+выполнить несколько запросов подряд. Аудиоданные передаются не через сокет, а через multiprocessing.shared_memory.
+
+Содержит класс DaemonClient, функции протокола send_message() и recv_message() и CLI клиента (функция main()).
+
+Зависимости: нет (для DaemonClient.filter() - numpy).
+'''
+
+import os
+import sys
+import json
+import time
+import socket
+import struct
+import argparse
+
+
+# Переменная окружения с путём к сокету демона и путь по умолчанию
+DAEMON_SOCKET_ENV = 'RNNOISE_DAEMON_SOCKET'
+DEFAULT_DAEMON_SOCKET = '/tmp/rnnoise_wrapper.sock'
+
+# Заголовок сообщения протокола (длина JSON в байтах) и максимальный размер сообщения
+_MESSAGE_HEADER = struct.Struct('>I')
+MAX_MESSAGE_SIZE = 1024**2
+
+
+def get_socket_path(socket_path=None):
+    ''' Получить путь к сокету демона.
+    1. socket_path - путь к сокету (если None - из переменной окружения RNNOISE_DAEMON_SOCKET или DEFAULT_DAEMON_SOCKET)
+    2. возвращает абсолютный путь к сокету '''
+
+    return os.path.abspath(socket_path or os.environ.get(DAEMON_SOCKET_ENV) or DEFAULT_DAEMON_SOCKET)
+
+
+def send_message(sock, message):
+    ''' Отправить сообщение протокола.
+    1. sock - подключённый socket.socket
+    2. message - dict, сериализуемый в JSON '''
+
+    data = json.dumps(message).encode('utf-8')
+    if len(data) > MAX_MESSAGE_SIZE:
+        raise ValueError('message size is {} bytes, maximum is {}'.format(len(data), MAX_MESSAGE_SIZE))
+    sock.sendall(_MESSAGE_HEADER.pack(len(data)) + data)
+
+
+def recv_message(sock):
+    ''' Получить сообщение протокола.
+    1. sock - подключённый socket.socket
+    2. возвращает dict или None, если соединение закрыто до начала сообщения '''
+
+    header = _recv_exactly(sock, _MESSAGE_HEADER.size)
+    if header is None:
+        return None
+    message_size = _MESSAGE_HEADER.unpack(header)[0]
+    if message_size > MAX_MESSAGE_SIZE:
+        raise ValueError('message size is {} bytes, maximum is {}'.format(message_size, MAX_MESSAGE_SIZE))
+
+    data = _recv_exactly(sock, message_size) if message_size > 0 else b''
+    if data is None:
+        raise ConnectionError('connection closed in the middle of a message')
+    return json.loads(data.decode('utf-8'))
+
+
+def _recv_exactly(sock, size):
+    ''' Прочитать из сокета ровно size байт.
+    1. sock - подключённый socket.socket
+    2. size - количество байт
+    3. возвращает bytes или None, если соединение закрыто до получения первого байта '''
+
+    buffer = bytearray()
+    while len(buffer) < size:
+        chunk = sock.recv(size - len(buffer))
+        if not chunk:
+            if buffer:
+                raise ConnectionError('connection closed in the middle of a message')
+            return None
+        buffer += chunk
+    return bytes(buffer)
+
+
+class DaemonClient(object):
+    ''' Клиент локального демона шумоподавления (см. rnnoise_wrapper.daemon.DenoiseDaemon):
+    - filter_file(): очистить от шума .wav аудиозапись (файлы читает и пишет демон)
+    - filter(): очистить от шума отсчёты, переданные через разделяемую память
+    - ping(): проверить, что демон работает (возвращает PID обработчика, библиотеку и файл весов модели)
+    - reload(): перезагрузить демон (заново найти и загрузить библиотеку RNNoise и модель)
+
+    Соединение с демоном открывается при первом запросе и используется для последующих. Если обработчик закрыл соединение между
+    запросами (например, при перезагрузке демона), запрос повторяется в новом соединении.
+
+    1. socket_path - путь к сокету демона (см. get_socket_path())
+    2. timeout - максимальное время ожидания ответа в секундах (если None - ждать бесконечно) '''
+
+    def __init__(self, socket_path=None, timeout=None):
+        self.socket_path = get_socket_path(socket_path)
+        self.timeout = timeout
+        self.__sock = None
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+    def close(self):
+        ''' Закрыть соединение с демоном (повторные вызовы ничего не делают). '''
+
+        sock, self.__sock = self.__sock, None
+        if sock is not None:
+            sock.close()
+
+
+    def ping(self):
+        ''' Проверить, что демон работает.
+        1. возвращает dict с PID обработчика ('pid'), путём к библиотеке ('lib') и к файлу весов модели ('model') '''
+
+        response = self.__request({'command': 'ping'})
+        return {'pid': response['pid'], 'lib': response['lib'], 'model': response['model']}
+
+
+    def reload(self):
+        ''' Перезагрузить демон: процессы-обработчики завершают текущие задания, а демон перезапускается с тем же сокетом
+        (без потери входящих соединений), заново находя и загружая библиотеку RNNoise и файл весов модели. '''
+
+        self.__request({'command': 'reload'})
+
+
+    def filter_file(self, f_name_wav, f_name_denoised_wav, voice_prob_threshold=0.0, save_source_sample_rate=True):
+        ''' Очистить .wav аудиозапись от шума (см. RNNoise.filter_file()). Аудиозапись читает и результат пишет процесс-обработчик
+        демона, поэтому оба файла должны быть доступны ему по тем же путям.
+        1. f_name_wav - имя исходной .wav аудиозаписи
+        2. f_name_denoised_wav - имя .wav аудиозаписи для результата
+        3. voice_prob_threshold - порог вероятности наличия голоса в каждом фрейме (значение от 0 до 1, если 0 - использовать все фреймы)
+        4. save_source_sample_rate - True: сохранять результат в исходной частоте дискретизации, False - в 48 кГц
+        5. возвращает длину исходной аудиозаписи в секундах '''
+
+        response = self.__request({'command': 'filter_file', 'source': os.path.abspath(f_name_wav),
+                                   'denoised': os.path.abspath(f_name_denoised_wav), 'voice_prob_threshold': voice_prob_threshold,
+                                   'save_source_sample_rate': save_source_sample_rate})
+        return response['audio_length']
+
+
+    def filter(self, samples, sample_rate, voice_prob_threshold=0.0, float_output=False):
+        ''' Очистить отсчёты от шума (см. RNNoise.filter()). Отсчёты и результат передаются через один сегмент разделяемой памяти,
+        который создаёт и удаляет клиент, а через сокет передаются только параметры задания. Аудиозапись обрабатывается
+        со сброшенным состоянием нейронной сети.
+        1. samples - моно отсчёты: numpy.ndarray int16 или float (значения от -1 до 1) или байтовая строка с 16 битными отсчётами
+        2. sample_rate - частота дискретизации (результат возвращается в ней же)
+        3. voice_prob_threshold - порог вероятности наличия голоса в каждом фрейме (значение от 0 до 1, если 0 - использовать все фреймы)
+        4. float_output - True: вернуть numpy.ndarray float32 (значения от -1 до 1), иначе - numpy.ndarray int16
+        5. возвращает numpy.ndarray с очищенными отсчётами '''
+
+        import numpy as np
+        from multiprocessing import shared_memory
+
+        if isinstance(samples, np.ndarray):
+            if samples.dtype.kind == 'f':
+                samples = samples.astype(np.float32, copy=False)
+            elif samples.dtype != np.int16:
+                raise TypeError("unsupported samples dtype '{}', expected int16 or float".format(samples.dtype))
+        else:
+            samples = np.frombuffer(samples, dtype=np.int16)
+        samples = samples.reshape(-1)
+
+        # Результат пишется поверх исходных отсчётов и может быть длиннее них на дополнение последнего фрейма (до 10 мс)
+        output_dtype = np.dtype(np.float32 if float_output else np.int16)
+        output_capacity = (samples.shape[0] + sample_rate // 100 + 16) * output_dtype.itemsize
+        shm = shared_memory.SharedMemory(create=True, size=max(samples.nbytes, output_capacity))
+        try:
+            np.ndarray(samples.shape, samples.dtype, shm.buf)[:] = samples
+            response = self.__request({'command': 'filter', 'shm': shm.name, 'samples': samples.shape[0], 'dtype': samples.dtype.name,
+                                       'sample_rate': sample_rate, 'voice_prob_threshold': voice_prob_threshold,
+                                       'float_output': float_output})
+            return np.ndarray(response['samples'], output_dtype, shm.buf).copy()
+        finally:
+            shm.close()
+            shm.unlink()
+
+
+    def __request(self, message):
+        ''' Выполнить запрос к демону.
+        1. message - dict с запросом
+        2. возвращает dict с ответом '''
+
+        is_new_connection = self.__sock is None
+        if is_new_connection:
+            self.__sock = self.__connect()
+
+        try:
+            send_message(self.__sock, message)
+            response = recv_message(self.__sock)
+        except (BrokenPipeError, ConnectionResetError):
+            response = None
+        except Exception:
+            self.close()
+            raise
+
+        if response is None:
+            # Обработчик закрывает соединение только между запросами, поэтому этот запрос не был выполнен и его можно повторить
+            self.close()
+            if is_new_connection:
+                raise ConnectionError("RNNoise daemon on '{}' closed the connection".format(self.socket_path))
+            return self.__request(message)
+
+        if response.get('status') != 'ok':
+            raise RuntimeError("RNNoise daemon error: {}".format(response.get('error')))
+        return response
+
+
+    def __connect(self):
+        ''' Подключиться к сокету демона.
+        1. возвращает socket.socket '''
+
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.socket_path)
+        except Exception:
+            sock.close()
+            raise
+        return sock
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Thin client for the local RNNoise_Wrapper denoising daemon (see rnnoise_wrapper_daemon).')
+    parser.add_argument('-i', '--source_audio', type=str, default=None,
+                        help='Name .wav audio for noise reduction (for example, "test_audio/source/test_3.wav")')
+    parser.add_argument('-o', '--denoised_audio', type=str, default=None,
+                        help='Name .wav audio for result (for example, "test_audio/test_3_denoised.wav")')
+    parser.add_argument('-s', '--socket', type=str, default=None,
+                        help='Path to daemon Unix socket (default: {} or {})'.format(DAEMON_SOCKET_ENV, DEFAULT_DAEMON_SOCKET))
+    parser.add_argument('-t', '--voice_prob_threshold', type=float, default=0.0,
+                        help='Remove frames with voice probability below this threshold (from 0 to 1, default: 0 - keep all frames)')
+    parser.add_argument('--timeout', type=float, default=None,
+                        help='Maximum time to wait for the daemon response in seconds (default: wait forever)')
+    parser.add_argument('--ping', action='store_true',
+                        help='Check that the daemon is running and print its library and model')
+    parser.add_argument('--reload', action='store_true',
+                        help='Reload the daemon: workers finish current jobs, RNNoise library and model are loaded again')
+
+    if len(sys.argv) < 2:
+        parser.print_help()
+        sys.exit(1)
+
+    args = parser.parse_args()
+    if not args.ping and not args.reload and (not args.source_audio or not args.denoised_audio):
+        parser.error("the arguments -i/--source_audio and -o/--denoised_audio are required")
+
+    with DaemonClient(args.socket, args.timeout) as client:
+        if args.ping:
+            print('[i] Daemon worker {pid} uses library {lib!r}, model {model!r}'.format(**client.ping()))
+        if args.reload:
+            client.reload()
+            print("[i] Daemon on '{}' is reloading".format(client.socket_path))
+        if args.source_audio:
+            start_time = time.time()
+            audio_length = client.filter_file(args.source_audio, args.denoised_audio, args.voice_prob_threshold)
+            elapsed_time = time.time() - start_time
+            print('[i] Audio length: {:.2f} s, processing time: {:.2f} s, processing speed: {:.1f} RT'.format(
+                audio_length, elapsed_time, audio_length/elapsed_time))
+
+
+if __name__ == '__main__':
+    main()
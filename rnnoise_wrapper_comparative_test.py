@@ -29,7 +29,7 @@ if is_whl_test:
             del sys.path[i]
             break
 
-from rnnoise_wrapper import RNNoise
+from rnnoise_wrapper import RNNoise, RNNoiseStream
 
 
 def calculate_melspectrogram(audio_data, sample_rate, figure, axis):
@@ -108,16 +108,13 @@ def denoise(f_name_source_audio, f_name_denoised_audio, denoiser_obj, buffer_siz
 
     start_time = time.time()
     elapsed_time_per_buffer = []
+    stream = RNNoiseStream(denoiser_obj, sample_rate=sample_rate)
 
-    for i in range(buffer_size_b, len(audio_b), buffer_size_b):
+    for i in range(0, len(audio_b), buffer_size_b):
         time_per_frame = time.time()
-        denoised_audio_b += denoiser_obj.filter(audio_b[i-buffer_size_b:i], sample_rate=sample_rate)
-        elapsed_time_per_buffer.append(time.time() - time_per_frame)
-
-    if len(audio) % buffer_size_b != 0:
-        time_per_frame = time.time()
-        denoised_audio_b += denoiser_obj.filter(audio_b[len(audio_b)-(len(audio_b)%buffer_size_b):], sample_rate=sample_rate)
+        denoised_audio_b += stream.push(audio_b[i:i+buffer_size_b])
         elapsed_time_per_buffer.append(time.time() - time_per_frame)
+    denoised_audio_b += stream.flush()
 
     elapsed_time = time.time() - start_time
     average_elapsed_time_per_buffer = sum(elapsed_time_per_buffer) / len(elapsed_time_per_buffer)
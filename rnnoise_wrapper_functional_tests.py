@@ -12,7 +12,16 @@ Functional tests for RNNoise_Wrapper.
 
 import os
 import sys
+import json
 import time
+import signal
+import shutil
+import asyncio
+import hashlib
+import tempfile
+import subprocess
+import tracemalloc
+import numpy as np
 
 is_whl_test = False
 if is_whl_test:
@@ -21,7 +30,441 @@ if is_whl_test:
             del sys.path[i]
             break
 
-from rnnoise_wrapper import RNNoise
+from rnnoise_wrapper import RNNoise, RNNoiseStream, DenoiserPool, ChunkedRNNoise
+from rnnoise_wrapper.resampler import Resampler, resample
+from rnnoise_wrapper.cache import DenoiseCache
+from rnnoise_wrapper.server import StreamingServer, StreamingClient
+from rnnoise_wrapper_client import DaemonClient
+
+
+def test_resampler():
+    ''' Resampler: output length, chunked processing equal to whole-signal processing and bounded peak memory. '''
+
+    samples = (np.random.default_rng(0).standard_normal(60*48000) * 3000).astype(np.int16)
+    is_ok = True
+    for target_sample_rate in [8000, 16000, 44100]:
+        tracemalloc.start()
+        resampled_samples = resample(samples, 48000, target_sample_rate)
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        resampler = Resampler(48000, target_sample_rate)
+        chunks = [resampler.process(samples[i:i+4321]) for i in range(0, samples.shape[0], 4321)]
+        chunked_resampled_samples = np.concatenate(chunks + [resampler.flush()])
+
+        expected_length = -(-samples.shape[0] * target_sample_rate // 48000)
+        max_difference = np.abs(resampled_samples - chunked_resampled_samples).max()
+        print('Resampler 48000 -> {} Hz, 60 s:'.format(target_sample_rate))
+        print('	output length           {} (expected {})'.format(resampled_samples.shape[0], expected_length))
+        print('	chunked max difference  {:.6f}'.format(max_difference))
+        print('	peak memory             {:.1f} MB (input {:.1f} MB)'.format(peak_memory/2**20, samples.nbytes/2**20))
+
+        # Peak memory: float32 copies of the input and buffer plus the output, but not a matrix of all filter windows
+        is_ok = is_ok and resampled_samples.shape[0] == expected_length and chunked_resampled_samples.shape[0] == expected_length \
+                      and max_difference < 0.01 and peak_memory < 16 * samples.nbytes
+    if is_ok:
+        print('OK\n')
+    return is_ok
+
+
+def test_pool(denoiser, audio):
+    ''' DenoiserPool: filter_batch() gives the same result as filter() with reset state, releasing a denoiser twice is rejected. '''
+
+    clips = [audio[:2000].raw_data, audio[2000:].raw_data]
+    denoised_clips = []
+    for clip in clips:
+        denoiser.reset()
+        denoised_clips.append(denoiser.filter(clip, sample_rate=audio.frame_rate))
+
+    pool = DenoiserPool(size=2)
+    pool_denoised_clips = pool.filter_batch(clips, sample_rate=audio.frame_rate)
+
+    pool_denoiser = pool.acquire()
+    pool.release(pool_denoiser)
+    try:
+        pool.release(pool_denoiser)
+        is_double_release_rejected = False
+    except ValueError:
+        is_double_release_rejected = True
+    acquired_denoisers = [pool.acquire(timeout=1) for _ in range(pool.size)]
+    is_pool_complete = len(set(map(id, acquired_denoisers))) == pool.size
+
+    print('DenoiserPool, {} clips:'.format(len(clips)))
+    print('	filter_batch() equal to filter()  {}'.format(pool_denoised_clips == denoised_clips))
+    print('	double release is rejected        {}'.format(is_double_release_rejected))
+    print('	pool keeps distinct denoisers     {}'.format(is_pool_complete))
+
+    is_ok = pool_denoised_clips == denoised_clips and is_double_release_rejected and is_pool_complete
+    if is_ok:
+        print('OK\n')
+    return is_ok
+
+
+def test_stream(denoiser, audio):
+    ''' RNNoiseStream: chunks of arbitrary length (int16 bytes and float32) give the same result as filter() of the whole audio. '''
+
+    samples = np.frombuffer(audio.raw_data, dtype=np.int16)
+    chunk_size = 333
+
+    denoiser.reset()
+    denoised_samples = np.frombuffer(denoiser.filter(audio.raw_data, sample_rate=audio.frame_rate), dtype=np.int16).astype(np.int32)
+
+    denoiser.reset()
+    stream = RNNoiseStream(denoiser, audio.frame_rate)
+    stream_denoised_audio = b''.join(stream.push(samples[i:i+chunk_size].tobytes()) for i in range(0, samples.shape[0], chunk_size))
+    stream_denoised_audio += stream.flush()
+    stream_denoised_samples = np.frombuffer(stream_denoised_audio, dtype=np.int16).astype(np.int32)
+
+    denoiser.reset()
+    stream = RNNoiseStream(denoiser, audio.frame_rate, float_output=True)
+    float_samples = samples.astype(np.float32) / 32768
+    float_chunks = [stream.push(float_samples[i:i+chunk_size]) for i in range(0, float_samples.shape[0], chunk_size)]
+    float_denoised_samples = np.concatenate(float_chunks + [stream.flush()]) * 32768
+
+    # filter() pads the last frame with zeros, the stream returns exactly the length of the input
+    max_difference = np.abs(denoised_samples[:samples.shape[0]] - stream_denoised_samples).max()
+    float_max_difference = np.abs(float_denoised_samples - stream_denoised_samples).max()
+    print('RNNoiseStream, chunks of {} samples:'.format(chunk_size))
+    print('	output length                  {} (input {})'.format(stream_denoised_samples.shape[0], samples.shape[0]))
+    print('	max difference with filter()   {}'.format(max_difference))
+    print('	max difference of float32 I/O  {:.2f}'.format(float_max_difference))
+
+    is_ok = stream_denoised_samples.shape[0] == samples.shape[0] and float_denoised_samples.shape[0] == samples.shape[0] \
+            and max_difference <= 2 and float_max_difference <= 2
+    if is_ok:
+        print('OK\n')
+    return is_ok
+
+
+def test_cache(denoiser, audio):
+    ''' DenoiseCache: the second call is taken from cache with the same result, size matches the entries on disk. '''
+
+    cache_folder_name = tempfile.mkdtemp()
+    try:
+        cache = DenoiseCache(cache_folder_name)
+        denoised_audio = cache.filter(denoiser, audio.raw_data, sample_rate=audio.frame_rate)
+        cached_denoised_audio = cache.filter(denoiser, audio.raw_data, sample_rate=audio.frame_rate)
+
+        # The same key stored again (e.g. by two writers at once) must not be counted twice
+        f_name_temp = cache.get_temp_path()
+        with open(f_name_temp, 'wb') as f_temp:
+            f_temp.write(denoised_audio)
+        key = cache.get_key(denoiser, hashlib.sha256(audio.raw_data), 'test')
+        cache.put(key, f_name_temp)
+        f_name_temp = cache.get_temp_path()
+        with open(f_name_temp, 'wb') as f_temp:
+            f_temp.write(denoised_audio)
+        cache.put(key, f_name_temp)
+
+        size_on_disk = sum(os.path.getsize(os.path.join(folder_name, f_name)) for folder_name, _, f_names in os.walk(cache_folder_name)
+                           for f_name in f_names)
+    finally:
+        shutil.rmtree(cache_folder_name)
+
+    print('DenoiseCache:')
+    print('	hits / misses           {} / {}'.format(cache.hits, cache.misses))
+    print('	cached result is equal  {}'.format(cached_denoised_audio == denoised_audio))
+    print('	size                    {} (on disk {})'.format(cache.size, size_on_disk))
+
+    is_ok = cache.hits == 1 and cache.misses == 1 and cached_denoised_audio == denoised_audio and cache.size == size_on_disk
+    if is_ok:
+        print('OK\n')
+    return is_ok
+
+
+def test_bypass(denoiser, audio):
+    ''' AdaptiveBypass: digital silence is skipped and gives silence, the rest of the audio is denoised as without bypass, cache
+    keys differ with and without bypass. '''
+
+    samples = np.frombuffer(audio.raw_data, dtype=np.int16)
+    silence_start = samples.shape[0] // 2 // denoiser.frame_size * denoiser.frame_size
+    silence_length = 2 * denoiser.sample_rate
+    samples = np.concatenate((samples[:silence_start], np.zeros(silence_length, dtype=np.int16), samples[silence_start:]))
+    silence_end = silence_start + silence_length
+
+    denoiser.reset()
+    denoised_samples = np.frombuffer(denoiser.filter(samples.tobytes(), denoiser.sample_rate), dtype=np.int16).astype(np.int32)
+
+    bypass_denoiser = denoiser.spawn()
+    bypass = bypass_denoiser.enable_bypass()
+    bypass_denoised_samples = np.frombuffer(bypass_denoiser.filter(samples.tobytes(), denoiser.sample_rate), dtype=np.int16).astype(np.int32)
+
+    # Context frames at the start of silence and 100 ms after it are processed by RNNoise and may differ slightly
+    context_length = (bypass.context_frames + 1) * denoiser.frame_size
+    max_difference_before = np.abs(denoised_samples[:silence_start] - bypass_denoised_samples[:silence_start]).max()
+    max_silence_sample = np.abs(bypass_denoised_samples[silence_start+context_length:silence_end]).max()
+    max_difference_after = np.abs(denoised_samples[silence_end+4800:samples.shape[0]] -
+                                  bypass_denoised_samples[silence_end+4800:samples.shape[0]]).max()
+
+    cache_folder_name = tempfile.mkdtemp()
+    try:
+        cache = DenoiseCache(cache_folder_name)
+        keys = [cache.get_key(one_denoiser, hashlib.sha256(samples), 'filter') for one_denoiser in [denoiser, bypass_denoiser]]
+    finally:
+        shutil.rmtree(cache_folder_name)
+
+    print('AdaptiveBypass, {:.2f} s of digital silence in {:.2f} s:'.format(silence_length/denoiser.sample_rate,
+                                                                              samples.shape[0]/denoiser.sample_rate))
+    print('	bypassed fraction                   {:.3f}'.format(bypass.bypassed_fraction))
+    print('	max difference before silence       {}'.format(max_difference_before))
+    print('	max sample in bypassed silence      {}'.format(max_silence_sample))
+    print('	max difference after silence        {}'.format(max_difference_after))
+    print('	cache keys differ                   {}'.format(keys[0] != keys[1]))
+
+    is_ok = abs(bypass.bypassed_fraction - silence_length / samples.shape[0]) < 0.02 and max_difference_before == 0 \
+            and max_silence_sample == 0 and max_difference_after <= 2 and keys[0] != keys[1]
+    if is_ok:
+        print('OK\n')
+    return is_ok
+
+
+def test_chunked(denoiser, f_name_audio):
+    ''' ChunkedRNNoise: result has the length of the source audio, the first chunk (before crossfade) is the same as sequential
+    filter(), the rest is close to it, filter_file() gives the same result as filter(). '''
+
+    audio = denoiser.read_wav(f_name_audio)
+    samples_count = len(audio.raw_data) // audio.sample_width
+    chunk_s = 2.0
+
+    denoiser.reset()
+    denoised_samples = np.frombuffer(denoiser.filter(audio.raw_data, sample_rate=audio.frame_rate), dtype=np.int16)[:samples_count]
+    denoised_samples = denoised_samples.astype(np.float64)
+
+    temp_folder_name = tempfile.mkdtemp()
+    f_name_denoised_audio = os.path.join(temp_folder_name, 'denoised_chunked.wav')
+    try:
+        with ChunkedRNNoise(workers=2, chunk_s=chunk_s, warmup_s=1.0) as chunked_denoiser:
+            start_time = time.time()
+            chunked_denoised_audio = chunked_denoiser.filter(audio.raw_data, sample_rate=audio.frame_rate)
+            elapsed_time = time.time() - start_time
+            chunked_denoiser.filter_file(f_name_audio, f_name_denoised_audio)
+        file_denoised_audio = denoiser.read_wav(f_name_denoised_audio).raw_data
+    finally:
+        shutil.rmtree(temp_folder_name)
+    chunked_denoised_samples = np.frombuffer(chunked_denoised_audio, dtype=np.int16).astype(np.float64)
+
+    first_chunk_length = int(chunk_s * audio.frame_rate) - 2 * denoiser.frame_size * audio.frame_rate // denoiser.sample_rate
+    first_chunk_max_difference = np.abs(denoised_samples[:first_chunk_length] - chunked_denoised_samples[:first_chunk_length]).max()
+    difference_energy = np.sum((denoised_samples - chunked_denoised_samples[:denoised_samples.shape[0]])**2)
+    snr_db = 10 * np.log10(np.sum(denoised_samples**2) / max(difference_energy, 1.0))
+
+    print("ChunkedRNNoise, audio: '{}', chunks of {:.1f} s:".format(f_name_audio, chunk_s))
+    print('	output length                        {} (input {})'.format(chunked_denoised_samples.shape[0], samples_count))
+    print('	first chunk max difference           {:.0f}'.format(first_chunk_max_difference))
+    print('	SNR relative to sequential filter()  {:.1f} dB'.format(snr_db))
+    print('	filter_file() equal to filter()      {}'.format(file_denoised_audio == chunked_denoised_audio))
+    print('	processing time                      {:.2f} s'.format(elapsed_time))
+
+    is_ok = chunked_denoised_samples.shape[0] == samples_count and first_chunk_max_difference <= 1 and snr_db > 30 \
+            and file_denoised_audio == chunked_denoised_audio
+    if is_ok:
+        print('OK\n')
+    return is_ok
+
+
+def test_snapshot(denoiser, audio):
+    ''' snapshot()/restore(): after restoring a snapshot another RNNoise object continues the audio exactly like the object the
+    snapshot was made from, a damaged snapshot is rejected. '''
+
+    samples = np.frombuffer(audio.raw_data, dtype=np.int16)
+    split_point = samples.shape[0] // 2 // denoiser.frame_size * denoiser.frame_size
+    first_part, second_part = samples[:split_point].tobytes(), samples[split_point:].tobytes()
+
+    denoiser.reset()
+    denoiser.filter(first_part, denoiser.sample_rate)
+    snapshot = denoiser.snapshot()
+    denoised_second_part = denoiser.filter(second_part, denoiser.sample_rate)
+
+    restored_denoiser = denoiser.spawn()
+    restored_denoiser.restore(snapshot)
+    restored_denoised_second_part = restored_denoiser.filter(second_part, denoiser.sample_rate)
+
+    denoiser.reset()
+    reset_denoised_second_part = denoiser.filter(second_part, denoiser.sample_rate)
+
+    try:
+        restored_denoiser.restore(snapshot[:-1])
+        is_damaged_snapshot_rejected = False
+    except ValueError:
+        is_damaged_snapshot_rejected = True
+
+    print('snapshot()/restore(), snapshot size {} bytes:'.format(len(snapshot)))
+    print('	continuation after restore() is the same   {}'.format(restored_denoised_second_part == denoised_second_part))
+    print('	continuation after reset() differs         {}'.format(reset_denoised_second_part != denoised_second_part))
+    print('	damaged snapshot is rejected               {}'.format(is_damaged_snapshot_rejected))
+
+    is_ok = restored_denoised_second_part == denoised_second_part and reset_denoised_second_part != denoised_second_part \
+            and is_damaged_snapshot_rejected
+    if is_ok:
+        print('OK\n')
+    return is_ok
+
+
+def wait_for_daemon(client, timeout=30):
+    ''' Wait until the daemon accepts requests.
+    1. client - DaemonClient
+    2. timeout - maximum waiting time in seconds
+    3. returns the result of DaemonClient.ping() '''
+
+    start_time = time.time()
+    while True:
+        try:
+            return client.ping()
+        except (FileNotFoundError, ConnectionError):
+            if time.time() - start_time > timeout:
+                raise
+            time.sleep(0.1)
+
+
+def test_daemon(denoiser, f_name_audio):
+    ''' Denoising daemon with DaemonClient: filter() via shared memory and filter_file() give the same result as RNNoise, errors are
+    returned to the client, the daemon keeps working after reload() and removes its socket on SIGTERM. '''
+
+    audio = denoiser.read_wav(f_name_audio)
+    samples = np.frombuffer(audio.raw_data, dtype=np.int16)
+    denoiser.reset()
+    denoised_samples = denoiser.filter(samples, audio.frame_rate)
+
+    temp_folder_name = tempfile.mkdtemp()
+    socket_path = os.path.join(temp_folder_name, 'rnnoise_wrapper.sock')
+    f_name_denoised_audio = os.path.join(temp_folder_name, 'denoised.wav')
+    f_name_daemon_denoised_audio = os.path.join(temp_folder_name, 'denoised_daemon.wav')
+    daemon_process = subprocess.Popen([sys.executable, '-W', 'ignore', '-m', 'rnnoise_wrapper.daemon', '-s', socket_path, '-w', '2'],
+                                      stdout=subprocess.DEVNULL)
+    try:
+        with DaemonClient(socket_path, timeout=30) as client:
+            wait_for_daemon(client)
+
+            start_time = time.time()
+            daemon_denoised_samples = client.filter(samples, audio.frame_rate)
+            elapsed_time = time.time() - start_time
+            is_filter_equal = np.array_equal(daemon_denoised_samples, denoised_samples)
+
+            client.filter_file(f_name_audio, f_name_daemon_denoised_audio)
+            denoiser.reset()
+            denoiser.filter_file(f_name_audio, f_name_denoised_audio)
+            with open(f_name_denoised_audio, 'rb') as f_denoised_audio, open(f_name_daemon_denoised_audio, 'rb') as f_daemon_denoised_audio:
+                is_filter_file_equal = f_denoised_audio.read() == f_daemon_denoised_audio.read()
+
+            try:
+                client.filter_file(os.path.join(temp_folder_name, 'missing.wav'), f_name_daemon_denoised_audio)
+                is_error_returned = False
+            except RuntimeError:
+                is_error_returned = True
+
+            client.reload()
+            wait_for_daemon(client)
+            is_reloaded_filter_equal = np.array_equal(client.filter(samples, audio.frame_rate), denoised_samples)
+
+        daemon_process.send_signal(signal.SIGTERM)
+        return_code = daemon_process.wait(30)
+        is_socket_removed = not os.path.exists(socket_path)
+    finally:
+        if daemon_process.poll() is None:
+            daemon_process.kill()
+            daemon_process.wait()
+        shutil.rmtree(temp_folder_name)
+
+    print("Daemon, audio: '{}', length: {:.2f} s:".format(f_name_audio, len(audio)/1000))
+    print('	filter() equal to RNNoise         {}'.format(is_filter_equal))
+    print('	filter_file() equal to RNNoise    {}'.format(is_filter_file_equal))
+    print('	error is returned to client       {}'.format(is_error_returned))
+    print('	filter() after reload()           {}'.format(is_reloaded_filter_equal))
+    print('	stopped by SIGTERM, return code   {}, socket removed: {}'.format(return_code, is_socket_removed))
+    print('	processing time                   {:.2f} s'.format(elapsed_time))
+
+    is_ok = is_filter_equal and is_filter_file_equal and is_error_returned and is_reloaded_filter_equal and return_code == 0 \
+            and is_socket_removed
+    if is_ok:
+        print('OK\n')
+    return is_ok
+
+
+async def check_server(server, samples, sample_rate):
+    ''' Check handshakes with malformed parameters and one audio stream on a running StreamingServer.
+    1. server - asyncio.AbstractServer listening on TCP
+    2. samples - numpy.ndarray int16 with audio
+    3. sample_rate - sample rate of audio
+    4. returns tuple of the list of statuses of malformed handshakes, denoised audio and the number of VAD values '''
+
+    host, port = server.sockets[0].getsockname()[:2]
+
+    # Every malformed request must get an error response (and not a closed connection without response)
+    malformed_requests = [b'not json', b'[1]', b'{"chunk_ms": Infinity}', b'{"sample_rate": NaN}', b'{"sample_rate": 1e400}',
+                          b'{"sample_rate": [1]}', b'{"sample_rate": 1000003}', b'{"voice_prob_threshold": 2}', b'{"output_format": "mp3"}']
+    malformed_statuses = []
+    for request in malformed_requests:
+        reader, writer = await asyncio.open_connection(host, port)
+        writer.write(request + b'\n')
+        response = await asyncio.wait_for(reader.readline(), 10)
+        writer.close()
+        malformed_statuses.append(json.loads(response.decode('utf-8'))['status'] if response else None)
+
+    # Audio is sent in pieces that do not match chunk_bytes, responses are received at the same time
+    client = await StreamingClient.connect_tcp(host, port, sample_rate=sample_rate, vad=True)
+
+    async def send_audio():
+        for i in range(0, samples.shape[0], 317):
+            client.send(samples[i:i+317].tobytes())
+            await client.drain()
+        client.close_input()
+
+    sender = asyncio.ensure_future(send_audio())
+    denoised_chunks = []
+    vad_count = 0
+    while True:
+        response = await asyncio.wait_for(client.receive(), 30)
+        if response is None:
+            break
+        denoised_chunks.append(response[0])
+        vad_count += response[1].shape[0]
+    await sender
+    client.close()
+    return malformed_statuses, b''.join(denoised_chunks), vad_count
+
+
+def test_server(denoiser, audio):
+    ''' StreamingServer and StreamingClient: malformed stream parameters are answered with an error, an audio stream gives the same
+    result as RNNoiseStream with one VAD value per frame, no exceptions are left unhandled in the event loop. '''
+
+    samples = np.frombuffer(audio.raw_data, dtype=np.int16)
+    denoiser.reset()
+    stream = RNNoiseStream(denoiser, audio.frame_rate)
+    denoised_audio = b''.join(stream.push(samples[i:i+160].tobytes()) for i in range(0, samples.shape[0], 160)) + stream.flush()
+
+    loop = asyncio.new_event_loop()
+    unhandled_exceptions = []
+    loop.set_exception_handler(lambda loop, context: unhandled_exceptions.append(context.get('message')))
+    streaming_server = StreamingServer()
+    try:
+        server = loop.run_until_complete(streaming_server.start_tcp('127.0.0.1', 0))
+        start_time = time.time()
+        malformed_statuses, server_denoised_audio, vad_count = loop.run_until_complete(check_server(server, samples, audio.frame_rate))
+        elapsed_time = time.time() - start_time
+        stats = streaming_server.stats()
+        server.close()
+        loop.run_until_complete(server.wait_closed())
+    finally:
+        loop.close()
+
+    frames_count = -(-samples.shape[0] * denoiser.sample_rate // audio.frame_rate // denoiser.frame_size)
+    max_difference = np.abs(np.frombuffer(denoised_audio, dtype=np.int16).astype(np.int32) -
+                            np.frombuffer(server_denoised_audio, dtype=np.int16).astype(np.int32)).max()
+    print('Streaming server, {} Hz, length: {:.2f} s:'.format(audio.frame_rate, len(audio)/1000))
+    print('	malformed handshakes answered with error  {} of {}'.format(malformed_statuses.count('error'), len(malformed_statuses)))
+    print('	output length                              {} (RNNoiseStream {})'.format(len(server_denoised_audio), len(denoised_audio)))
+    print('	max difference with RNNoiseStream          {}'.format(max_difference))
+    print('	VAD values                                 {} (frames {})'.format(vad_count, frames_count))
+    print('	connections total / open                   {} / {}'.format(stats['connections_total'], stats['connections']))
+    print('	unhandled exceptions                       {}'.format(unhandled_exceptions))
+    print('	processing time                            {:.2f} s'.format(elapsed_time))
+
+    is_ok = all(status == 'error' for status in malformed_statuses) and len(server_denoised_audio) == len(denoised_audio) \
+            and max_difference <= 1 and vad_count == frames_count and stats['connections_total'] == 1 and stats['connections'] == 0 \
+            and not unhandled_exceptions
+    if is_ok:
+        print('OK\n')
+    return is_ok
 
 
 def main():
@@ -125,6 +568,17 @@ def main():
             result_tests.append(False)
 
     
+    result_tests.append(test_resampler())
+    result_tests.append(test_pool(denoiser, denoiser.read_wav(f_names_source_audio[0])))
+    result_tests.append(test_stream(denoiser, denoiser.read_wav(f_names_source_audio[0])))
+    result_tests.append(test_cache(denoiser, denoiser.read_wav(f_names_source_audio[0])))
+    result_tests.append(test_bypass(denoiser, denoiser.read_wav(f_names_source_audio[0], sample_rate=denoiser.sample_rate)))
+    result_tests.append(test_chunked(denoiser, f_names_source_audio[0]))
+    result_tests.append(test_snapshot(denoiser, denoiser.read_wav(f_names_source_audio[0], sample_rate=denoiser.sample_rate)))
+    result_tests.append(test_daemon(denoiser, f_names_source_audio[0]))
+    result_tests.append(test_server(denoiser, denoiser.read_wav(f_names_source_audio[0])))
+
+
     if all(result_tests):
         print('\nALL OK')
 
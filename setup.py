@@ -27,10 +27,14 @@ def requirements() -> List[str]:
 setup(
     name='rnnoise-wrapper',
     packages=find_packages(),
+    py_modules=['rnnoise_wrapper_client'],
     include_package_data=True,
     entry_points={
         'console_scripts':
-            ['rnnoise_wrapper = rnnoise_wrapper.cli:denoise']
+            ['rnnoise_wrapper = rnnoise_wrapper.cli:denoise',
+             'rnnoise_wrapper_daemon = rnnoise_wrapper.daemon:main',
+             'rnnoise_wrapper_server = rnnoise_wrapper.server:main',
+             'rnnoise_wrapper_client = rnnoise_wrapper_client:main']
         },
     classifiers=[
         'Intended Audience :: Developers',
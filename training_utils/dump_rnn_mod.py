@@ -61,6 +61,26 @@ def printLayer(f, hf, struct_rnnmodel_buf, layer):
         hf.write('  const DenseLayer *{};\n\n'.format(name))
 
 
+# Weights file format for rnnoise_model_from_file() (rnn_reader.c): layers in this fixed order, activations encoded as numbers
+MODEL_FILE_LAYERS = ['input_dense', 'vad_gru', 'noise_gru', 'denoise_gru', 'denoise_output', 'vad_output']
+MODEL_FILE_ACTIVATIONS = {'TANH': 0, 'SIGMOID': 1, 'RELU': 2}
+
+def printFileVector(f, vector):
+    v = np.reshape(vector, (-1));
+    f.write(' '.join('{}'.format(min(127, int(round(256*x)))) for x in v))
+    f.write('\n')
+
+def printFileLayer(f, layer):
+    weights = layer.get_weights()
+    activation = re.search('function (.*) at', str(layer.activation)).group(1).upper()
+    if len(weights) > 2:
+        f.write('{} {} {}\n'.format(weights[0].shape[0], int(weights[0].shape[1]/3), MODEL_FILE_ACTIVATIONS.get(activation, 0)))
+    else:
+        f.write('{} {} {}\n'.format(weights[0].shape[0], weights[0].shape[1], MODEL_FILE_ACTIVATIONS.get(activation, 0)))
+    for w in weights:
+        printFileVector(f, w)
+
+
 def mean_squared_sqrt_error(y_true, y_pred):
     return K.mean(K.square(K.sqrt(y_pred) - K.sqrt(y_true)), axis=-1)
 
@@ -125,3 +145,11 @@ hf.write('\n#endif\n')
 
 f.close()
 hf.close()
+
+# Optional 4th argument: weights file for rnnoise_model_from_file() (RNNoise(model_path=...) in rnnoise_wrapper), no rebuild needed
+if len(sys.argv) > 4:
+    mf = open(sys.argv[4], 'w')
+    mf.write('rnnoise-nu model file version 1\n')
+    for name in MODEL_FILE_LAYERS:
+        printFileLayer(mf, model.get_layer(name))
+    mf.close()